@@ -0,0 +1,100 @@
+# backend/app/archive.py
+"""
+Arkivering af afsluttede anmodninger
+
+Godkendte (og behandlede), afviste og annullerede anmodninger ældre end
+ARCHIVE_AFTER_DAYS flyttes i batches med deres kommentarer til
+approval_requests_archive / approval_comments_archive. Den varme tabel og
+dens indekser holdes dermed små; læse-endpoints kan medtage arkivet med
+include_archived. Statistikken (rollup-tabellen, genopbygningen af den og
+periode-statistikken) medtager arkivet.
+"""
+from sqlalchemy import text
+from datetime import datetime, timedelta
+from typing import List, Optional
+import asyncio
+import logging
+import os
+
+from . import models
+from .cache import request_cache
+from .database import async_engine
+
+logger = logging.getLogger(__name__)
+
+# Generated columns (search_vector) are computed again in the archive table
+_REQUEST_COLUMNS = ", ".join(
+    column.name for column in models.ApprovalRequest.__table__.columns if column.computed is None
+)
+_COMMENT_COLUMNS = ", ".join(column.name for column in models.ApprovalComment.__table__.columns)
+
+# One statement per batch: the comments and the requests move together, and
+# foreign keys are checked once the whole statement has run
+_ARCHIVE_BATCH = text(f"""
+    WITH batch AS (
+        SELECT id FROM approval_requests
+        WHERE status IN ('APPROVED', 'REJECTED', 'CANCELLED')
+          AND coalesce(approved_at, updated_at, created_at) < :cutoff
+          -- Approved requests stay until the work queue has processed them
+          AND (status <> 'APPROVED' OR processed_at IS NOT NULL)
+        ORDER BY id
+        LIMIT :batch_size
+        FOR UPDATE SKIP LOCKED
+    ), moved_comments AS (
+        DELETE FROM approval_comments c USING batch b
+        WHERE c.request_id = b.id
+        RETURNING c.*
+    ), archived_comments AS (
+        INSERT INTO approval_comments_archive ({_COMMENT_COLUMNS})
+        SELECT {_COMMENT_COLUMNS} FROM moved_comments
+    ), moved AS (
+        DELETE FROM approval_requests r USING batch b
+        WHERE r.id = b.id
+        RETURNING r.*
+    )
+    INSERT INTO approval_requests_archive ({_REQUEST_COLUMNS})
+    SELECT {_REQUEST_COLUMNS} FROM moved
+    RETURNING id
+""")
+
+async def archive_batch(cutoff: datetime, batch_size: int) -> List[int]:
+    """Flyt én batch afsluttede anmodninger til arkivet; returnerer deres id'er"""
+    async with async_engine.begin() as conn:
+        archived = (await conn.execute(
+            _ARCHIVE_BATCH, {"cutoff": cutoff, "batch_size": batch_size}
+        )).scalars().all()
+    for request_id in archived:
+        request_cache.invalidate(request_id)
+    return archived
+
+async def archive_finished_requests(age: timedelta, batch_size: int, pause: float = 0.1) -> int:
+    """Arkiver alle afsluttede anmodninger ældre end age, batch for batch"""
+    cutoff = datetime.utcnow() - age
+    total = 0
+    while True:
+        archived = await archive_batch(cutoff, batch_size)
+        total += len(archived)
+        if len(archived) < batch_size:
+            return total
+        # Short transactions with a pause keep lock time and WAL bursts small
+        await asyncio.sleep(pause)
+
+async def archive_loop(age: Optional[timedelta], batch_size: int, interval: float = 3600):
+    """Arkiver periodisk"""
+    if age is None:
+        logger.info("Archival of finished requests disabled")
+        return
+    while True:
+        try:
+            archived = await archive_finished_requests(age, batch_size)
+            if archived:
+                logger.info(f"Archived {archived} finished approval requests")
+        except Exception as e:
+            logger.error(f"Error archiving approval requests: {e}")
+        await asyncio.sleep(interval)
+
+# 0 disables archival
+_archive_after_days = int(os.getenv("ARCHIVE_AFTER_DAYS", "365"))
+ARCHIVE_AFTER = timedelta(days=_archive_after_days) if _archive_after_days > 0 else None
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
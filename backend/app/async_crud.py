@@ -0,0 +1,154 @@
+# backend/app/async_crud.py
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from . import crud, models, schemas
+from typing import Optional, Dict, List, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Async variants of the crud functions for the async endpoints.
+# Writes reuse the logic in crud.py through AsyncSession.run_sync, which runs the
+# synchronous code on top of the asyncpg connection without blocking the event loop.
+
+# User operations
+async def get_user(db: AsyncSession, user_id: int):
+    """Hent bruger på ID"""
+    return await db.run_sync(crud.get_user, user_id)
+
+async def get_users_by_ids(db: AsyncSession, user_ids) -> Dict[int, models.User]:
+    """Hent flere brugere på én gang"""
+    return await db.run_sync(crud.get_users_by_ids, user_ids)
+
+# Approval Request operations
+async def get_approval_request(db: AsyncSession, request_id: int):
+    """Hent enkelt godkendelsesanmodning med relationer"""
+    result = await db.execute(
+        select(models.ApprovalRequest)
+        .options(*crud.approval_request_load_options())
+        .where(models.ApprovalRequest.id == request_id)
+        .execution_options(populate_existing=True)
+    )
+    return result.scalars().first()
+
+async def create_approval_request(
+    db: AsyncSession,
+    request: schemas.ApprovalRequestCreate,
+    requester_id: int,
+    ip_address: Optional[str] = None
+):
+    """Opret ny godkendelsesanmodning"""
+    db_request = await db.run_sync(crud.create_approval_request, request, requester_id, ip_address)
+    return await get_approval_request(db, db_request.id)
+
+async def create_approval_requests_bulk(
+    db: AsyncSession,
+    items: List[schemas.ApprovalRequestBulkItem],
+    ip_address: Optional[str] = None
+):
+    """Opret mange godkendelsesanmodninger i én transaktion"""
+    return await db.run_sync(crud.create_approval_requests_bulk, items, ip_address)
+
+async def update_approval_request(
+    db: AsyncSession,
+    request_id: int,
+    update: schemas.ApprovalRequestUpdate,
+    user_id: int
+):
+    """Opdater godkendelsesanmodning"""
+    db_request = await db.run_sync(crud.update_approval_request, request_id, update, user_id)
+    if not db_request:
+        return None
+    return await get_approval_request(db, db_request.id)
+
+async def apply_decisions_bulk(db: AsyncSession, decisions: List[schemas.ApprovalDecision], user_id: int):
+    """Anvend mange beslutninger i én transaktion"""
+    return await db.run_sync(crud.apply_decisions_bulk, decisions, user_id)
+
+# Work queue operations
+async def claim_work_items(db: AsyncSession, worker: str, limit: int, lease_seconds: int, max_attempts: int):
+    """Claim godkendte, ubehandlede anmodninger med en lease"""
+    return await db.run_sync(crud.claim_work_items, worker, limit, lease_seconds, max_attempts)
+
+async def ack_work_item(db: AsyncSession, request_id: int, worker: str):
+    """Marker claimed anmodning som behandlet"""
+    return await db.run_sync(crud.ack_work_item, request_id, worker)
+
+async def fail_work_item(
+    db: AsyncSession,
+    request_id: int,
+    worker: str,
+    error: Optional[str] = None,
+    retry_delay_seconds: int = 0
+):
+    """Frigiv claimed anmodning efter en fejl"""
+    return await db.run_sync(crud.fail_work_item, request_id, worker, error, retry_delay_seconds)
+
+# Comment operations
+async def add_comment(db: AsyncSession, request_id: int, user_id: int, content: str, is_internal: bool = False):
+    """Tilføj kommentar til anmodning"""
+    return await db.run_sync(crud.add_comment, request_id, user_id, content, is_internal)
+
+async def create_audit_log(
+    db: AsyncSession,
+    action: str,
+    entity_type: str,
+    entity_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    old_values: Optional[Dict] = None,
+    new_values: Optional[Dict] = None,
+    ip_address: Optional[str] = None,
+    user_agent: Optional[str] = None,
+    approval_request_id: Optional[int] = None,
+    durable: bool = False
+):
+    """Opret audit log entry"""
+    return await db.run_sync(
+        lambda session: crud.create_audit_log(
+            session,
+            action=action,
+            entity_type=entity_type,
+            entity_id=entity_id,
+            user_id=user_id,
+            old_values=old_values,
+            new_values=new_values,
+            ip_address=ip_address,
+            user_agent=user_agent,
+            approval_request_id=approval_request_id,
+            durable=durable
+        )
+    )
+
+# Notification operations
+async def get_missed_notifications(
+    db: AsyncSession,
+    user_id: int,
+    last_seq: int,
+    limit: int
+) -> Optional[List[Tuple[int, str]]]:
+    """Hent notifikationer efter last_seq - None hvis de ikke alle kan afspilles"""
+    current_seq = (await db.execute(
+        select(models.NotificationSequence.last_seq).where(models.NotificationSequence.user_id == user_id)
+    )).scalar() or 0
+    if current_seq == last_seq:
+        return []
+    if current_seq < last_seq:
+        # Ahead of the server (e.g. a seq from another database): nothing can be
+        # replayed, and later live notifications must not be held back by it
+        return None
+    if current_seq - last_seq > limit:
+        return None
+    
+    result = await db.execute(
+        select(models.NotificationOutbox.seq, models.NotificationOutbox.payload)
+        .where(
+            models.NotificationOutbox.user_id == user_id,
+            models.NotificationOutbox.seq > last_seq
+        )
+        .order_by(models.NotificationOutbox.seq)
+    )
+    rows = [(seq, payload) for seq, payload in result.all()]
+    # Sequences are gapless, so a missing first row means it was cleaned up
+    if not rows or rows[0][0] != last_seq + 1:
+        return None
+    return rows
@@ -0,0 +1,288 @@
+# backend/app/audit.py
+"""
+Audit log: batchet skrivning og månedlige partitioner
+
+Audit-rækker der ikke behøver at være en del af forespørgslens transaktion
+lægges i kø og skrives samlet efter størrelse eller tid. audit_logs er
+range-partitioneret pr. måned på created_at, så retention er en DROP af
+hele partitioner i stedet for en stor DELETE.
+"""
+from sqlalchemy import insert, text
+from sqlalchemy.engine import Connection
+from collections import deque
+from datetime import date, datetime, timedelta, timezone
+from typing import Deque, Dict, List, Optional
+import threading
+import asyncio
+import logging
+import re
+import os
+
+from . import models
+from .database import async_engine
+
+logger = logging.getLogger(__name__)
+
+# Monthly partitions are named audit_logs_yYYYYmMM
+_PARTITION_NAME = re.compile(r"^audit_logs_y(\d{4})m(\d{2})$")
+
+def _month_start(day: date) -> date:
+    return day.replace(day=1)
+
+def _next_month(month: date) -> date:
+    return (month + timedelta(days=32)).replace(day=1)
+
+def partition_name(month: date) -> str:
+    return f"audit_logs_y{month.year:04d}m{month.month:02d}"
+
+def create_partitions(conn: Connection, start: date, months: int):
+    """Opret månedspartitioner fra start og months frem"""
+    month = _month_start(start)
+    for _ in range(months):
+        upper = _next_month(month)
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF audit_logs "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"
+        ))
+        month = upper
+
+def ensure_partitions(conn: Connection):
+    """Sørg for partitioner for indeværende måned og PARTITION_MONTHS_AHEAD frem"""
+    create_partitions(conn, datetime.now(timezone.utc).date(), PARTITION_MONTHS_AHEAD + 1)
+
+def drop_expired_partitions(conn: Connection, retention: timedelta) -> List[str]:
+    """Drop partitioner hvis hele måned ligger før retention-grænsen"""
+    cutoff = (datetime.now(timezone.utc) - retention).date()
+    partitions = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'audit_logs'::regclass"
+    )).scalars().all()
+    dropped = []
+    for name in sorted(partitions):
+        match = _PARTITION_NAME.match(name)
+        if not match:
+            continue  # the default partition is never dropped
+        month = date(int(match.group(1)), int(match.group(2)), 1)
+        if _next_month(month) <= cutoff:
+            conn.execute(text(f"DROP TABLE {name}"))
+            dropped.append(name)
+    return dropped
+
+def copy_unpartitioned_batch(conn: Connection, batch_size: int) -> Optional[int]:
+    """Flyt én batch fra audit_logs_unpartitioned (migrering 8) - None når tabellen er væk"""
+    if conn.execute(text("SELECT to_regclass('audit_logs_unpartitioned')")).scalar() is None:
+        return None
+    # Partitions first, so the rows do not land in the default partition
+    oldest, newest = conn.execute(text("""
+        SELECT min(created_at), max(created_at) FROM (
+            SELECT coalesce(created_at, now()) AS created_at FROM audit_logs_unpartitioned
+            ORDER BY id LIMIT :batch_size
+        ) AS batch
+    """), {"batch_size": batch_size}).one()
+    if oldest is None:
+        conn.execute(text("DROP TABLE audit_logs_unpartitioned"))
+        logger.info("Finished copying audit_logs_unpartitioned into the partitioned table")
+        return 0
+    first = _month_start(oldest.date())
+    create_partitions(conn, first, (newest.year - first.year) * 12 + newest.month - first.month + 1)
+    # SKIP LOCKED lets several workers copy at the same time
+    return conn.execute(text("""
+        WITH moved AS (
+            DELETE FROM audit_logs_unpartitioned
+            WHERE id IN (
+                SELECT id FROM audit_logs_unpartitioned
+                ORDER BY id LIMIT :batch_size
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING *
+        )
+        INSERT INTO audit_logs (
+            id, action, entity_type, entity_id, old_values, new_values,
+            ip_address, user_agent, user_id, approval_request_id, created_at
+        )
+        SELECT
+            id, action, entity_type, entity_id, old_values::jsonb, new_values::jsonb,
+            ip_address, user_agent, user_id, approval_request_id, coalesce(created_at, now())
+        FROM moved
+    """), {"batch_size": batch_size}).rowcount
+
+async def copy_unpartitioned(batch_size: int, pause: float = 0.1) -> int:
+    """Flyt alle rækker fra før partitioneringen over, batch for batch"""
+    total = 0
+    while True:
+        async with async_engine.begin() as conn:
+            copied = await conn.run_sync(copy_unpartitioned_batch, batch_size)
+        if not copied:
+            return total
+        total += copied
+        # Short transactions with a pause keep lock time and WAL bursts small
+        await asyncio.sleep(pause)
+
+class AuditWriter:
+    """Samler audit-rækker og skriver dem i batches fra en baggrundsopgave"""
+
+    def __init__(self, batch_size: int = 500, flush_interval: float = 1.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        # deque.append is thread-safe, so sync endpoints in the threadpool can enqueue
+        self._pending: Deque[Dict] = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopped = False
+        self._lock = threading.Lock()
+
+        # Statistics
+        self.enqueued = 0
+        self.written = 0
+        self.batches = 0
+        self.failed_batches = 0
+
+    def enqueue(self, entry: Dict):
+        """Læg en audit-række i kø til næste batch - rejser RuntimeError efter stop()"""
+        if self._stopped:
+            # Nothing would write it any more; the caller must not believe it was logged
+            raise RuntimeError("Audit writer is stopped")
+        # Stamp now so the row carries the event time, not the flush time
+        entry.setdefault("created_at", datetime.now(timezone.utc))
+        with self._lock:
+            self.enqueued += 1
+        self._pending.append(entry)
+        loop = self._loop
+        if loop is not None:
+            # Always signal: a length check here races with other threads appending.
+            # Before start() the entry simply waits in the queue.
+            loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def start(self):
+        """Start baggrundsopgaven der skriver batches"""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._stopping = asyncio.Event()
+        self._stopped = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop baggrundsopgaven og skriv det der ligger i kø"""
+        self._stopped = True
+        if self._task is None:
+            return
+        # Let the writer drain the queue and exit on its own instead of
+        # cancelling it in the middle of a batch
+        self._stopping.set()
+        self._wakeup.set()
+        await self._task
+        self._task = None
+        self._loop = None
+        # Entries the writer could not write (database down) get one last try
+        while self._pending:
+            if not await self.flush():
+                logger.error(f"Dropping {len(self._pending)} audit entries at shutdown")
+                break
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        backoff = 1
+        while True:
+            if not self._pending:
+                if self._stopping.is_set():
+                    return
+                self._wakeup.clear()
+                # Re-check after clearing: an append before the clear has its set() still queued
+                if not self._pending and not self._stopping.is_set():
+                    await self._wakeup.wait()
+                continue
+
+            # Give the batch time to fill unless it already is full or we are stopping
+            deadline = loop.time() + self.flush_interval
+            while len(self._pending) < self.batch_size and not self._stopping.is_set():
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+
+            while self._pending:
+                if await self.flush():
+                    backoff = 1
+                    continue
+                if self._stopping.is_set():
+                    return
+                # Back off, but wake up at once when asked to stop
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=backoff)
+                except asyncio.TimeoutError:
+                    pass
+                backoff = min(backoff * 2, 30)
+
+    async def flush(self) -> bool:
+        """Skriv én batch; ved fejl lægges rækkerne tilbage forrest i køen"""
+        batch = [self._pending.popleft() for _ in range(min(len(self._pending), self.batch_size))]
+        if not batch:
+            return True
+        written = False
+        try:
+            async with async_engine.begin() as conn:
+                await conn.execute(insert(models.AuditLog), batch)
+            written = True
+        except Exception as e:
+            logger.error(f"Failed to write {len(batch)} audit entries: {e}")
+            self.failed_batches += 1
+        finally:
+            # Also on cancellation: the popped batch must not be lost
+            if not written:
+                self._pending.extendleft(reversed(batch))
+        if not written:
+            return False
+        self.written += len(batch)
+        self.batches += 1
+        return True
+
+    def get_stats(self) -> Dict:
+        """Hent statistikker for audit-skriveren"""
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "pending": len(self._pending),
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "batch_size": self.batch_size,
+            "flush_interval_seconds": self.flush_interval
+        }
+
+async def maintenance_loop(retention: Optional[timedelta], interval: float = 3600):
+    """Opret kommende partitioner, drop udløbne og afslut migrering 8's kopiering"""
+    while True:
+        try:
+            copied = await copy_unpartitioned(COPY_BATCH_SIZE)
+            if copied:
+                logger.info(f"Copied {copied} audit entries into the partitioned table")
+            async with async_engine.begin() as conn:
+                await conn.run_sync(ensure_partitions)
+                if retention:
+                    dropped = await conn.run_sync(drop_expired_partitions, retention)
+                    if dropped:
+                        logger.info(f"Dropped expired audit partitions: {', '.join(dropped)}")
+        except Exception as e:
+            logger.error(f"Error maintaining audit log partitions: {e}")
+        await asyncio.sleep(interval)
+
+PARTITION_MONTHS_AHEAD = int(os.getenv("AUDIT_PARTITION_MONTHS_AHEAD", "2"))
+COPY_BATCH_SIZE = int(os.getenv("AUDIT_COPY_BATCH_SIZE", "5000"))
+
+# 0 keeps audit entries forever
+_retention_days = int(os.getenv("AUDIT_LOG_RETENTION_DAYS", "0"))
+RETENTION = timedelta(days=_retention_days) if _retention_days > 0 else None
+
+# Global audit writer instance
+audit_writer = AuditWriter(
+    batch_size=int(os.getenv("AUDIT_BATCH_SIZE", "500")),
+    flush_interval=float(os.getenv("AUDIT_FLUSH_INTERVAL_SECONDS", "1.0"))
+)
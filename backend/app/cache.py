@@ -0,0 +1,293 @@
+# backend/app/cache.py
+"""
+Response-cache til dyre læse-endpoints (statistik, forfaldne anmodninger)
+
+Indgange udløber efter TTL og invalideres eksplicit når data ændres.
+Invalidering sker ved at tælle en generation op: nøgler indeholder den
+aktuelle generation, så gamle indgange aldrig rammes igen. Hver worker har
+sin egen backend; invalideringer sendes til de andre workers over event
+bussen (se event_bus.cache_invalidation) når skrivetransaktionen committer.
+"""
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+import threading
+import logging
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+class CacheBackend(ABC):
+    """Interface for cache-lager"""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: float):
+        ...
+
+    @abstractmethod
+    def incr(self, key: str) -> int:
+        """Atomisk optælling (bruges til generationer)"""
+
+    @abstractmethod
+    def get_counter(self, key: str) -> int:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str):
+        ...
+
+    @abstractmethod
+    def clear(self):
+        ...
+
+    def size(self) -> Optional[int]:
+        """Antal indgange, hvis backenden kan oplyse det"""
+        return None
+
+class LocalCacheBackend(CacheBackend):
+    """In-process LRU med TTL"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def get_counter(self, key: str) -> int:
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def size(self) -> Optional[int]:
+        return len(self._entries)
+
+class ResponseCache:
+    """TTL-cache med eksplicit invalidering og hit/miss-tællere"""
+
+    def __init__(self, backend: Optional[CacheBackend] = None, default_ttl: float = 30.0, enabled: bool = True):
+        self.backend = backend or LocalCacheBackend()
+        self.default_ttl = default_ttl
+        self.enabled = enabled
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def make_key(self, namespace: str, endpoint: str, **params) -> str:
+        """Byg nøgle ud fra endpoint og parametre i den aktuelle generation"""
+        args = "&".join(f"{name}={params[name]}" for name in sorted(params))
+        generation = self.backend.get_counter(f"generation:{namespace}")
+        return f"{namespace}:{generation}:{endpoint}?{args}"
+
+    def get_or_load(
+        self,
+        namespace: str,
+        endpoint: str,
+        loader: Callable[[], Any],
+        ttl: Optional[float] = None,
+        **params
+    ) -> Any:
+        """Returner cachet værdi eller kald loader og gem resultatet"""
+        if not self.enabled:
+            return loader()
+
+        key = self.make_key(namespace, endpoint, **params)
+        value = self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        value = loader()
+        self.backend.set(key, value, ttl if ttl is not None else self.default_ttl)
+        return value
+
+    def invalidate(self, namespace: str):
+        """Ugyldiggør alle indgange i et namespace"""
+        self.backend.incr(f"generation:{namespace}")
+        self.invalidations += 1
+        logger.debug(f"Invalidated cache namespace '{namespace}'")
+
+    def get_stats(self) -> Dict:
+        """Hent statistikker over cachen"""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "entries": self.backend.size()
+        }
+
+class SerializedRowCache:
+    """LRU af færdigserialiserede svar pr. række, nøglet på (id, version)
+
+    Kun den nyeste version af en række gemmes. Et opslag med en anden version
+    er en miss, så en indgang fra før en ændring på en anden worker aldrig
+    returneres - invalidering frigør blot pladsen med det samme.
+    """
+
+    def __init__(self, max_entries: int = 2048, enabled: bool = True):
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._entries: "OrderedDict[int, Tuple[int, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, row_id: int, version: int) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(row_id)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(row_id)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, row_id: int, version: int, body: bytes):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[row_id] = (version, body)
+            self._entries.move_to_end(row_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, row_id: int):
+        """Fjern den cachede version af en række"""
+        with self._lock:
+            if self._entries.pop(row_id, None) is not None:
+                self.invalidations += 1
+
+    def get_stats(self) -> Dict:
+        """Hent statistikker over cachen"""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries
+        }
+
+class EntityCache:
+    """TTL-LRU af rækkeværdier (dicts) pr. nøgle, med hit/miss-tællere
+
+    Værdierne er rene dicts, ikke ORM-objekter, så de kan deles mellem
+    tråde og sessioner; kalderen bygger selv et objekt ud fra dem.
+    """
+
+    def __init__(self, backend: Optional[CacheBackend] = None, ttl: float = 60.0, enabled: bool = True):
+        self.backend = backend or LocalCacheBackend()
+        self.ttl = ttl
+        self.enabled = enabled
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key: str) -> Optional[Dict]:
+        if not self.enabled:
+            return None
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: Dict):
+        if self.enabled:
+            self.backend.set(key, value, self.ttl)
+
+    def invalidate(self, key: str):
+        self.backend.delete(key)
+        self.invalidations += 1
+
+    def get_stats(self) -> Dict:
+        """Hent statistikker over cachen"""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "entries": self.backend.size(),
+            "ttl_seconds": self.ttl
+        }
+
+# Namespace for data derived from approval requests
+APPROVAL_REQUESTS = "approval_requests"
+
+# Global response cache instance
+response_cache = ResponseCache(
+    default_ttl=float(os.getenv("CACHE_TTL_SECONDS", "30")),
+    enabled=os.getenv("CACHE_ENABLED", "true") == "true"
+)
+
+# Users by id and email; other workers see changes after at most the TTL
+user_cache = EntityCache(
+    backend=LocalCacheBackend(max_entries=int(os.getenv("USER_CACHE_SIZE", "4096"))),
+    ttl=float(os.getenv("USER_CACHE_TTL_SECONDS", "60")),
+    enabled=os.getenv("CACHE_ENABLED", "true") == "true"
+)
+
+# Serialized GET /approval-requests/{id} bodies
+request_cache = SerializedRowCache(
+    max_entries=int(os.getenv("REQUEST_CACHE_SIZE", "2048")),
+    enabled=os.getenv("CACHE_ENABLED", "true") == "true"
+)
+
+# Caches that other workers can invalidate over the event bus, by name
+CACHES = {
+    "responses": response_cache,
+    "users": user_cache,
+    "requests": request_cache
+}
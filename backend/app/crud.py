@@ -1,31 +1,162 @@
 # backend/app/crud.py
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func, desc
-from . import models, schemas
-from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any
+from sqlalchemy.orm import Session, joinedload, selectinload, make_transient_to_detached
+from sqlalchemy.orm.util import identity_key
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import and_, or_, func, desc, tuple_, text, bindparam, insert, select, update, union_all, cast, literal, Integer, Date, Float
+from sqlalchemy.dialects.postgresql import ARRAY, array
+from sqlalchemy.sql.expression import Executable, ClauseElement
+from sqlalchemy.ext.compiler import compiles
+from . import models, schemas, notifications
+from .cache import response_cache, request_cache, user_cache, APPROVAL_REQUESTS
+from .audit import audit_writer
+from .event_bus import event_bus
+from datetime import datetime, timedelta, timezone
+from typing import Optional, List, Dict, Any, Tuple
 import logging
+import base64
+import bisect
 import json
 
 logger = logging.getLogger(__name__)
 
+# Text search configuration - content is Danish
+SEARCH_CONFIG = "danish"
+SEARCH_HEADLINE_OPTIONS = "StartSel=<mark>, StopSel=</mark>, MaxWords=35, MinWords=15, MaxFragments=2"
+
+class VersionConflict(Exception):
+    """Anmodningen er ændret siden klienten læste den (optimistisk låsning)"""
+
+    def __init__(self, request_id: int, expected_version: int, current_version: int):
+        super().__init__(f"Request {request_id} is at version {current_version}, not {expected_version}")
+        self.request_id = request_id
+        self.expected_version = expected_version
+        self.current_version = current_version
+
+# Query helpers
+class _Explain(Executable, ClauseElement):
+    """EXPLAIN (FORMAT JSON) omkring en SELECT"""
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+@compiles(_Explain, "postgresql")
+def _compile_explain(element, compiler, **kw):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+def explain(db: Session, statement) -> Dict[str, Any]:
+    """Hent planner-planen for en forespørgsel"""
+    plan = db.execute(_Explain(statement)).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]
+
+def estimate_row_count(db: Session, statement) -> int:
+    """Anslå antal rækker ud fra planner-statistik"""
+    return int(explain(db, statement)["Plan Rows"])
+
+def encode_cursor(created_at: datetime, row_id: int, rank: Optional[float] = None) -> str:
+    """Opaque cursor for keyset pagination over ([rank,] created_at, id)"""
+    position = [created_at.isoformat(), row_id] if rank is None else [created_at.isoformat(), row_id, rank]
+    raw = json.dumps(position).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int, Optional[float]]:
+    """Afkod cursor - rejser ValueError ved ugyldigt input"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        position = json.loads(raw)
+        rank = float(position[2]) if len(position) > 2 else None
+        return datetime.fromisoformat(position[0]), int(position[1]), rank
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
 # User CRUD operations
 def create_user(db: Session, user: schemas.UserCreate):
-    """Opret ny bruger"""
+    """Opret ny bruger - rejser ValueError hvis emailen allerede findes"""
     db_user = models.User(**user.dict())
     db.add(db_user)
-    db.commit()
+    # The unique index on email is the duplicate check; no lookup beforehand
+    try:
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        raise ValueError(f"Email already registered: {user.email}") from e
     db.refresh(db_user)
+    _cache_user(db_user)
     logger.info(f"Created user: {db_user.email}")
     return db_user
 
+# User lookups go session identity map -> process cache -> database. Cached
+# users are attached to the session without SQL, so later many-to-one lazy
+# loads (db_request.requester) are served from the identity map as well.
+def _user_key(user_id: int) -> str:
+    return f"user:{user_id}"
+
+def _cache_user(db_user: models.User):
+    values = {column.key: getattr(db_user, column.key) for column in models.User.__table__.columns}
+    user_cache.set(_user_key(db_user.id), values)
+    user_cache.set(f"email:{db_user.email}", {"id": db_user.id})
+
+def _attach_cached_user(db: Session, values: Dict[str, Any]) -> models.User:
+    db_user = models.User(**values)
+    make_transient_to_detached(db_user)
+    return db.merge(db_user, load=False)
+
+def _session_user(db: Session, user_id: int) -> Optional[models.User]:
+    return db.identity_map.get(identity_key(models.User, user_id))
+
+def _user_cache_keys(db_user: models.User) -> List[str]:
+    return [_user_key(db_user.id), f"email:{db_user.email}"]
+
+def invalidate_user(db_user: models.User):
+    """Fjern bruger fra proces-cachen"""
+    for key in _user_cache_keys(db_user):
+        user_cache.invalidate(key)
+
 def get_user(db: Session, user_id: int):
     """Hent bruger på ID"""
-    return db.query(models.User).filter(models.User.id == user_id).first()
+    db_user = _session_user(db, user_id)
+    if db_user is not None:
+        return db_user
+    values = user_cache.get(_user_key(user_id))
+    if values is not None:
+        return _attach_cached_user(db, values)
+    db_user = db.get(models.User, user_id)
+    if db_user is not None:
+        _cache_user(db_user)
+    return db_user
+
+def get_users_by_ids(db: Session, user_ids) -> Dict[int, models.User]:
+    """Hent flere brugere på én gang; ukendte id'er udelades"""
+    users = {}
+    missing = []
+    for user_id in set(user_ids):
+        db_user = _session_user(db, user_id)
+        values = user_cache.get(_user_key(user_id)) if db_user is None else None
+        if db_user is not None:
+            users[user_id] = db_user
+        elif values is not None:
+            users[user_id] = _attach_cached_user(db, values)
+        else:
+            missing.append(user_id)
+    if missing:
+        for db_user in db.query(models.User).filter(models.User.id.in_(missing)):
+            _cache_user(db_user)
+            users[db_user.id] = db_user
+    return users
 
 def get_user_by_email(db: Session, email: str):
     """Hent bruger på email"""
-    return db.query(models.User).filter(models.User.email == email).first()
+    cached = user_cache.get(f"email:{email}")
+    if cached is not None:
+        db_user = get_user(db, cached["id"])
+        if db_user is not None and db_user.email == email:
+            return db_user
+    db_user = db.query(models.User).filter(models.User.email == email).first()
+    if db_user is not None:
+        _cache_user(db_user)
+    return db_user
 
 def get_users(db: Session, skip: int = 0, limit: int = 100):
     """Hent alle brugere med pagination"""
@@ -41,34 +172,193 @@ def update_user(db: Session, user_id: int, user_update: schemas.UserUpdate):
     for field, value in update_data.items():
         setattr(db_user, field, value)
     
+    # Requests embed the full user (requester, approver, comment authors), so
+    # every representation showing this user gets a new version and ETag
+    if update_data:
+        for model, comment_model in (
+            (models.ApprovalRequest, models.ApprovalComment),
+            (models.ArchivedApprovalRequest, models.ArchivedApprovalComment)
+        ):
+            db.execute(
+                update(model)
+                .where(or_(
+                    model.requester_id == user_id,
+                    model.approver_id == user_id,
+                    model.id.in_(select(comment_model.request_id).where(comment_model.user_id == user_id))
+                ))
+                .values(version=model.version + 1)
+                .execution_options(synchronize_session=False)
+            )
+    
+    # Other workers drop their cached copy (role, is_active, ...) when this commits
+    db.execute(event_bus.cache_invalidation("users", _user_cache_keys(db_user)))
     db.commit()
     db.refresh(db_user)
+    invalidate_user(db_user)
     logger.info(f"Updated user: {db_user.email}")
     return db_user
 
 # Approval Request CRUD operations
-def create_approval_request(db: Session, request: schemas.ApprovalRequestCreate, requester_id: int):
+def approval_request_load_options(model=models.ApprovalRequest):
+    """Eager loading af relationer som schemas.ApprovalRequest serialiserer"""
+    # Many-to-one users are joined into the main query; comments and their users
+    # are fetched with one IN-query each, so the query count is fixed per page.
+    comment_model = model.comments.property.mapper.class_
+    return (
+        joinedload(model.requester),
+        joinedload(model.approver),
+        selectinload(model.comments).joinedload(comment_model.user),
+    )
+
+def create_approval_request(
+    db: Session,
+    request: schemas.ApprovalRequestCreate,
+    requester_id: int,
+    ip_address: Optional[str] = None
+):
     """Opret ny godkendelsesanmodning"""
     db_request = models.ApprovalRequest(**request.dict(), requester_id=requester_id)
-    
-    # Generate reference number
-    db_request.reference_number = f"REQ-{datetime.now().strftime('%Y%m%d')}-{db_request.id or 'TMP'}"
-    
     db.add(db_request)
-    db.commit()
-    db.refresh(db_request)
+    # INSERT ... RETURNING brings back the id and server defaults
+    # (reference_number, created_at) without a separate refresh
+    db.flush()
     
-    # Update reference number with actual ID
-    db_request.reference_number = f"REQ-{datetime.now().strftime('%Y%m%d')}-{db_request.id:04d}"
+    # Audit entry, rollup and notification go into the same transaction
+    db.add(models.AuditLog(
+        action="CREATE",
+        entity_type="APPROVAL_REQUEST",
+        entity_id=db_request.id,
+        approval_request_id=db_request.id,
+        user_id=requester_id,
+        new_values={
+            "title": db_request.title,
+            "status": db_request.status.value,
+            "approver_id": db_request.approver_id
+        },
+        ip_address=ip_address
+    ))
+    _update_daily_stats(db, db_request, {
+        "created_count": 1,
+        STATUS_COUNT_COLUMNS[db_request.status]: 1
+    })
+    notifications.stage(db, db_request.approver_id, notifications.new_request_message(db_request))
+    db.execute(event_bus.cache_invalidation("responses", [APPROVAL_REQUESTS]))
     db.commit()
-    db.refresh(db_request)
+    response_cache.invalidate(APPROVAL_REQUESTS)
     
     logger.info(f"Created approval request: {db_request.reference_number}")
     return db_request
 
-def get_approval_request(db: Session, request_id: int):
-    """Hent enkelt godkendelsesanmodning"""
-    return db.query(models.ApprovalRequest).filter(models.ApprovalRequest.id == request_id).first()
+def create_approval_requests_bulk(
+    db: Session,
+    items: List[schemas.ApprovalRequestBulkItem],
+    ip_address: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """Opret mange godkendelsesanmodninger i én transaktion"""
+    # Validate every referenced user with (at most) one query
+    user_ids = {item.requester_id for item in items} | {item.approver_id for item in items}
+    known_users = set(get_users_by_ids(db, user_ids))
+    
+    results: List[Dict[str, Any]] = []
+    valid = []
+    for index, item in enumerate(items):
+        if item.requester_id not in known_users:
+            results.append({"index": index, "error": "Anmoder ikke fundet"})
+        elif item.approver_id not in known_users:
+            results.append({"index": index, "error": "Godkender ikke fundet"})
+        else:
+            results.append({"index": index})
+            valid.append((index, item))
+    if not valid:
+        return results
+    
+    rows = [dict(item.dict(), status=models.ApprovalStatus.PENDING) for index, item in valid]
+    
+    # Multi-row INSERT ... RETURNING (batched by SQLAlchemy's insertmanyvalues);
+    # ids and reference numbers come back in the order the rows were sent
+    created_at = {}
+    inserted = db.execute(
+        insert(models.ApprovalRequest).returning(
+            models.ApprovalRequest.id,
+            models.ApprovalRequest.reference_number,
+            models.ApprovalRequest.created_at,
+            sort_by_parameter_order=True
+        ),
+        rows
+    ).all()
+    for (index, item), row, (row_id, reference_number, row_created_at) in zip(valid, rows, inserted):
+        row["id"] = row_id
+        created_at[row_id] = row_created_at
+        results[index].update(id=row_id, reference_number=reference_number)
+    
+    db.execute(insert(models.AuditLog), [
+        {
+            "action": "CREATE",
+            "entity_type": "APPROVAL_REQUEST",
+            "entity_id": row["id"],
+            "approval_request_id": row["id"],
+            "user_id": row["requester_id"],
+            "new_values": {
+                "title": row["title"],
+                "status": row["status"].value,
+                "approver_id": row["approver_id"]
+            },
+            "ip_address": ip_address
+        }
+        for row in rows
+    ])
+    
+    # One rollup upsert per (day, category, priority), in key order so concurrent
+    # batches lock the rollup rows in the same order and cannot deadlock
+    created_counts: Dict[Tuple, int] = {}
+    for row in rows:
+        key = (_as_utc(created_at[row["id"]]).date(), row["category"], row["priority"])
+        created_counts[key] = created_counts.get(key, 0) + 1
+    db.execute(_DAILY_STATS_UPSERT, [
+        _daily_stats_params(day, category, priority, {
+            "created_count": count,
+            STATUS_COUNT_COLUMNS[models.ApprovalStatus.PENDING]: count
+        })
+        for (day, category, priority), count in sorted(created_counts.items(), key=_rollup_order)
+    ])
+    
+    # One notification per approver instead of one per request; sequence rows
+    # are locked in approver id order for the same reason
+    by_approver: Dict[int, List[Dict[str, Any]]] = {}
+    for row in rows:
+        by_approver.setdefault(row["approver_id"], []).append(row)
+    for approver_id, assigned in sorted(by_approver.items()):
+        notifications.stage(db, approver_id, notifications.new_requests_bulk_message(assigned))
+    
+    db.execute(event_bus.cache_invalidation("responses", [APPROVAL_REQUESTS]))
+    db.commit()
+    response_cache.invalidate(APPROVAL_REQUESTS)
+    
+    logger.info(f"Bulk created {len(rows)} approval requests ({len(items) - len(rows)} rejected)")
+    return results
+
+def _request_models(include_archived: bool):
+    if include_archived:
+        return (models.ApprovalRequest, models.ArchivedApprovalRequest)
+    return (models.ApprovalRequest,)
+
+def get_approval_request(db: Session, request_id: int, include_archived: bool = False):
+    """Hent enkelt godkendelsesanmodning (evt. fra arkivet)"""
+    for model in _request_models(include_archived):
+        db_request = db.query(model).options(
+            *approval_request_load_options(model)
+        ).filter(model.id == request_id).first()
+        if db_request is not None:
+            return db_request
+    return None
+
+def get_approval_request_version(db: Session, request_id: int, include_archived: bool = False) -> Optional[int]:
+    """Hent kun versionen af en anmodning (til ETag-tjek)"""
+    for model in _request_models(include_archived):
+        version = db.query(model.version).filter(model.id == request_id).scalar()
+        if version is not None:
+            return version
+    return None
 
 def get_approval_requests(
     db: Session, 
@@ -79,104 +369,425 @@ def get_approval_requests(
     category: Optional[str] = None,
     approver_id: Optional[int] = None,
     requester_id: Optional[int] = None,
-    search: Optional[str] = None
+    search: Optional[str] = None,
+    cursor: Optional[str] = None,
+    total_mode: str = "exact",
+    include_archived: bool = False
+):
+    """Hent godkendelsesanmodninger med filtre og søgning
+
+    total_mode: "exact" (COUNT), "estimate" (planner-statistik) eller "none".
+    Med cursor seekes der efter (created_at, id) i stedet for OFFSET.
+    Med include_archived flettes arkivet ind i samme sortering.
+    """
+    filters = dict(
+        status=status, priority=priority, category=category, approver_id=approver_id,
+        requester_id=requester_id, search=search, cursor=cursor, total_mode=total_mode
+    )
+    if cursor:
+        skip = 0
+    
+    if not include_archived:
+        requests, total = _request_page(db, models.ApprovalRequest, offset=skip, limit=limit + 1, **filters)
+    else:
+        requests, total = _merged_request_page(db, offset=skip, limit=limit + 1, **filters)
+    
+    next_cursor = None
+    if len(requests) > limit:
+        requests = requests[:limit]
+        last = requests[-1]
+        next_cursor = encode_cursor(last.created_at, last.id, last.search_rank if search else None)
+    
+    return {
+        "requests": requests,
+        "total": total,
+        "total_is_estimate": total_mode == "estimate",
+        "next_cursor": next_cursor
+    }
+
+def _filtered_requests(
+    db: Session,
+    model,
+    status: Optional[str],
+    priority: Optional[str],
+    category: Optional[str],
+    approver_id: Optional[int],
+    requester_id: Optional[int],
+    search: Optional[str]
 ):
-    """Hent godkendelsesanmodninger med filtre og søgning"""
-    query = db.query(models.ApprovalRequest)
+    # One table (approval_requests or its archive) with the list filters;
+    # returns the query and, when searching, its rank expression
+    query = db.query(model)
     
     # Apply filters
     if status:
-        query = query.filter(models.ApprovalRequest.status == status)
+        query = query.filter(model.status == status)
     if priority:
-        query = query.filter(models.ApprovalRequest.priority == priority)
+        query = query.filter(model.priority == priority)
     if category:
-        query = query.filter(models.ApprovalRequest.category == category)
+        query = query.filter(model.category == category)
     if approver_id:
-        query = query.filter(models.ApprovalRequest.approver_id == approver_id)
+        query = query.filter(model.approver_id == approver_id)
     if requester_id:
-        query = query.filter(models.ApprovalRequest.requester_id == requester_id)
+        query = query.filter(model.requester_id == requester_id)
     
-    # Search in title and description
+    # Full-text search (GIN on search_vector) plus trigram-indexed partial
+    # matches on title and reference number
+    rank = None
     if search:
+        ts_query = func.websearch_to_tsquery(SEARCH_CONFIG, search)
         search_filter = or_(
-            models.ApprovalRequest.title.ilike(f"%{search}%"),
-            models.ApprovalRequest.description.ilike(f"%{search}%"),
-            models.ApprovalRequest.reference_number.ilike(f"%{search}%")
+            model.search_vector.op("@@")(ts_query),
+            model.title.ilike(f"%{search}%"),
+            model.reference_number.ilike(f"%{search}%")
         )
         query = query.filter(search_filter)
+        # ts_rank_cd and similarity are real (float4); the cursor carries a
+        # Python float, so the rank is compared, ordered and returned as float8
+        rank = cast(
+            func.ts_rank_cd(model.search_vector, ts_query)
+            + func.similarity(func.coalesce(model.reference_number, ""), search)
+            + func.similarity(model.title, search),
+            Float(53)
+        )
+    return query, rank
+
+def _request_total(db: Session, query, total_mode: str) -> Optional[int]:
+    if total_mode == "exact":
+        return query.count()
+    if total_mode == "estimate":
+        return estimate_row_count(db, query.statement)
+    return None
+
+def _after_cursor(query, model, rank, cursor: Optional[str]):
+    # Keyset pagination: seek past the last row of the previous page
+    if not cursor:
+        return query
+    cursor_created_at, cursor_id, cursor_rank = decode_cursor(cursor)
+    if rank is not None and cursor_rank is not None:
+        return query.filter(
+            tuple_(rank, model.created_at, model.id)
+            < tuple_(literal(cursor_rank, Float(53)), cursor_created_at, cursor_id)
+        )
+    return query.filter(
+        tuple_(model.created_at, model.id)
+        < tuple_(cursor_created_at, cursor_id)
+    )
+
+def _search_headline(model, search: str):
+    # Highlighted description snippet per hit
+    return func.ts_headline(
+        SEARCH_CONFIG,
+        model.description,
+        func.websearch_to_tsquery(SEARCH_CONFIG, search),
+        SEARCH_HEADLINE_OPTIONS
+    )
+
+def _request_page(
+    db: Session,
+    model,
+    offset: int,
+    limit: int,
+    search: Optional[str],
+    cursor: Optional[str],
+    total_mode: str,
+    **filters
+):
+    # One table: filtered, counted and paged
+    query, rank = _filtered_requests(db, model, search=search, **filters)
+    total = _request_total(db, query, total_mode)
+    query = _after_cursor(query, model, rank, cursor)
+    query = query.options(*approval_request_load_options(model))
     
-    # Order by priority and creation date
-    priority_order = {
-        'urgent': 1,
-        'high': 2,
-        'medium': 3,
-        'low': 4
-    }
-    
-    total = query.count()
-    
-    # Order by priority (urgent first) then by creation date (newest first)
-    requests = query.order_by(
-        desc(models.ApprovalRequest.created_at)
-    ).offset(skip).limit(limit).all()
+    if rank is None:
+        # Newest first; id breaks ties so the cursor position is unique
+        requests = query.order_by(
+            desc(model.created_at),
+            desc(model.id)
+        ).offset(offset).limit(limit).all()
+    else:
+        # Most relevant first, with a highlighted description snippet per hit
+        rows = query.add_columns(rank, _search_headline(model, search)).order_by(
+            desc(rank),
+            desc(model.created_at),
+            desc(model.id)
+        ).offset(offset).limit(limit).all()
+        requests = []
+        for db_request, search_rank, search_highlight in rows:
+            db_request.search_rank = search_rank
+            db_request.search_highlight = search_highlight
+            requests.append(db_request)
     
-    return {"requests": requests, "total": total}
+    return requests, total
 
-def update_approval_request(
-    db: Session, 
-    request_id: int, 
-    update: schemas.ApprovalRequestUpdate, 
-    user_id: int
+def _merged_request_page(
+    db: Session,
+    offset: int,
+    limit: int,
+    search: Optional[str],
+    cursor: Optional[str],
+    total_mode: str,
+    **filters
 ):
-    """Opdater godkendelsesanmodning"""
-    db_request = db.query(models.ApprovalRequest).filter(models.ApprovalRequest.id == request_id).first()
-    if not db_request:
-        return None
+    # approval_requests and the archive in one order: a UNION ALL of the
+    # sort keys is ordered, offset and limited in SQL, and only the rows on
+    # the page are loaded afterwards
+    request_models = _request_models(include_archived=True)
+    keys = []
+    total = None if total_mode == "none" else 0
+    for source, model in enumerate(request_models):
+        query, rank = _filtered_requests(db, model, search=search, **filters)
+        model_total = _request_total(db, query, total_mode)
+        if model_total is not None:
+            total += model_total
+        query = _after_cursor(query, model, rank, cursor)
+        keys.append(query.with_entities(
+            literal(source, Integer).label("source"),
+            model.id.label("id"),
+            (rank if rank is not None else literal(0.0, Float(53))).label("rank"),
+            model.created_at.label("created_at")
+        ).statement)
+    merged = union_all(*keys).subquery()
+    order = [desc(merged.c.created_at), desc(merged.c.id)]
+    if search:
+        order.insert(0, desc(merged.c.rank))
+    page = db.execute(select(merged).order_by(*order).offset(offset).limit(limit)).all()
+    
+    loaded = {}
+    for source, model in enumerate(request_models):
+        ids = [row.id for row in page if row.source == source]
+        if not ids:
+            continue
+        query = db.query(model).options(*approval_request_load_options(model)).filter(model.id.in_(ids))
+        if search:
+            for db_request, search_highlight in query.add_columns(_search_headline(model, search)).all():
+                db_request.search_highlight = search_highlight
+                loaded[source, db_request.id] = db_request
+        else:
+            for db_request in query.all():
+                loaded[source, db_request.id] = db_request
     
+    requests = []
+    for row in page:
+        db_request = loaded[row.source, row.id]
+        if search:
+            db_request.search_rank = row.rank
+        requests.append(db_request)
+    return requests, total
+
+def _apply_decision(
+    db_request: models.ApprovalRequest,
+    update: schemas.ApprovalRequestUpdate,
+    user_id: int,
+    now: datetime
+) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any], Dict[str, int], List[Tuple[float, int]]]:
+    """Anvend en beslutning på en låst række
+
+    Returnerer (kommentar, audit-række, rollup-tællere, behandlingstider) til
+    indsættelse af kalderen, så bulk-beslutninger kan samle dem.
+    """
     old_status = db_request.status
+    old_approved_at = db_request.approved_at
     
     # Update status
     db_request.status = update.status
-    db_request.updated_at = datetime.utcnow()
+    db_request.updated_at = now
+    db_request.version = db_request.version + 1
+    
+    # Keep the daily rollup in step with the decision
+    counts = {}
+    processing = []
+    if old_status != update.status:
+        if old_status:
+            counts[STATUS_COUNT_COLUMNS[old_status]] = -1
+        counts[STATUS_COUNT_COLUMNS[update.status]] = 1
     
     # Set approval timestamp for final decisions
     if update.status in [models.ApprovalStatus.APPROVED, models.ApprovalStatus.REJECTED]:
-        db_request.approved_at = datetime.utcnow()
+        db_request.approved_at = now
+        if old_approved_at:
+            processing.append((_processing_seconds(db_request.created_at, old_approved_at), -1))
+        processing.append((_processing_seconds(db_request.created_at, now), 1))
+    
+    # A newly approved request enters the work queue
+    if update.status == models.ApprovalStatus.APPROVED and old_status != update.status:
+        db_request.processed_at = None
+        db_request.lease_owner = None
+        db_request.lease_expires_at = None
+        db_request.delivery_attempts = 0
+        db_request.last_error = None
     
     # Handle escalation
     if update.approver_id:
         db_request.approver_id = update.approver_id
     
-    # Add comment if provided
+    # Comment if provided
+    comment = None
     if update.comment:
-        comment = models.ApprovalComment(
-            content=update.comment,
-            request_id=request_id,
-            user_id=user_id,
-            is_internal=False
-        )
-        db.add(comment)
+        comment = {
+            "content": update.comment,
+            "request_id": db_request.id,
+            "user_id": user_id,
+            "is_internal": False
+        }
     
-    # Create audit log entry
-    audit_entry = models.AuditLog(
-        action="UPDATE",
-        entity_type="APPROVAL_REQUEST",
-        entity_id=request_id,
-        user_id=user_id,
-        old_values=json.dumps({"status": old_status.value}),
-        new_values=json.dumps({"status": update.status.value})
+    # Audit log entry
+    audit_entry = {
+        "action": "UPDATE",
+        "entity_type": "APPROVAL_REQUEST",
+        "entity_id": db_request.id,
+        "approval_request_id": db_request.id,
+        "user_id": user_id,
+        "old_values": {"status": old_status.value},
+        "new_values": {"status": update.status.value}
+    }
+    
+    logger.info(f"Updated approval request {db_request.reference_number}: {old_status.value} -> {update.status.value}")
+    return comment, audit_entry, counts, processing
+
+def update_approval_request(
+    db: Session, 
+    request_id: int, 
+    update: schemas.ApprovalRequestUpdate, 
+    user_id: int
+):
+    """Opdater godkendelsesanmodning"""
+    # Row lock: concurrent decisions on the same request are applied one after the other
+    db_request = db.query(models.ApprovalRequest).filter(
+        models.ApprovalRequest.id == request_id
+    ).with_for_update().first()
+    if not db_request:
+        return None
+    if update.version is not None and update.version != db_request.version:
+        # Release the row lock before the caller turns this into a response
+        db.rollback()
+        raise VersionConflict(request_id, update.version, db_request.version)
+    
+    comment, audit_entry, counts, processing = _apply_decision(db_request, update, user_id, datetime.utcnow())
+    if counts or processing:
+        _update_daily_stats(db, db_request, counts, processing)
+    if comment:
+        db.add(models.ApprovalComment(**comment))
+    db.add(models.AuditLog(**audit_entry))
+    
+    # Notify the requester in the same transaction as the decision
+    decided_by = get_user(db, user_id)
+    notifications.stage(
+        db, db_request.requester_id,
+        notifications.status_update_message(db_request, decided_by.name if decided_by else "")
     )
-    db.add(audit_entry)
     
+    db.execute(event_bus.cache_invalidation("responses", [APPROVAL_REQUESTS]))
     db.commit()
     db.refresh(db_request)
-    
-    logger.info(f"Updated approval request {db_request.reference_number}: {old_status.value} -> {update.status.value}")
+    response_cache.invalidate(APPROVAL_REQUESTS)
+    request_cache.invalidate(request_id)
     return db_request
 
+def apply_decisions_bulk(
+    db: Session,
+    decisions: List[schemas.ApprovalDecision],
+    user_id: int
+) -> List[Dict[str, Any]]:
+    """Anvend mange beslutninger i én transaktion med rækkelåse"""
+    # Lock in id order so concurrent batches cannot deadlock
+    request_ids = sorted({decision.request_id for decision in decisions})
+    locked = {
+        db_request.id: db_request
+        for db_request in db.query(models.ApprovalRequest).options(
+            joinedload(models.ApprovalRequest.requester)
+        ).filter(
+            models.ApprovalRequest.id.in_(request_ids)
+        ).order_by(models.ApprovalRequest.id).with_for_update(of=models.ApprovalRequest)
+    }
+    
+    now = datetime.utcnow()
+    results: List[Dict[str, Any]] = []
+    comments, audit_entries, decided = [], [], []
+    rollup: Dict[Tuple, Tuple[Dict[str, int], List[Tuple[float, int]]]] = {}
+    seen = set()
+    for decision in decisions:
+        result = {"request_id": decision.request_id}
+        results.append(result)
+        db_request = locked.get(decision.request_id)
+        if db_request is None:
+            result["error"] = "Anmodning ikke fundet"
+            continue
+        if decision.request_id in seen:
+            result["error"] = "Anmodningen optræder flere gange"
+            continue
+        seen.add(decision.request_id)
+        if decision.version is not None and decision.version != db_request.version:
+            result.update(
+                conflict=True,
+                error="Anmodningen er ændret af en anden",
+                status=db_request.status,
+                version=db_request.version
+            )
+            continue
+        
+        comment, audit_entry, counts, processing = _apply_decision(db_request, decision, user_id, now)
+        if comment:
+            comments.append(comment)
+        audit_entries.append(audit_entry)
+        if counts or processing:
+            key = (
+                _as_utc(db_request.created_at).date(),
+                db_request.category,
+                db_request.priority or models.Priority.MEDIUM
+            )
+            key_counts, key_processing = rollup.setdefault(key, ({}, []))
+            for counter, delta in counts.items():
+                key_counts[counter] = key_counts.get(counter, 0) + delta
+            key_processing.extend(processing)
+        decided.append(db_request)
+        result.update(applied=True, status=db_request.status, version=db_request.version)
+    
+    if not decided:
+        db.rollback()
+        return results
+    
+    # Batched writes: one INSERT each for comments and audit entries, one upsert per rollup row
+    if comments:
+        db.execute(insert(models.ApprovalComment), comments)
+    db.execute(insert(models.AuditLog), audit_entries)
+    if rollup:
+        # Sorted like the request rows, so concurrent batches lock rollup rows
+        # and notification sequences in the same order
+        db.execute(_DAILY_STATS_UPSERT, [
+            _daily_stats_params(day, category, priority, counts, processing)
+            for (day, category, priority), (counts, processing) in sorted(rollup.items(), key=_rollup_order)
+        ])
+    
+    # One notification per requester
+    decided_by = get_user(db, user_id)
+    by_requester: Dict[int, List[models.ApprovalRequest]] = {}
+    for db_request in decided:
+        by_requester.setdefault(db_request.requester_id, []).append(db_request)
+    for requester_id, requests in sorted(by_requester.items()):
+        if len(requests) == 1:
+            message = notifications.status_update_message(requests[0], decided_by.name if decided_by else "")
+        else:
+            message = notifications.status_updates_bulk_message(requests, decided_by.name if decided_by else "")
+        notifications.stage(db, requester_id, message)
+    
+    db.execute(event_bus.cache_invalidation("responses", [APPROVAL_REQUESTS]))
+    db.commit()
+    response_cache.invalidate(APPROVAL_REQUESTS)
+    for result in results:
+        if result.get("applied"):
+            request_cache.invalidate(result["request_id"])
+    
+    logger.info(f"Applied {len(decided)} of {len(decisions)} decisions for user {user_id}")
+    return results
+
 # Comment operations
 def add_comment(db: Session, request_id: int, user_id: int, content: str, is_internal: bool = False):
-    """Tilføj kommentar til anmodning"""
+    """Tilføj kommentar til anmodning - rejser ValueError hvis brugeren ikke findes"""
+    user = get_user(db, user_id)
+    if user is None:
+        raise ValueError(f"User not found: {user_id}")
+    
     comment = models.ApprovalComment(
         content=content,
         request_id=request_id,
@@ -184,88 +795,489 @@ def add_comment(db: Session, request_id: int, user_id: int, content: str, is_int
         is_internal=is_internal
     )
     db.add(comment)
+    
+    # The comment list is part of the request representation, so it gets a new version (and ETag)
+    db.execute(
+        update(models.ApprovalRequest)
+        .where(models.ApprovalRequest.id == request_id)
+        .values(version=models.ApprovalRequest.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    
+    # Public comments notify the other party of the request
+    if not is_internal:
+        db.flush()
+        db_request = db.get(models.ApprovalRequest, request_id)
+        recipient_id = db_request.requester_id if user_id != db_request.requester_id else db_request.approver_id
+        notifications.stage(db, recipient_id, notifications.new_comment_message(db_request, comment, user.name))
+    
     db.commit()
     db.refresh(comment)
+    request_cache.invalidate(request_id)
     logger.info(f"Added comment to request {request_id}")
     return comment
 
 # Statistics and reporting
-def get_approval_stats(db: Session, days: int = 30) -> schemas.ApprovalStats:
-    """Hent statistikker for godkendelser"""
-    cutoff_date = datetime.utcnow() - timedelta(days=days)
-    
-    # Basic counts
-    total_requests = db.query(models.ApprovalRequest).filter(
-        models.ApprovalRequest.created_at >= cutoff_date
-    ).count()
+STATUS_COUNT_COLUMNS = {
+    models.ApprovalStatus.PENDING: "pending_count",
+    models.ApprovalStatus.APPROVED: "approved_count",
+    models.ApprovalStatus.REJECTED: "rejected_count",
+    models.ApprovalStatus.ESCALATED: "escalated_count",
+    models.ApprovalStatus.CANCELLED: "cancelled_count",
+}
+
+DAILY_STATS_COUNTERS = ["created_count"] + list(STATUS_COUNT_COLUMNS.values())
+
+PERCENTILES = [("p50", 0.5), ("p90", 0.9), ("p99", 0.99)]
+
+# Adds deltas to a rollup row, creating it on first use
+_DAILY_STATS_UPSERT = text(f"""
+    INSERT INTO approval_daily_stats AS s (
+        day, category, priority, {", ".join(DAILY_STATS_COUNTERS)},
+        completed_count, processing_seconds, processing_histogram
+    ) VALUES (
+        :day, :category, :priority, {", ".join(":" + c for c in DAILY_STATS_COUNTERS)},
+        :completed_count, :processing_seconds, :processing_histogram
+    )
+    ON CONFLICT (day, category, priority) DO UPDATE SET
+        {", ".join(f"{c} = s.{c} + EXCLUDED.{c}" for c in DAILY_STATS_COUNTERS)},
+        completed_count = s.completed_count + EXCLUDED.completed_count,
+        processing_seconds = s.processing_seconds + EXCLUDED.processing_seconds,
+        processing_histogram = ARRAY(
+            SELECT old + delta
+            FROM unnest(s.processing_histogram, EXCLUDED.processing_histogram)
+                WITH ORDINALITY AS h(old, delta, i)
+            ORDER BY i
+        )
+""").bindparams(
+    bindparam("day", type_=Date),
+    bindparam("processing_histogram", type_=ARRAY(Integer))
+)
+
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+def _processing_seconds(created_at: datetime, approved_at: datetime) -> float:
+    return (_as_utc(approved_at) - _as_utc(created_at)).total_seconds()
+
+def _update_daily_stats(
+    db: Session,
+    db_request: models.ApprovalRequest,
+    counts: Dict[str, int],
+    processing: Optional[List[Tuple[float, int]]] = None
+):
+    """Læg ændringer til rollup-rækken for anmodningens oprettelsesdag"""
+    db.execute(_DAILY_STATS_UPSERT, _daily_stats_params(
+        _as_utc(db_request.created_at).date(),
+        db_request.category,
+        db_request.priority or models.Priority.MEDIUM,
+        counts,
+        processing
+    ))
+
+def _rollup_order(item) -> Tuple:
+    # Sort key for ((day, category, priority), ...) items; Priority is not orderable
+    (day, category, priority), _ = item
+    return day, category, priority.value
+
+def _daily_stats_params(
+    day,
+    category: str,
+    priority: models.Priority,
+    counts: Dict[str, int],
+    processing: Optional[List[Tuple[float, int]]] = None
+) -> Dict[str, Any]:
+    bounds = models.PROCESSING_HISTOGRAM_BOUNDS_HOURS
+    histogram = [0] * (len(bounds) + 1)
+    completed_count = 0
+    processing_seconds = 0.0
+    for seconds, sign in processing or []:
+        histogram[bisect.bisect_right(bounds, seconds / 3600)] += sign
+        completed_count += sign
+        processing_seconds += sign * seconds
     
-    pending_requests = db.query(models.ApprovalRequest).filter(
-        models.ApprovalRequest.status == models.ApprovalStatus.PENDING,
-        models.ApprovalRequest.created_at >= cutoff_date
-    ).count()
+    params = {counter: counts.get(counter, 0) for counter in DAILY_STATS_COUNTERS}
+    params.update(
+        day=day,
+        category=category,
+        priority=priority.value,
+        completed_count=completed_count,
+        processing_seconds=processing_seconds,
+        processing_histogram=histogram
+    )
+    return params
+
+def rebuild_daily_stats(db: Session):
+    """Genopbyg rollup-tabellen fra approval_requests og arkivet"""
+    hours = "(EXTRACT(epoch FROM approved_at - created_at) / 3600)::float8"
+    bounds = ", ".join(str(b) for b in models.PROCESSING_HISTOGRAM_BOUNDS_HOURS)
+    buckets = ", ".join(
+        f"count(*) FILTER (WHERE approved_at IS NOT NULL AND width_bucket({hours}, ARRAY[{bounds}]::float8[]) = {i})"
+        for i in range(len(models.PROCESSING_HISTOGRAM_BOUNDS_HOURS) + 1)
+    )
+    status_counts = ", ".join(
+        f"count(*) FILTER (WHERE status = '{status.name}')" for status in STATUS_COUNT_COLUMNS
+    )
+    db.execute(text("DELETE FROM approval_daily_stats"))
+    db.execute(text(f"""
+        INSERT INTO approval_daily_stats (
+            day, category, priority, {", ".join(DAILY_STATS_COUNTERS)},
+            completed_count, processing_seconds, processing_histogram
+        )
+        SELECT
+            (created_at AT TIME ZONE 'UTC')::date,
+            category,
+            lower(coalesce(priority::text, 'MEDIUM')),
+            count(*),
+            {status_counts},
+            count(*) FILTER (WHERE approved_at IS NOT NULL),
+            coalesce(sum(EXTRACT(epoch FROM approved_at - created_at)), 0),
+            ARRAY[{buckets}]
+        FROM (
+            SELECT created_at, category, priority, status, approved_at FROM approval_requests
+            UNION ALL
+            SELECT created_at, category, priority, status, approved_at FROM approval_requests_archive
+        ) AS r
+        WHERE created_at IS NOT NULL
+        GROUP BY 1, 2, 3
+    """))
+
+def _histogram_percentiles(histogram: List[int]) -> Dict[str, float]:
+    """Anslå percentiler (timer) ved interpolation i histogrammet"""
+    total = sum(histogram)
+    if not total:
+        return {}
     
-    approved_requests = db.query(models.ApprovalRequest).filter(
-        models.ApprovalRequest.status == models.ApprovalStatus.APPROVED,
-        models.ApprovalRequest.created_at >= cutoff_date
-    ).count()
-    
-    rejected_requests = db.query(models.ApprovalRequest).filter(
-        models.ApprovalRequest.status == models.ApprovalStatus.REJECTED,
-        models.ApprovalRequest.created_at >= cutoff_date
-    ).count()
-    
-    # Average processing time
-    completed_requests = db.query(models.ApprovalRequest).filter(
-        models.ApprovalRequest.approved_at.isnot(None),
-        models.ApprovalRequest.created_at >= cutoff_date
+    bounds = models.PROCESSING_HISTOGRAM_BOUNDS_HOURS
+    result = {}
+    for name, fraction in PERCENTILES:
+        target = fraction * total
+        cumulative = 0
+        for i, count in enumerate(histogram):
+            if count and cumulative + count >= target:
+                lower = bounds[i - 1] if i > 0 else 0
+                if i < len(bounds):
+                    value = lower + (bounds[i] - lower) * (target - cumulative) / count
+                else:
+                    value = lower  # open-ended top bucket
+                result[name] = round(value, 2)
+                break
+            cumulative += count
+    return result
+
+def get_approval_stats(db: Session, days: int = 30) -> schemas.ApprovalStats:
+    """Hent statistikker for godkendelser fra den daglige rollup"""
+    cutoff_day = (datetime.utcnow() - timedelta(days=days)).date()
+    rows = db.query(models.ApprovalDailyStats).filter(
+        models.ApprovalDailyStats.day >= cutoff_day
     ).all()
     
-    if completed_requests:
-        total_time = sum([
-            (req.approved_at - req.created_at).total_seconds() 
-            for req in completed_requests
-        ])
-        avg_processing_time_hours = total_time / len(completed_requests) / 3600
-    else:
-        avg_processing_time_hours = 0.0
+    totals = {counter: 0 for counter in DAILY_STATS_COUNTERS}
+    completed_count = 0
+    processing_seconds = 0.0
+    requests_by_priority: Dict[str, int] = {}
+    requests_by_category: Dict[str, int] = {}
+    histogram_size = len(models.PROCESSING_HISTOGRAM_BOUNDS_HOURS) + 1
+    overall_histogram = [0] * histogram_size
+    category_histograms: Dict[str, List[int]] = {}
+    priority_histograms: Dict[str, List[int]] = {}
     
-    # Requests by priority
-    priority_stats = db.query(
-        models.ApprovalRequest.priority,
-        func.count(models.ApprovalRequest.id)
-    ).filter(
-        models.ApprovalRequest.created_at >= cutoff_date
-    ).group_by(models.ApprovalRequest.priority).all()
+    for row in rows:
+        for counter in DAILY_STATS_COUNTERS:
+            totals[counter] += getattr(row, counter)
+        completed_count += row.completed_count
+        processing_seconds += row.processing_seconds
+        requests_by_priority[row.priority] = requests_by_priority.get(row.priority, 0) + row.created_count
+        requests_by_category[row.category] = requests_by_category.get(row.category, 0) + row.created_count
+        
+        for histogram in (
+            overall_histogram,
+            category_histograms.setdefault(row.category, [0] * histogram_size),
+            priority_histograms.setdefault(row.priority, [0] * histogram_size)
+        ):
+            for i, count in enumerate(row.processing_histogram):
+                histogram[i] += count
     
-    requests_by_priority = {str(priority.value): count for priority, count in priority_stats}
+    avg_processing_time_hours = processing_seconds / completed_count / 3600 if completed_count else 0.0
     
-    # Requests by category
-    category_stats = db.query(
-        models.ApprovalRequest.category,
-        func.count(models.ApprovalRequest.id)
-    ).filter(
-        models.ApprovalRequest.created_at >= cutoff_date
-    ).group_by(models.ApprovalRequest.category).all()
-    
-    requests_by_category = {category: count for category, count in category_stats}
+    percentiles = {"overall": _histogram_percentiles(overall_histogram), "by_category": {}, "by_priority": {}}
+    for key, histograms in (("by_category", category_histograms), ("by_priority", priority_histograms)):
+        for name, histogram in histograms.items():
+            if any(histogram):
+                percentiles[key][name] = _histogram_percentiles(histogram)
     
     return schemas.ApprovalStats(
-        total_requests=total_requests,
-        pending_requests=pending_requests,
-        approved_requests=approved_requests,
-        rejected_requests=rejected_requests,
+        total_requests=totals["created_count"],
+        pending_requests=totals["pending_count"],
+        approved_requests=totals["approved_count"],
+        rejected_requests=totals["rejected_count"],
         avg_processing_time_hours=avg_processing_time_hours,
-        requests_by_priority=requests_by_priority,
-        requests_by_category=requests_by_category
+        requests_by_priority={k: v for k, v in requests_by_priority.items() if v},
+        requests_by_category={k: v for k, v in requests_by_category.items() if v},
+        processing_time_percentiles=percentiles
+    )
+
+def get_approval_stats_for_period(
+    db: Session,
+    start: datetime,
+    end: Optional[datetime] = None
+) -> schemas.ApprovalStats:
+    """Hent statistikker for en vilkårlig periode i én aggregeret forespørgsel"""
+    # Finished requests may have been moved to the archive; count both tables
+    branches = []
+    for model in _request_models(include_archived=True):
+        branch = select(
+            model.id, model.category, model.priority, model.status, model.created_at, model.approved_at
+        ).where(model.created_at >= start)
+        if end:
+            branch = branch.where(model.created_at < end)
+        branches.append(branch)
+    request = union_all(*branches).subquery("r").c
+    processing_seconds = func.extract("epoch", request.approved_at - request.created_at)
+    fractions = [fraction for _, fraction in PERCENTILES]
+    
+    query = db.query(
+        request.category,
+        request.priority,
+        func.grouping(request.category),
+        func.grouping(request.priority),
+        func.count(request.id),
+        func.count(request.id).filter(request.status == models.ApprovalStatus.PENDING),
+        func.count(request.id).filter(request.status == models.ApprovalStatus.APPROVED),
+        func.count(request.id).filter(request.status == models.ApprovalStatus.REJECTED),
+        func.avg(processing_seconds),
+        func.percentile_cont(array(fractions)).within_group(processing_seconds)
+    )
+    
+    # One scan: the overall totals plus per-category and per-priority groups
+    rows = query.group_by(
+        func.grouping_sets(tuple_(), tuple_(request.category), tuple_(request.priority))
+    ).all()
+    
+    stats = schemas.ApprovalStats(
+        total_requests=0,
+        pending_requests=0,
+        approved_requests=0,
+        rejected_requests=0,
+        avg_processing_time_hours=0.0,
+        requests_by_priority={},
+        requests_by_category={},
+        processing_time_percentiles={"overall": {}, "by_category": {}, "by_priority": {}}
     )
+    
+    for row in rows:
+        (category, priority, category_grouped, priority_grouped,
+         total, pending, approved, rejected, avg_seconds, percentiles) = row
+        hours = {
+            name: round(float(value) / 3600, 2)
+            for (name, _), value in zip(PERCENTILES, percentiles or [])
+            if value is not None
+        }
+        if category_grouped and priority_grouped:
+            stats.total_requests = total
+            stats.pending_requests = pending
+            stats.approved_requests = approved
+            stats.rejected_requests = rejected
+            stats.avg_processing_time_hours = float(avg_seconds) / 3600 if avg_seconds else 0.0
+            stats.processing_time_percentiles["overall"] = hours
+        elif not category_grouped:
+            stats.requests_by_category[category] = total
+            if hours:
+                stats.processing_time_percentiles["by_category"][category] = hours
+        else:
+            key = str(priority.value) if priority else "none"
+            stats.requests_by_priority[key] = total
+            if hours:
+                stats.processing_time_percentiles["by_priority"][key] = hours
+    
+    return stats
 
 def get_overdue_requests(db: Session) -> List[models.ApprovalRequest]:
     """Hent forfaldne anmodninger"""
-    return db.query(models.ApprovalRequest).filter(
+    # /stats/overdue only renders the approver
+    return db.query(models.ApprovalRequest).options(
+        joinedload(models.ApprovalRequest.approver)
+    ).filter(
         models.ApprovalRequest.status == models.ApprovalStatus.PENDING,
         models.ApprovalRequest.due_date < datetime.utcnow()
     ).all()
 
+# Work queue: approved requests waiting to be processed
+def _work_queue_filter():
+    return and_(
+        models.ApprovalRequest.status == models.ApprovalStatus.APPROVED,
+        models.ApprovalRequest.processed_at.is_(None)
+    )
+
+def claim_work_items(
+    db: Session,
+    worker: str,
+    limit: int,
+    lease_seconds: int,
+    max_attempts: int
+) -> List[models.ApprovalRequest]:
+    """Claim godkendte, ubehandlede anmodninger med en lease"""
+    # Rows locked by a concurrent claim are skipped instead of waited on
+    claimable = db.query(models.ApprovalRequest.id).filter(
+        _work_queue_filter(),
+        or_(
+            models.ApprovalRequest.lease_expires_at.is_(None),
+            models.ApprovalRequest.lease_expires_at < func.now()
+        ),
+        models.ApprovalRequest.delivery_attempts < max_attempts
+    ).order_by(
+        models.ApprovalRequest.approved_at, models.ApprovalRequest.id
+    ).limit(limit).with_for_update(skip_locked=True)
+    
+    claimed_ids = db.execute(
+        update(models.ApprovalRequest)
+        .where(models.ApprovalRequest.id.in_(claimable.scalar_subquery()))
+        .values(
+            lease_owner=worker,
+            lease_expires_at=func.now() + timedelta(seconds=lease_seconds),
+            delivery_attempts=models.ApprovalRequest.delivery_attempts + 1,
+            # A claim is not a change to the request itself
+            updated_at=models.ApprovalRequest.updated_at
+        )
+        .returning(models.ApprovalRequest.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    db.commit()
+    
+    if not claimed_ids:
+        return []
+    logger.info(f"Worker {worker} claimed {len(claimed_ids)} work items")
+    return db.query(models.ApprovalRequest).options(
+        *approval_request_load_options()
+    ).filter(
+        models.ApprovalRequest.id.in_(claimed_ids)
+    ).order_by(
+        models.ApprovalRequest.approved_at, models.ApprovalRequest.id
+    ).populate_existing().all()
+
+def _leased_work_item(db: Session, request_id: int, worker: str) -> Optional[models.ApprovalRequest]:
+    db_request = db.query(models.ApprovalRequest).filter(
+        models.ApprovalRequest.id == request_id,
+        _work_queue_filter()
+    ).with_for_update().first()
+    if db_request is None:
+        return None
+    if db_request.lease_owner != worker:
+        raise ValueError(f"Work item {request_id} is not leased by {worker}")
+    return db_request
+
+def ack_work_item(db: Session, request_id: int, worker: str) -> Optional[models.ApprovalRequest]:
+    """Marker claimed anmodning som behandlet"""
+    db_request = _leased_work_item(db, request_id, worker)
+    if db_request is None:
+        return None
+    
+    db_request.processed_at = func.now()
+    db_request.lease_expires_at = None
+    db_request.last_error = None
+    db.add(models.AuditLog(
+        action="PROCESS",
+        entity_type="APPROVAL_REQUEST",
+        entity_id=request_id,
+        approval_request_id=request_id,
+        new_values={"worker": worker, "attempts": db_request.delivery_attempts}
+    ))
+    db.commit()
+    db.refresh(db_request)
+    logger.info(f"Worker {worker} processed request {request_id}")
+    return db_request
+
+def fail_work_item(
+    db: Session,
+    request_id: int,
+    worker: str,
+    error: Optional[str] = None,
+    retry_delay_seconds: int = 0
+) -> Optional[models.ApprovalRequest]:
+    """Frigiv claimed anmodning efter en fejl, så den leveres igen"""
+    db_request = _leased_work_item(db, request_id, worker)
+    if db_request is None:
+        return None
+    
+    db_request.lease_owner = None
+    # Not claimable again until the retry delay has passed
+    db_request.lease_expires_at = func.now() + timedelta(seconds=retry_delay_seconds)
+    db_request.last_error = error
+    db.commit()
+    db.refresh(db_request)
+    logger.warning(f"Worker {worker} failed request {request_id}: {error}")
+    return db_request
+
+def get_work_queue_stats(db: Session, max_attempts: int) -> Dict[str, int]:
+    """Hent antal klar, leasede og opbrugte elementer i arbejdskøen"""
+    leased = and_(
+        models.ApprovalRequest.lease_owner.isnot(None),
+        models.ApprovalRequest.lease_expires_at >= func.now()
+    )
+    exhausted = models.ApprovalRequest.delivery_attempts >= max_attempts
+    row = db.query(
+        func.count().filter(and_(~leased, ~exhausted)),
+        func.count().filter(leased),
+        func.count().filter(and_(~leased, exhausted))
+    ).filter(_work_queue_filter()).one()
+    return {"ready": row[0], "leased": row[1], "exhausted": row[2], "max_attempts": max_attempts}
+
+def get_audit_logs(
+    db: Session,
+    entity_type: Optional[str] = None,
+    entity_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    approval_request_id: Optional[int] = None,
+    action: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = 50
+) -> Dict[str, Any]:
+    """Hent audit log med filtre, nyeste først
+
+    Pagineres med cursor over (created_at, id); der tælles ikke total, da
+    tabellen kan have titusinder af millioner rækker. Et tidsinterval
+    begrænser også hvilke månedspartitioner der scannes.
+    """
+    query = db.query(models.AuditLog)
+    
+    if entity_type:
+        query = query.filter(models.AuditLog.entity_type == entity_type)
+    if entity_id is not None:
+        query = query.filter(models.AuditLog.entity_id == entity_id)
+    if user_id is not None:
+        query = query.filter(models.AuditLog.user_id == user_id)
+    if approval_request_id is not None:
+        query = query.filter(models.AuditLog.approval_request_id == approval_request_id)
+    if action:
+        query = query.filter(models.AuditLog.action == action)
+    if since:
+        query = query.filter(models.AuditLog.created_at >= since)
+    if until:
+        query = query.filter(models.AuditLog.created_at < until)
+    
+    if cursor:
+        cursor_created_at, cursor_id, _ = decode_cursor(cursor)
+        query = query.filter(
+            tuple_(models.AuditLog.created_at, models.AuditLog.id)
+            < tuple_(cursor_created_at, cursor_id)
+        )
+    
+    entries = query.order_by(
+        desc(models.AuditLog.created_at),
+        desc(models.AuditLog.id)
+    ).limit(limit + 1).all()
+    
+    next_cursor = None
+    if len(entries) > limit:
+        entries = entries[:limit]
+        next_cursor = encode_cursor(entries[-1].created_at, entries[-1].id)
+    
+    return {"entries": entries, "next_cursor": next_cursor}
+
 def create_audit_log(
     db: Session,
     action: str,
@@ -275,19 +1287,29 @@ def create_audit_log(
     old_values: Optional[Dict] = None,
     new_values: Optional[Dict] = None,
     ip_address: Optional[str] = None,
-    user_agent: Optional[str] = None
+    user_agent: Optional[str] = None,
+    approval_request_id: Optional[int] = None,
+    durable: bool = False
 ):
-    """Opret audit log entry"""
-    audit_entry = models.AuditLog(
-        action=action,
-        entity_type=entity_type,
-        entity_id=entity_id,
-        user_id=user_id,
-        old_values=json.dumps(old_values) if old_values else None,
-        new_values=json.dumps(new_values) if new_values else None,
-        ip_address=ip_address,
-        user_agent=user_agent
-    )
-    db.add(audit_entry)
-    db.commit()
-    return audit_entry
\ No newline at end of file
+    """Opret audit log entry
+
+    Med durable=True skrives rækken i sessionens transaktion og committes af
+    kalderen; ellers lægges den i kø til audit-skriverens næste batch.
+    """
+    entry = {
+        "action": action,
+        "entity_type": entity_type,
+        "entity_id": entity_id,
+        "user_id": user_id,
+        "approval_request_id": approval_request_id,
+        "old_values": old_values,
+        "new_values": new_values,
+        "ip_address": ip_address,
+        "user_agent": user_agent
+    }
+    if durable:
+        audit_entry = models.AuditLog(**entry)
+        db.add(audit_entry)
+        return audit_entry
+    audit_writer.enqueue(entry)
+    return entry
\ No newline at end of file
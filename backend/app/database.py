@@ -1,5 +1,6 @@
 # backend/app/database.py
 from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
@@ -25,6 +26,32 @@ engine = create_engine(
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine for the async endpoints (asyncpg driver)
+ASYNC_DATABASE_URL = os.getenv(
+    "ASYNC_DATABASE_URL",
+    DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
+)
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_size=int(os.getenv("DB_POOL_SIZE", "10")),
+    max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "20")),
+    pool_pre_ping=True,
+    connect_args={
+        # Prepared statements are cached per asyncpg connection
+        "prepared_statement_cache_size": int(os.getenv("DB_PREPARED_STATEMENT_CACHE_SIZE", "500"))
+    },
+    echo=True if os.getenv("DEBUG") == "true" else False
+)
+
+# expire_on_commit=False so committed objects can be serialized without lazy IO
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 Base = declarative_base()
 
 def get_db():
@@ -35,11 +62,19 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    """Async database dependency for FastAPI"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
 def init_database():
-    """Initialize database tables"""
+    """Initialize database tables and apply schema migrations"""
+    from .migrations import run_migrations
     try:
         Base.metadata.create_all(bind=engine)
         logger.info("Database tables created successfully")
+        run_migrations(engine)
+        logger.info("Database migrations applied")
     except Exception as e:
         logger.error(f"Error creating database tables: {e}")
         raise
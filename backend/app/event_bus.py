@@ -0,0 +1,281 @@
+# backend/app/event_bus.py
+"""
+Cross-worker levering af WebSocket-notifikationer via PostgreSQL LISTEN/NOTIFY
+
+Endpoints publicerer en kompakt hændelse med NOTIFY efter commit. Hver worker
+holder én dedikeret asyncpg-forbindelse med LISTEN og router hændelserne til
+sine lokale WebSocket-forbindelser gennem ConnectionManager.
+"""
+from sqlalchemy import insert, select, delete, text
+from sqlalchemy.sql.elements import TextClause
+from datetime import datetime, timedelta
+from typing import Iterable, Optional, Dict
+import uuid
+import asyncpg
+import asyncio
+import logging
+import json
+import os
+
+from . import models, notifications
+from .cache import CACHES
+from .serialization import dumps
+from .database import DATABASE_URL, async_engine
+from .websocket_manager import manager
+from .work_queue import work_available
+
+logger = logging.getLogger(__name__)
+
+# NOTIFY payloads must stay below 8000 bytes; larger events are stored in
+# event_payloads and sent by reference
+MAX_NOTIFY_PAYLOAD_BYTES = 7900
+
+# Broadcast event ids (migration 5); is_called is false until the first nextval
+_NEXT_EVENT_ID = text("SELECT nextval('approval_event_seq')")
+_CURRENT_EVENT_ID = "SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM approval_event_seq"
+
+class EventBus:
+    """Publicer og modtag notifikationer på tværs af workers"""
+
+    def __init__(
+        self,
+        dsn: str,
+        channel: str = "approval_events",
+        enabled: bool = True,
+        payload_retention: timedelta = timedelta(hours=1)
+    ):
+        self.dsn = dsn
+        self.channel = channel
+        self.enabled = enabled
+        self.payload_retention = payload_retention
+
+        self.listening = False
+        self._listener_task: Optional[asyncio.Task] = None
+        self._dispatch_task: Optional[asyncio.Task] = None
+        self._incoming: asyncio.Queue = asyncio.Queue()
+        # Identifies this worker's own cache invalidations when they come back
+        self.origin = uuid.uuid4().hex
+
+        # Statistics
+        self.published = 0
+        self.received = 0
+        self.published_by_reference = 0
+        self.local_fallbacks = 0
+        self.cache_invalidations = 0
+
+    async def start(self):
+        """Start LISTEN-forbindelse og dispatcher"""
+        if not self.enabled:
+            logger.info("Event bus disabled - notifications are delivered in-process only")
+            # Every broadcast from now on is dispatched, and buffered, in this process
+            manager.reset_replay_floor(await self.current_event_id())
+            return
+        self._dispatch_task = asyncio.create_task(self._dispatch_loop())
+        self._listener_task = asyncio.create_task(self._listen_loop())
+
+    async def stop(self):
+        """Stop baggrundsopgaver"""
+        for task in (self._listener_task, self._dispatch_task):
+            if task:
+                task.cancel()
+        self.listening = False
+
+    # Publishing
+    async def send_to_user(self, message: dict, user_id: int):
+        """Send besked til alle forbindelser for en bruger, på alle workers"""
+        await self._publish({"to": "user", "id": user_id, "msg": message})
+
+    async def send_to_role(self, message: dict, role: str):
+        """Send besked til alle brugere med en rolle, på alle workers"""
+        await self._publish({"to": "role", "role": role, "msg": message})
+
+    async def broadcast_to_all(self, message: dict):
+        """Send besked til alle forbundne brugere, på alle workers"""
+        await self._publish({"to": "all", "msg": message})
+
+    async def notify_work_available(self):
+        """Væk ventende work-queue claims på alle workers"""
+        await self._publish({"to": "work", "msg": {}})
+
+    def cache_invalidation(self, cache: str, keys: Iterable) -> TextClause:
+        """NOTIFY der ugyldiggør cache-nøgler på de andre workers - udføres i skrivetransaktionen"""
+        # Sent on commit like any NOTIFY, so no worker invalidates for a rolled-back write
+        payload = dumps({"to": "cache", "cache": cache, "keys": list(keys), "origin": self.origin})
+        return text("SELECT pg_notify(:channel, :payload)").bindparams(channel=self.channel, payload=payload)
+
+    async def current_event_id(self) -> Optional[int]:
+        """Seneste udstedte broadcast event-id (0 før det første) - None hvis databasen ikke svarer"""
+        try:
+            async with async_engine.connect() as conn:
+                return (await conn.execute(text(_CURRENT_EVENT_ID))).scalar_one()
+        except Exception as e:
+            logger.error(f"Failed to read the current event id: {e}")
+            return None
+
+    async def publish_staged(self, db):
+        """Publicer notifikationer der er skrevet til outbox i sessionens transaktion"""
+        for user_id, message in notifications.take_staged(db):
+            await self.send_to_user(message, user_id)
+
+    async def _publish(self, event: Dict):
+        # Stamp once so every worker delivers the same timestamp
+        event["msg"].setdefault("timestamp", datetime.utcnow().isoformat())
+
+        # Broadcasts get an event id so event streams can resume after a reconnect
+        is_broadcast = event["to"] in ("role", "all")
+
+        if not self.enabled:
+            # Ids come from the database sequence here too, so they keep growing
+            # across restarts and a stale Last-Event-ID is never mistaken for a new one
+            if is_broadcast:
+                try:
+                    async with async_engine.connect() as conn:
+                        event["msg"]["event_id"] = (await conn.execute(_NEXT_EVENT_ID)).scalar_one()
+                except Exception as e:
+                    logger.error(f"Failed to allocate an event id, broadcasting without one: {e}")
+            await self._dispatch(event)
+            return
+
+        try:
+            async with async_engine.begin() as conn:
+                if is_broadcast:
+                    event["msg"]["event_id"] = (await conn.execute(_NEXT_EVENT_ID)).scalar_one()
+                payload = dumps(event)
+                if len(payload.encode()) > MAX_NOTIFY_PAYLOAD_BYTES:
+                    event_id = (await conn.execute(
+                        insert(models.EventPayload).values(payload=payload).returning(models.EventPayload.id)
+                    )).scalar_one()
+                    payload = dumps({"ref": event_id})
+                    self.published_by_reference += 1
+                # Delivered to listeners when this transaction commits
+                await conn.execute(
+                    text("SELECT pg_notify(:channel, :payload)"),
+                    {"channel": self.channel, "payload": payload}
+                )
+            self.published += 1
+        except Exception as e:
+            logger.error(f"Failed to publish event, delivering locally: {e}")
+            self.local_fallbacks += 1
+            await self._dispatch(event)
+            return
+
+        # Without our own LISTEN connection the event would not reach local sockets
+        if not self.listening:
+            self.local_fallbacks += 1
+            await self._dispatch(event)
+
+    # Listening
+    async def _listen_loop(self):
+        """Hold én LISTEN-forbindelse åben og genopret den ved fejl"""
+        backoff = 1
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                closed = asyncio.Event()
+                connection.add_termination_listener(lambda _: closed.set())
+                await connection.add_listener(self.channel, self._on_notification)
+                self.listening = True
+                # Broadcasts published while this worker was not listening never
+                # reached its replay buffer; only later ones can be replayed
+                manager.reset_replay_floor(await connection.fetchval(_CURRENT_EVENT_ID))
+                backoff = 1
+                logger.info(f"Listening for events on channel '{self.channel}'")
+
+                while not closed.is_set():
+                    try:
+                        await asyncio.wait_for(closed.wait(), timeout=600)
+                    except asyncio.TimeoutError:
+                        await self._cleanup_payloads()
+
+                logger.warning("Event bus LISTEN connection closed")
+            except asyncio.CancelledError:
+                if connection and not connection.is_closed():
+                    await connection.close()
+                raise
+            except Exception as e:
+                logger.error(f"Event bus listener error: {e}")
+            finally:
+                self.listening = False
+
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+    def _on_notification(self, connection, pid, channel, payload):
+        # asyncpg callback - hand over to the dispatcher to keep ordering
+        self._incoming.put_nowait(payload)
+
+    async def _dispatch_loop(self):
+        """Router modtagne hændelser til lokale forbindelser i rækkefølge"""
+        while True:
+            payload = await self._incoming.get()
+            try:
+                event = json.loads(payload)
+                if "ref" in event:
+                    event = await self._load_payload(event["ref"])
+                    if event is None:
+                        continue
+                self.received += 1
+                await self._dispatch(event)
+            except Exception as e:
+                logger.error(f"Error dispatching event: {e}")
+
+    async def _load_payload(self, event_id: int) -> Optional[Dict]:
+        async with async_engine.connect() as conn:
+            payload = (await conn.execute(
+                select(models.EventPayload.payload).where(models.EventPayload.id == event_id)
+            )).scalar()
+        if payload is None:
+            logger.warning(f"Event payload {event_id} not found")
+            return None
+        return json.loads(payload)
+
+    async def _cleanup_payloads(self):
+        cutoff = datetime.utcnow() - self.payload_retention
+        try:
+            async with async_engine.begin() as conn:
+                await conn.execute(delete(models.EventPayload).where(models.EventPayload.created_at < cutoff))
+        except Exception as e:
+            logger.error(f"Error cleaning up event payloads: {e}")
+
+    async def _dispatch(self, event: Dict):
+        target = event.get("to")
+        message = event.get("msg")
+        # ConnectionManager only enqueues, so dispatch never waits on a socket
+        if target == "user":
+            manager.send_to_user(message, event["id"])
+        elif target == "role":
+            manager.send_to_role(message, event["role"])
+        elif target == "all":
+            manager.broadcast_to_all(message)
+        elif target == "work":
+            work_available.notify()
+        elif target == "cache":
+            # The writing worker invalidated its own cache after commit
+            if event["origin"] != self.origin:
+                cache = CACHES[event["cache"]]
+                for key in event["keys"]:
+                    cache.invalidate(key)
+                self.cache_invalidations += 1
+        else:
+            logger.warning(f"Unknown event target: {target}")
+
+    def get_stats(self) -> Dict:
+        """Hent statistikker for event bus"""
+        return {
+            "enabled": self.enabled,
+            "listening": self.listening,
+            "channel": self.channel,
+            "published": self.published,
+            "published_by_reference": self.published_by_reference,
+            "received": self.received,
+            "local_fallbacks": self.local_fallbacks,
+            "cache_invalidations": self.cache_invalidations
+        }
+
+# Global event bus instance
+event_bus = EventBus(
+    dsn=DATABASE_URL,
+    channel=os.getenv("EVENT_BUS_CHANNEL", "approval_events"),
+    enabled=os.getenv("EVENT_BUS_ENABLED", "true") == "true"
+)
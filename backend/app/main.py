@@ -1,20 +1,28 @@
 # backend/app/main.py
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends, Query, HTTPException, Request
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends, Query, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from sqlalchemy.orm import Session
 from sqlalchemy.sql import text
 from typing import Optional, List
 import asyncio
+import hashlib
 import logging
+import time
 import os
 import json
 from datetime import datetime
 
-from . import crud, models, schemas
-from .database import SessionLocal, engine, get_db, init_database, check_database_connection
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import crud, async_crud, models, schemas, notifications
+from .database import SessionLocal, engine, async_engine, AsyncSessionLocal, get_db, get_async_db, init_database, check_database_connection
 from .websocket_manager import manager
+from .event_bus import event_bus
+from . import work_queue, sse, audit, archive
+from .cache import response_cache, request_cache, user_cache, APPROVAL_REQUESTS
+from .serialization import FastJSONResponse, dumps_bytes
 
 # Configure logging
 logging.basicConfig(
@@ -39,7 +47,8 @@ app = FastAPI(
     description="Sikker API til håndtering af godkendelsesworkflows i politiske kontorer",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=FastJSONResponse
 )
 
 # Security middleware
@@ -67,12 +76,30 @@ async def startup_event():
     # Start WebSocket ping/pong handler
     asyncio.create_task(manager.handle_ping_pong())
     
+    # Start cross-worker notification delivery
+    await event_bus.start()
+    
+    # Expire old notifications from the outbox
+    asyncio.create_task(notifications.cleanup_loop(notifications.OUTBOX_RETENTION))
+    
+    # Batched audit writes and monthly audit partitions
+    await audit.audit_writer.start()
+    asyncio.create_task(audit.maintenance_loop(audit.RETENTION))
+    
+    # Move finished requests out of the hot table
+    asyncio.create_task(archive.archive_loop(
+        archive.ARCHIVE_AFTER, archive.ARCHIVE_BATCH_SIZE, archive.ARCHIVE_INTERVAL_SECONDS
+    ))
+    
     logger.info("API started successfully")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown"""
     logger.info("Shutting down API")
+    await event_bus.stop()
+    await audit.audit_writer.stop()
+    await async_engine.dispose()
 
 # Root endpoint
 @app.get("/")
@@ -109,28 +136,75 @@ def health_check(db: Session = Depends(get_db)):
     }
 
 # WebSocket endpoint
+async def replay_notifications(websocket: WebSocket, user_id: int, last_seq: int):
+    """Afspil notifikationer brugeren har misset siden last_seq"""
+    try:
+        async with AsyncSessionLocal() as db:
+            missed = await async_crud.get_missed_notifications(
+                db, user_id, last_seq, notifications.REPLAY_LIMIT
+            )
+    except Exception as e:
+        logger.error(f"Error loading missed notifications for user {user_id}: {e}")
+        missed = None
+    
+    if missed is None:
+        # Too many, already expired or ahead of the server - the client has to reload its data
+        manager.send_personal_message({
+            "type": "resync_required",
+            "message": "Notifikationer kunne ikke afspilles - genindlæs data",
+            "last_seq": last_seq
+        }, websocket)
+        manager.replay(websocket, [], resync=True)
+        return
+    
+    manager.replay(websocket, missed)
+
 @app.websocket("/ws/{user_id}")
-async def websocket_endpoint(websocket: WebSocket, user_id: int, role: str = Query(default="user")):
+async def websocket_endpoint(
+    websocket: WebSocket,
+    user_id: int,
+    role: str = Query(default="user"),
+    last_seq: Optional[int] = Query(default=None, ge=0),
+    batch_ms: int = Query(default=0, ge=0, le=250)
+):
     """WebSocket endpoint for real-time notifications"""
-    await manager.connect(websocket, user_id, role)
+    await manager.connect(websocket, user_id, role, last_seq=last_seq, batch_ms=batch_ms)
     try:
+        if last_seq is not None:
+            await replay_notifications(websocket, user_id, last_seq)
+        
         while True:
             data = await websocket.receive_text()
+            manager.touch(websocket)
             
             # Handle ping/pong
             if data == "ping":
-                await websocket.send_text("pong")
+                manager.send_text(websocket, "pong")
+                continue
+            if data == "pong":
+                # Reply to our heartbeat ping; touch() already recorded it
                 continue
             
             # Handle other messages if needed
             try:
                 message = json.loads(data)
-                if message.get("type") == "subscribe":
-                    # Handle subscription to specific events
-                    logger.info(f"User {user_id} subscribed to {message.get('events', [])}")
             except:
                 # Ignore malformed messages
-                pass
+                continue
+            
+            if not isinstance(message, dict):
+                continue
+            if message.get("type") == "subscribe":
+                # Filter role broadcasts by event type, category, priority, department or request
+                try:
+                    filters = manager.subscribe(websocket, message)
+                except (ValueError, TypeError):
+                    manager.send_personal_message({"type": "error", "message": "Ugyldigt abonnement"}, websocket)
+                    continue
+                manager.send_personal_message({"type": "subscribed", "filters": filters}, websocket)
+            elif message.get("type") == "unsubscribe":
+                manager.unsubscribe(websocket)
+                manager.send_personal_message({"type": "subscribed", "filters": {}}, websocket)
                 
     except WebSocketDisconnect:
         manager.disconnect(websocket)
@@ -138,18 +212,62 @@ async def websocket_endpoint(websocket: WebSocket, user_id: int, role: str = Que
         logger.error(f"WebSocket error for user {user_id}: {e}")
         manager.disconnect(websocket)
 
+# Server-Sent Events endpoint
+@app.get("/events/stream")
+async def stream_events(
+    request: Request,
+    user_id: int = Query(..., description="Bruger ID"),
+    role: str = Query("user", description="Rolle der bestemmer hvilke broadcasts der modtages"),
+    status: Optional[List[str]] = Query(None, description="Filter på status"),
+    category: Optional[List[str]] = Query(None, description="Filter på kategori"),
+    approver_id: Optional[List[int]] = Query(None, description="Filter på godkender"),
+    last_event_id: Optional[str] = Query(None, description="Alternativ til Last-Event-ID headeren")
+):
+    """Hændelser som text/event-stream for klienter uden WebSocket"""
+    resume_from = request.headers.get("last-event-id") or last_event_id
+    after_event_id, last_seq = None, None
+    if resume_from:
+        try:
+            after_event_id, last_seq = sse.parse_event_id(resume_from)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Ugyldigt Last-Event-ID")
+    
+    # Registered like a WebSocket, but without heartbeat pings it cannot answer
+    stream = sse.EventStream(after_event_id or 0, last_seq or 0)
+    await manager.connect(stream, user_id, role, last_seq=last_seq, heartbeat=False)
+    manager.subscribe(stream, {"statuses": status, "categories": category, "approver_ids": approver_id})
+    
+    if after_event_id is not None:
+        if not manager.replay_broadcasts(stream, after_event_id):
+            manager.send_personal_message({
+                "type": "resync_required",
+                "message": "Hændelser kunne ikke afspilles - genindlæs data"
+            }, stream)
+        await replay_notifications(stream, user_id, last_seq)
+    
+    async def body():
+        try:
+            async for frame in stream.stream():
+                yield frame
+        finally:
+            manager.disconnect(stream)
+    
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # User endpoints
 @app.post("/users/", response_model=schemas.User, status_code=201)
 def create_user(user: schemas.UserCreate, request: Request, db: Session = Depends(get_db)):
     """Opret ny bruger"""
-    # Check if user already exists
-    db_user = crud.get_user_by_email(db, email=user.email)
-    if db_user:
+    try:
+        db_user = crud.create_user(db=db, user=user)
+    except ValueError:
         raise HTTPException(status_code=400, detail="Email allerede registreret")
     
-    db_user = crud.create_user(db=db, user=user)
-    
-    # Create audit log
+    # Audit entry is queued for the next batch write
     crud.create_audit_log(
         db=db,
         action="CREATE",
@@ -179,61 +297,68 @@ async def create_approval_request(
     request: schemas.ApprovalRequestCreate,
     requester_id: int = Query(..., description="ID på den person der anmoder"),
     request_obj: Request = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Opret ny godkendelsesanmodning"""
-    # Validate requester exists
-    requester = crud.get_user(db, requester_id)
-    if not requester:
+    # Validate requester and approver together (cached users need no query)
+    users = await async_crud.get_users_by_ids(db, [requester_id, request.approver_id])
+    if requester_id not in users:
         raise HTTPException(status_code=404, detail="Anmoder ikke fundet")
-    
-    # Validate approver exists
-    approver = crud.get_user(db, request.approver_id)
-    if not approver:
+    if request.approver_id not in users:
         raise HTTPException(status_code=404, detail="Godkender ikke fundet")
     
-    db_request = crud.create_approval_request(db=db, request=request, requester_id=requester_id)
-    
-    # Create audit log
-    crud.create_audit_log(
+    # One transaction: request, audit entry, rollup and outbox notification
+    db_request = await async_crud.create_approval_request(
         db=db,
-        action="CREATE",
-        entity_type="APPROVAL_REQUEST",
-        entity_id=db_request.id,
-        user_id=requester_id,
-        new_values={
-            "title": db_request.title,
-            "status": db_request.status.value,
-            "approver_id": db_request.approver_id
-        },
+        request=request,
+        requester_id=requester_id,
         ip_address=request_obj.client.host if request_obj and request_obj.client else None
     )
     
-    # Send real-time notification til godkender
-    await manager.send_to_user({
-        "type": "new_request",
-        "request_id": db_request.id,
-        "title": db_request.title,
-        "priority": db_request.priority.value,
-        "requester_name": db_request.requester.name,
-        "amount": db_request.amount,
-        "message": f"Ny godkendelsesanmodning: {db_request.title}",
-        "reference_number": db_request.reference_number
-    }, db_request.approver_id)
+    # Send real-time notification til godkender (written to the outbox on commit)
+    await event_bus.publish_staged(db)
     
     # Notify managers
-    await manager.send_to_role({
-        "type": "approval_assigned",
-        "request_id": db_request.id,
-        "title": db_request.title,
-        "priority": db_request.priority.value,
-        "message": f"Ny anmodning tildelt: {db_request.title}"
-    }, "manager")
+    await event_bus.send_to_role(notifications.approval_assigned_message(db_request), "manager")
     
     return db_request
 
+@app.post("/approval-requests/bulk", response_model=schemas.BulkCreateResult)
+async def create_approval_requests_bulk(
+    bulk: schemas.ApprovalRequestBulkCreate,
+    request_obj: Request = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Opret mange godkendelsesanmodninger på én gang (import)"""
+    results = await async_crud.create_approval_requests_bulk(
+        db,
+        bulk.requests,
+        ip_address=request_obj.client.host if request_obj and request_obj.client else None
+    )
+    created = sum(1 for result in results if "id" in result)
+    
+    # One notification per approver (staged in the transaction) and one for managers
+    if created:
+        await event_bus.publish_staged(db)
+        await event_bus.send_to_role(notifications.approvals_assigned_bulk_message(created), "manager")
+    
+    return schemas.BulkCreateResult(created=created, failed=len(results) - created, results=results)
+
+def _etag_matches(request_obj: Request, etag: str) -> bool:
+    # If-None-Match may hold several (weak) tags or "*"
+    header = request_obj.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in tags or etag in tags
+
+def _not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
 @app.get("/approval-requests/", response_model=schemas.ApprovalRequestList)
 def read_approval_requests(
+    request_obj: Request,
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
     status: Optional[str] = Query(None, description="Filter på status"),
@@ -242,35 +367,81 @@ def read_approval_requests(
     approver_id: Optional[int] = Query(None, description="Filter på godkender"),
     requester_id: Optional[int] = Query(None, description="Filter på anmoder"),
     search: Optional[str] = Query(None, description="Søg i titel og beskrivelse"),
+    cursor: Optional[str] = Query(None, description="Cursor fra forrige sides next_cursor"),
+    total_mode: str = Query("exact", pattern="^(exact|estimate|none)$", description="Beregning af total"),
+    include_archived: bool = Query(False, description="Medtag arkiverede anmodninger"),
     db: Session = Depends(get_db)
 ):
     """Hent godkendelsesanmodninger med filtre"""
-    result = crud.get_approval_requests(
-        db, 
-        skip=skip, 
-        limit=limit, 
-        status=status,
-        priority=priority,
-        category=category,
-        approver_id=approver_id,
-        requester_id=requester_id,
-        search=search
-    )
+    try:
+        result = crud.get_approval_requests(
+            db, 
+            skip=skip, 
+            limit=limit, 
+            status=status,
+            priority=priority,
+            category=category,
+            approver_id=approver_id,
+            requester_id=requester_id,
+            search=search,
+            cursor=cursor,
+            total_mode=total_mode,
+            include_archived=include_archived
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Ugyldig cursor")
+    
+    # The page changes when a row on it gets a new version, or the total/next page moves.
+    # The query has run by now: a match saves serialization and transfer, not database work
+    fingerprint = ",".join(f"{req.id}-{req.version}" for req in result["requests"])
+    fingerprint += f"|{result['total']}|{result['next_cursor']}"
+    etag = f'"{hashlib.blake2b(fingerprint.encode(), digest_size=16).hexdigest()}"'
+    if _etag_matches(request_obj, etag):
+        return _not_modified(etag)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
     
     return schemas.ApprovalRequestList(
         requests=result["requests"],
         total=result["total"],
+        total_is_estimate=result["total_is_estimate"],
         page=skip // limit + 1,
-        per_page=limit
+        per_page=limit,
+        next_cursor=result["next_cursor"]
     )
 
 @app.get("/approval-requests/{request_id}", response_model=schemas.ApprovalRequest)
-def read_approval_request(request_id: int, db: Session = Depends(get_db)):
+def read_approval_request(
+    request_id: int,
+    request_obj: Request,
+    include_archived: bool = Query(False, description="Søg også i arkivet"),
+    db: Session = Depends(get_db)
+):
     """Hent enkelt godkendelsesanmodning"""
-    db_request = crud.get_approval_request(db, request_id=request_id)
-    if db_request is None:
+    # A single-column lookup decides between 304, a cached body and a full load
+    version = crud.get_approval_request_version(db, request_id=request_id, include_archived=include_archived)
+    if version is None:
         raise HTTPException(status_code=404, detail="Anmodning ikke fundet")
-    return db_request
+    etag = f'"{request_id}-{version}"'
+    if _etag_matches(request_obj, etag):
+        return _not_modified(etag)
+    
+    body = request_cache.get(request_id, version)
+    if body is None:
+        db_request = crud.get_approval_request(db, request_id=request_id, include_archived=include_archived)
+        if db_request is None:
+            raise HTTPException(status_code=404, detail="Anmodning ikke fundet")
+        # The row may have moved on since the version lookup; tag what was loaded
+        version = db_request.version
+        etag = f'"{request_id}-{version}"'
+        body = dumps_bytes(schemas.ApprovalRequest.model_validate(db_request).model_dump(mode="json"))
+        request_cache.set(request_id, version, body)
+    
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": "no-cache"}
+    )
 
 @app.put("/approval-requests/{request_id}", response_model=schemas.ApprovalRequest)
 async def update_approval_request(
@@ -278,83 +449,216 @@ async def update_approval_request(
     update: schemas.ApprovalRequestUpdate,
     user_id: int = Query(..., description="ID på den bruger der opdaterer"),
     request_obj: Request = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Opdater godkendelsesanmodning (godkend/afvis)"""
     # Validate user exists
-    user = crud.get_user(db, user_id)
+    user = await async_crud.get_user(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="Bruger ikke fundet")
     
-    db_request = crud.update_approval_request(
-        db, request_id=request_id, update=update, user_id=user_id
-    )
+    try:
+        db_request = await async_crud.update_approval_request(
+            db, request_id=request_id, update=update, user_id=user_id
+        )
+    except crud.VersionConflict:
+        raise HTTPException(status_code=409, detail="Anmodningen er ændret af en anden - genindlæs og prøv igen")
     
     if not db_request:
         raise HTTPException(status_code=404, detail="Anmodning ikke fundet")
     
-    # Send real-time notification til anmoder
-    status_text = {
-        "approved": "godkendt",
-        "rejected": "afvist",
-        "escalated": "eskaleret"
-    }.get(update.status.value, update.status.value)
-    
-    await manager.send_to_user({
-        "type": "status_update",
-        "request_id": db_request.id,
-        "status": db_request.status.value,
-        "title": db_request.title,
-        "decided_by": user.name,
-        "message": f"Din anmodning '{db_request.title}' er blevet {status_text}",
-        "reference_number": db_request.reference_number
-    }, db_request.requester_id)
+    # Send real-time notification til anmoder (written to the outbox on commit)
+    await event_bus.publish_staged(db)
     
     # Notify managers of decision
-    await manager.send_to_role({
-        "type": "approval_decision",
-        "request_id": db_request.id,
-        "status": db_request.status.value,
-        "title": db_request.title,
-        "decided_by": user.name,
-        "message": f"Beslutning truffet: {db_request.title} - {status_text}"
-    }, "manager")
+    await event_bus.send_to_role(notifications.approval_decision_message(db_request, user.name), "manager")
+    
+    # Wake workers waiting for approved requests
+    if db_request.status == models.ApprovalStatus.APPROVED:
+        await event_bus.notify_work_available()
     
     return db_request
 
+# Work queue endpoints (approved, unprocessed requests)
+@app.post("/work-queue/claim", response_model=List[schemas.WorkQueueItem])
+async def claim_work_items(
+    worker: str = Query(..., min_length=1, description="Navn på den worker der behandler"),
+    limit: int = Query(10, ge=1, le=100),
+    lease_seconds: int = Query(300, ge=10, le=3600, description="Lease-varighed"),
+    wait_seconds: float = Query(0, ge=0, le=60, description="Vent på nyt arbejde hvis køen er tom"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Claim godkendte anmodninger der endnu ikke er behandlet"""
+    deadline = time.monotonic() + wait_seconds
+    while True:
+        items = await async_crud.claim_work_items(
+            db, worker, limit, lease_seconds, work_queue.MAX_ATTEMPTS
+        )
+        remaining = deadline - time.monotonic()
+        if items or remaining <= 0:
+            return items
+        # The session has committed, so no connection is held while waiting
+        await work_queue.work_available.wait(min(remaining, work_queue.POLL_INTERVAL_SECONDS))
+
+@app.post("/work-queue/{request_id}/ack", response_model=schemas.WorkQueueItem)
+async def ack_work_item(
+    request_id: int,
+    worker: str = Query(..., min_length=1),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Marker anmodning som behandlet"""
+    try:
+        db_request = await async_crud.ack_work_item(db, request_id, worker)
+    except ValueError:
+        raise HTTPException(status_code=409, detail="Anmodningen er ikke claimet af denne worker")
+    if db_request is None:
+        raise HTTPException(status_code=404, detail="Anmodning ikke fundet i arbejdskøen")
+    return await async_crud.get_approval_request(db, request_id)
+
+@app.post("/work-queue/{request_id}/fail", response_model=schemas.WorkQueueItem)
+async def fail_work_item(
+    request_id: int,
+    worker: str = Query(..., min_length=1),
+    error: Optional[str] = Query(None, description="Fejlbesked"),
+    retry_delay_seconds: int = Query(0, ge=0, le=86400, description="Ventetid før ny levering"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Frigiv anmodning efter fejl, så den leveres igen"""
+    try:
+        db_request = await async_crud.fail_work_item(db, request_id, worker, error, retry_delay_seconds)
+    except ValueError:
+        raise HTTPException(status_code=409, detail="Anmodningen er ikke claimet af denne worker")
+    if db_request is None:
+        raise HTTPException(status_code=404, detail="Anmodning ikke fundet i arbejdskøen")
+    return await async_crud.get_approval_request(db, request_id)
+
+@app.get("/work-queue/stats", response_model=schemas.WorkQueueStats)
+def get_work_queue_stats(db: Session = Depends(get_db)):
+    """Hent status for arbejdskøen"""
+    return crud.get_work_queue_stats(db, work_queue.MAX_ATTEMPTS)
+
+@app.post("/approval-requests/decisions", response_model=schemas.BulkDecisionResult)
+async def decide_approval_requests_bulk(
+    bulk: schemas.ApprovalDecisionBulk,
+    user_id: int = Query(..., description="ID på den bruger der beslutter"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Godkend/afvis/eskaler mange anmodninger i én transaktion"""
+    user = await async_crud.get_user(db, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="Bruger ikke fundet")
+    
+    results = await async_crud.apply_decisions_bulk(db, bulk.decisions, user_id)
+    applied = [result for result in results if result.get("applied")]
+    conflicts = sum(1 for result in results if result.get("conflict"))
+    
+    if applied:
+        # One notification per requester (staged in the transaction) and one for managers
+        await event_bus.publish_staged(db)
+        await event_bus.send_to_role(notifications.approval_decisions_bulk_message(applied, user.name), "manager")
+        if any(result["status"] == models.ApprovalStatus.APPROVED for result in applied):
+            await event_bus.notify_work_available()
+    
+    return schemas.BulkDecisionResult(
+        applied=len(applied),
+        conflicts=conflicts,
+        failed=len(results) - len(applied) - conflicts,
+        results=results
+    )
+
 # Statistics endpoint
 @app.get("/stats/", response_model=schemas.ApprovalStats)
 def get_approval_statistics(
     days: int = Query(30, ge=1, le=365, description="Antal dage at inkludere"),
+    start: Optional[datetime] = Query(None, description="Start på ad-hoc periode (overstyrer days)"),
+    end: Optional[datetime] = Query(None, description="Slut på ad-hoc periode"),
     db: Session = Depends(get_db)
 ):
     """Hent statistikker over godkendelser"""
-    return crud.get_approval_stats(db, days=days)
+    def load_stats():
+        if start:
+            return jsonable_encoder(crud.get_approval_stats_for_period(db, start=start, end=end))
+        return jsonable_encoder(crud.get_approval_stats(db, days=days))
+    
+    return response_cache.get_or_load(
+        APPROVAL_REQUESTS, "stats", load_stats, days=days, start=start, end=end
+    )
 
 @app.get("/stats/overdue")
 def get_overdue_requests(db: Session = Depends(get_db)):
     """Hent forfaldne anmodninger"""
-    overdue = crud.get_overdue_requests(db)
-    return {
-        "count": len(overdue),
-        "requests": [
-            {
-                "id": req.id,
-                "title": req.title,
-                "reference_number": req.reference_number,
-                "due_date": req.due_date,
-                "days_overdue": (datetime.utcnow() - req.due_date).days,
-                "approver": req.approver.name
-            }
-            for req in overdue
-        ]
-    }
+    def load_overdue():
+        overdue = crud.get_overdue_requests(db)
+        return jsonable_encoder({
+            "count": len(overdue),
+            "requests": [
+                {
+                    "id": req.id,
+                    "title": req.title,
+                    "reference_number": req.reference_number,
+                    "due_date": req.due_date,
+                    "days_overdue": (datetime.utcnow() - req.due_date).days,
+                    "approver": req.approver.name
+                }
+                for req in overdue
+            ]
+        })
+    
+    return response_cache.get_or_load(APPROVAL_REQUESTS, "stats_overdue", load_overdue)
+
+@app.get("/stats/cache")
+def get_cache_stats():
+    """Hent statistikker for response-cachen"""
+    stats = response_cache.get_stats()
+    stats["serialized_requests"] = request_cache.get_stats()
+    stats["users"] = user_cache.get_stats()
+    return stats
+
+# Audit log
+@app.get("/audit-logs/", response_model=schemas.AuditLogList)
+def read_audit_logs(
+    entity_type: Optional[str] = Query(None, description="Filter på entitetstype"),
+    entity_id: Optional[int] = Query(None, description="Filter på entitets-ID"),
+    user_id: Optional[int] = Query(None, description="Filter på bruger"),
+    approval_request_id: Optional[int] = Query(None, description="Filter på anmodning"),
+    action: Optional[str] = Query(None, description="Filter på handling"),
+    since: Optional[datetime] = Query(None, description="Fra og med tidspunkt"),
+    until: Optional[datetime] = Query(None, description="Til (ikke med) tidspunkt"),
+    cursor: Optional[str] = Query(None, description="Cursor fra forrige sides next_cursor"),
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    """Hent audit log med filtre (nyeste først)"""
+    try:
+        return crud.get_audit_logs(
+            db,
+            entity_type=entity_type,
+            entity_id=entity_id,
+            user_id=user_id,
+            approval_request_id=approval_request_id,
+            action=action,
+            since=since,
+            until=until,
+            cursor=cursor,
+            limit=limit
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Ugyldig cursor")
+
+@app.get("/stats/audit")
+def get_audit_stats():
+    """Hent statistikker for audit-skriveren"""
+    return audit.audit_writer.get_stats()
 
 # WebSocket statistics
 @app.get("/stats/websocket")
-def get_websocket_stats():
+def get_websocket_stats(user_id: Optional[int] = Query(None, description="Vis forbindelser for en bruger")):
     """Hent WebSocket statistikker"""
-    return manager.get_connection_stats()
+    stats = manager.get_connection_stats()
+    stats["event_bus"] = event_bus.get_stats()
+    if user_id is not None:
+        stats["connections"] = manager.get_user_connection_stats(user_id)
+    return stats
 
 # Comment endpoints
 @app.post("/approval-requests/{request_id}/comments")
@@ -363,31 +667,26 @@ async def add_comment_to_request(
     content: str = Query(..., description="Kommentar indhold"),
     user_id: int = Query(..., description="Bruger ID"),
     is_internal: bool = Query(False, description="Er det en intern kommentar"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Tilføj kommentar til godkendelsesanmodning"""
     # Validate request exists
-    db_request = crud.get_approval_request(db, request_id)
+    db_request = await async_crud.get_approval_request(db, request_id)
     if not db_request:
         raise HTTPException(status_code=404, detail="Anmodning ikke fundet")
     
     # Validate user exists
-    user = crud.get_user(db, user_id)
+    user = await async_crud.get_user(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="Bruger ikke fundet")
     
-    comment = crud.add_comment(db, request_id, user_id, content, is_internal)
-    
-    # Send real-time notification (only for public comments)
-    if not is_internal:
-        await manager.send_to_user({
-            "type": "new_comment",
-            "request_id": request_id,
-            "comment_id": comment.id,
-            "user_name": user.name,
-            "content_preview": content[:100] + "..." if len(content) > 100 else content,
-            "message": f"Ny kommentar på '{db_request.title}'"
-        }, db_request.requester_id if user_id != db_request.requester_id else db_request.approver_id)
+    try:
+        comment = await async_crud.add_comment(db, request_id, user_id, content, is_internal)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Bruger ikke fundet")
+    
+    # Send real-time notification (only public comments are staged)
+    await event_bus.publish_staged(db)
     
     return {"message": "Kommentar tilføjet", "comment_id": comment.id}
 
@@ -0,0 +1,331 @@
+# backend/app/migrations.py
+"""
+Versionerede skemamigreringer
+
+Tabeller oprettes stadig af Base.metadata.create_all; alt derudover
+(indekser, udvidelser, datakonverteringer) ligger her som nummererede
+migreringer, der registreres i schema_migrations og kun køres én gang.
+"""
+from sqlalchemy import text
+from .models import SEARCH_VECTOR_SQL, REFERENCE_NUMBER_SQL
+from sqlalchemy.engine import Engine, Connection
+from typing import Callable, List, Union
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# Advisory lock key so only one worker migrates at a time
+MIGRATION_LOCK_ID = 7140001
+
+Step = Union[str, Callable[[Connection], None]]
+
+class Migration:
+    """En migrering: SQL-strenge eller funktioner der får en Connection"""
+
+    def __init__(self, version: int, description: str, steps: List[Step], transactional: bool = True):
+        self.version = version
+        self.description = description
+        self.steps = steps
+        # Non-transactional migrations run each step in autocommit mode,
+        # which CREATE INDEX CONCURRENTLY requires
+        self.transactional = transactional
+
+# Migration 3's backfill as it was written: the rollup from approval_requests,
+# with histogram buckets for bounds of 1, 2, 4, 8, 12, 24, 48, 72, 120, 168, 336
+# and 720 hours. Frozen here so later changes in crud cannot alter it.
+_BACKFILL_DAILY_STATS = """
+INSERT INTO approval_daily_stats (
+    day, category, priority,
+    created_count, pending_count, approved_count, rejected_count, escalated_count, cancelled_count,
+    completed_count, processing_seconds, processing_histogram
+)
+SELECT
+    (created_at AT TIME ZONE 'UTC')::date,
+    category,
+    lower(coalesce(priority::text, 'MEDIUM')),
+    count(*),
+    count(*) FILTER (WHERE status = 'PENDING'),
+    count(*) FILTER (WHERE status = 'APPROVED'),
+    count(*) FILTER (WHERE status = 'REJECTED'),
+    count(*) FILTER (WHERE status = 'ESCALATED'),
+    count(*) FILTER (WHERE status = 'CANCELLED'),
+    count(*) FILTER (WHERE approved_at IS NOT NULL),
+    coalesce(sum(EXTRACT(epoch FROM approved_at - created_at)), 0),
+    ARRAY[
+        count(*) FILTER (WHERE bucket = 0),
+        count(*) FILTER (WHERE bucket = 1),
+        count(*) FILTER (WHERE bucket = 2),
+        count(*) FILTER (WHERE bucket = 3),
+        count(*) FILTER (WHERE bucket = 4),
+        count(*) FILTER (WHERE bucket = 5),
+        count(*) FILTER (WHERE bucket = 6),
+        count(*) FILTER (WHERE bucket = 7),
+        count(*) FILTER (WHERE bucket = 8),
+        count(*) FILTER (WHERE bucket = 9),
+        count(*) FILTER (WHERE bucket = 10),
+        count(*) FILTER (WHERE bucket = 11),
+        count(*) FILTER (WHERE bucket = 12)
+    ]
+FROM (
+    SELECT
+        created_at, category, priority, status, approved_at,
+        width_bucket(
+            (EXTRACT(epoch FROM approved_at - created_at) / 3600)::float8,
+            ARRAY[1, 2, 4, 8, 12, 24, 48, 72, 120, 168, 336, 720]::float8[]
+        ) AS bucket
+    FROM approval_requests
+) AS r
+WHERE created_at IS NOT NULL
+GROUP BY 1, 2, 3
+"""
+
+def _partition_audit_logs(conn: Connection):
+    # Migration 8: swap in a monthly partitioned audit_logs. Only the empty
+    # structure is created here; audit.maintenance_loop copies the old rows
+    # over in batches after startup (audit.copy_unpartitioned_batch)
+    is_partitioned = conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'audit_logs'::regclass)"
+    )).scalar()
+    if is_partitioned:
+        return
+    conn.execute(text("ALTER TABLE audit_logs RENAME TO audit_logs_unpartitioned"))
+    # The old rows must not pin requests either while they wait to be copied
+    conn.execute(text(
+        "ALTER TABLE audit_logs_unpartitioned DROP CONSTRAINT IF EXISTS audit_logs_approval_request_id_fkey"
+    ))
+    # Keep the id sequence when the old table is dropped
+    conn.execute(text("ALTER SEQUENCE audit_logs_id_seq OWNED BY NONE"))
+    # No foreign key to approval_requests: entries outlive archived requests
+    conn.execute(text("""
+        CREATE TABLE audit_logs (
+            id INTEGER NOT NULL DEFAULT nextval('audit_logs_id_seq'),
+            action VARCHAR NOT NULL,
+            entity_type VARCHAR NOT NULL,
+            entity_id INTEGER,
+            old_values JSONB,
+            new_values JSONB,
+            ip_address VARCHAR,
+            user_agent TEXT,
+            user_id INTEGER REFERENCES users (id),
+            approval_request_id INTEGER,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """))
+    conn.execute(text("ALTER SEQUENCE audit_logs_id_seq OWNED BY audit_logs.id"))
+    # Rows outside every monthly partition land here instead of failing the insert
+    conn.execute(text("CREATE TABLE audit_logs_default PARTITION OF audit_logs DEFAULT"))
+    # This month and the next two, so new entries never go to the default partition
+    conn.execute(text("""
+        DO $$
+        DECLARE
+            month DATE := date_trunc('month', now())::date;
+        BEGIN
+            FOR i IN 0..2 LOOP
+                EXECUTE format(
+                    'CREATE TABLE IF NOT EXISTS %I PARTITION OF audit_logs FOR VALUES FROM (%L) TO (%L)',
+                    'audit_logs_y' || to_char(month, 'YYYY') || 'm' || to_char(month, 'MM'),
+                    month, (month + interval '1 month')::date
+                );
+                month := (month + interval '1 month')::date;
+            END LOOP;
+        END $$
+    """))
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Indexes for the request list, overdue and audit log query shapes", [
+        # Request list: newest first, optionally filtered
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_approval_requests_created_at_id "
+        "ON approval_requests (created_at DESC, id DESC)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_approval_requests_status_created "
+        "ON approval_requests (status, created_at DESC, id DESC)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_approval_requests_approver_status_created "
+        "ON approval_requests (approver_id, status, created_at DESC, id DESC)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_approval_requests_requester_created "
+        "ON approval_requests (requester_id, created_at DESC, id DESC)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_approval_requests_category_created "
+        "ON approval_requests (category, created_at DESC, id DESC)",
+        # Approver inbox: pending requests per approver
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_approval_requests_pending_by_approver "
+        "ON approval_requests (approver_id, created_at DESC, id DESC) WHERE status = 'PENDING'",
+        # /stats/overdue: pending requests with a due date
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_approval_requests_pending_due "
+        "ON approval_requests (due_date) WHERE status = 'PENDING' AND due_date IS NOT NULL",
+        # Comments are loaded per request (selectinload on request_id)
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_approval_comments_request_id "
+        "ON approval_comments (request_id, created_at)",
+        # Audit trail lookups
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_audit_logs_entity_created "
+        "ON audit_logs (entity_type, entity_id, created_at DESC)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_audit_logs_user_created "
+        "ON audit_logs (user_id, created_at DESC)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_audit_logs_request_created "
+        "ON audit_logs (approval_request_id, created_at DESC)",
+        "ANALYZE approval_requests",
+        "ANALYZE audit_logs",
+    ], transactional=False),
+    Migration(2, "Full-text and trigram search on approval_requests", [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "ALTER TABLE approval_requests ADD COLUMN IF NOT EXISTS search_vector tsvector "
+        f"GENERATED ALWAYS AS ({SEARCH_VECTOR_SQL}) STORED",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_approval_requests_search_vector "
+        "ON approval_requests USING gin (search_vector)",
+        # Trigram indexes serve ILIKE '%term%' and similarity() for partial matches
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_approval_requests_title_trgm "
+        "ON approval_requests USING gin (title gin_trgm_ops)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_approval_requests_reference_trgm "
+        "ON approval_requests USING gin (reference_number gin_trgm_ops)",
+        "ANALYZE approval_requests",
+    ], transactional=False),
+    Migration(3, "Backfill the approval_daily_stats rollup", [
+        "DELETE FROM approval_daily_stats",
+        _BACKFILL_DAILY_STATS,
+    ]),
+    Migration(4, "Work queue columns for approved requests", [
+        "ALTER TABLE approval_requests ADD COLUMN IF NOT EXISTS processed_at TIMESTAMPTZ",
+        "ALTER TABLE approval_requests ADD COLUMN IF NOT EXISTS lease_owner VARCHAR",
+        "ALTER TABLE approval_requests ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMPTZ",
+        "ALTER TABLE approval_requests ADD COLUMN IF NOT EXISTS delivery_attempts INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE approval_requests ADD COLUMN IF NOT EXISTS last_error TEXT",
+        # Claim scans approved, unprocessed requests oldest first
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_approval_requests_work_queue "
+        "ON approval_requests (approved_at, id) WHERE status = 'APPROVED' AND processed_at IS NULL",
+    ], transactional=False),
+    Migration(5, "Sequence for broadcast event ids", [
+        "CREATE SEQUENCE IF NOT EXISTS approval_event_seq",
+    ]),
+    Migration(6, "Database-generated reference numbers", [
+        "CREATE SEQUENCE IF NOT EXISTS approval_reference_seq",
+        # Continue above the existing id-based numbers so they cannot collide
+        "SELECT setval('approval_reference_seq', coalesce(max(id), 0) + 1, false) FROM approval_requests",
+        f"ALTER TABLE approval_requests ALTER COLUMN reference_number SET DEFAULT {REFERENCE_NUMBER_SQL}",
+    ]),
+    Migration(7, "Row version for optimistic concurrency", [
+        "ALTER TABLE approval_requests ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1",
+    ]),
+    Migration(8, "Monthly partitioned audit_logs with JSONB values", [
+        _partition_audit_logs,
+        # Migration 1's indexes went with the old table; on a partitioned table
+        # they are created per partition (CONCURRENTLY is not supported here)
+        "CREATE INDEX IF NOT EXISTS ix_audit_logs_entity_created "
+        "ON audit_logs (entity_type, entity_id, created_at DESC)",
+        "CREATE INDEX IF NOT EXISTS ix_audit_logs_user_created "
+        "ON audit_logs (user_id, created_at DESC)",
+        "CREATE INDEX IF NOT EXISTS ix_audit_logs_request_created "
+        "ON audit_logs (approval_request_id, created_at DESC)",
+        # Containment queries on the logged values (old_values @> '{"status": "pending"}')
+        "CREATE INDEX IF NOT EXISTS ix_audit_logs_old_values "
+        "ON audit_logs USING gin (old_values jsonb_path_ops)",
+        "CREATE INDEX IF NOT EXISTS ix_audit_logs_new_values "
+        "ON audit_logs USING gin (new_values jsonb_path_ops)",
+        "ANALYZE audit_logs",
+    ]),
+    Migration(9, "Keyset indexes for the audit log query API", [
+        # Every audit listing orders by (created_at DESC, id DESC); with id in the
+        # index the cursor seek and the order come straight from the index
+        "CREATE INDEX IF NOT EXISTS ix_audit_logs_created_id "
+        "ON audit_logs (created_at DESC, id DESC)",
+        "CREATE INDEX IF NOT EXISTS ix_audit_logs_entity_created_id "
+        "ON audit_logs (entity_type, entity_id, created_at DESC, id DESC)",
+        "CREATE INDEX IF NOT EXISTS ix_audit_logs_user_created_id "
+        "ON audit_logs (user_id, created_at DESC, id DESC)",
+        "CREATE INDEX IF NOT EXISTS ix_audit_logs_request_created_id "
+        "ON audit_logs (approval_request_id, created_at DESC, id DESC)",
+        "CREATE INDEX IF NOT EXISTS ix_audit_logs_action_created_id "
+        "ON audit_logs (action, created_at DESC, id DESC)",
+        # Rows arrive in created_at order, so a BRIN index stays tiny and serves
+        # time-range scans combined with filters that have no index of their own
+        "CREATE INDEX IF NOT EXISTS ix_audit_logs_created_brin "
+        "ON audit_logs USING brin (created_at)",
+        "DROP INDEX IF EXISTS ix_audit_logs_entity_created",
+        "DROP INDEX IF EXISTS ix_audit_logs_user_created",
+        "DROP INDEX IF EXISTS ix_audit_logs_request_created",
+        "ANALYZE audit_logs",
+    ]),
+    Migration(10, "Archive tables for finished approval requests", [
+        # Audit entries keep pointing at requests after they move to the archive
+        "ALTER TABLE audit_logs DROP CONSTRAINT IF EXISTS audit_logs_approval_request_id_fkey",
+        # The archive tables themselves are created by create_all
+        "CREATE INDEX IF NOT EXISTS ix_approval_requests_archive_created_at_id "
+        "ON approval_requests_archive (created_at DESC, id DESC)",
+        "CREATE INDEX IF NOT EXISTS ix_approval_requests_archive_requester_created "
+        "ON approval_requests_archive (requester_id, created_at DESC, id DESC)",
+        "CREATE INDEX IF NOT EXISTS ix_approval_requests_archive_approver_created "
+        "ON approval_requests_archive (approver_id, created_at DESC, id DESC)",
+        "CREATE INDEX IF NOT EXISTS ix_approval_requests_archive_search_vector "
+        "ON approval_requests_archive USING gin (search_vector)",
+        "CREATE INDEX IF NOT EXISTS ix_approval_comments_archive_request_id "
+        "ON approval_comments_archive (request_id, created_at)",
+    ]),
+    Migration(11, "Trigram search on approval_requests_archive", [
+        # Search with include_archived matches ILIKE '%term%' in the archive too
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_approval_requests_archive_title_trgm "
+        "ON approval_requests_archive USING gin (title gin_trgm_ops)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_approval_requests_archive_reference_trgm "
+        "ON approval_requests_archive USING gin (reference_number gin_trgm_ops)",
+        "ANALYZE approval_requests_archive",
+    ], transactional=False),
+]
+
+_CONCURRENT_INDEX = re.compile(r"CREATE (?:UNIQUE )?INDEX CONCURRENTLY IF NOT EXISTS (\w+)")
+
+def _drop_invalid_index(conn: Connection, name: str):
+    # A failed CREATE INDEX CONCURRENTLY leaves an INVALID index behind, which
+    # IF NOT EXISTS would skip on every rerun; drop it so the step rebuilds it
+    invalid = conn.execute(
+        text("SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"),
+        {"name": name}
+    ).scalar()
+    if invalid:
+        logger.warning(f"Dropping invalid index {name} left by an interrupted migration")
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+
+def _run_step(conn: Connection, step: Step):
+    if callable(step):
+        step(conn)
+        return
+    concurrent_index = _CONCURRENT_INDEX.match(step)
+    if concurrent_index:
+        _drop_invalid_index(conn, concurrent_index.group(1))
+    conn.execute(text(step))
+
+def _record(conn: Connection, migration: Migration):
+    conn.execute(
+        text("INSERT INTO schema_migrations (version, description) VALUES (:version, :description)"),
+        {"version": migration.version, "description": migration.description}
+    )
+
+def run_migrations(engine: Engine):
+    """Kør alle migreringer der ikke allerede er anvendt"""
+    # Session-level advisory lock on an autocommit connection, so the lock holder
+    # never sits idle in a transaction that CREATE INDEX CONCURRENTLY would wait on
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as lock_conn:
+        lock_conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+        try:
+            with engine.begin() as conn:
+                conn.execute(text(
+                    "CREATE TABLE IF NOT EXISTS schema_migrations ("
+                    "version INTEGER PRIMARY KEY, "
+                    "description TEXT NOT NULL, "
+                    "applied_at TIMESTAMPTZ NOT NULL DEFAULT now())"
+                ))
+                applied = set(conn.execute(text("SELECT version FROM schema_migrations")).scalars())
+
+            for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+                if migration.version in applied:
+                    continue
+
+                logger.info(f"Applying migration {migration.version}: {migration.description}")
+                if migration.transactional:
+                    with engine.begin() as conn:
+                        for step in migration.steps:
+                            _run_step(conn, step)
+                        _record(conn, migration)
+                else:
+                    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                        for step in migration.steps:
+                            _run_step(conn, step)
+                        _record(conn, migration)
+        finally:
+            lock_conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATION_LOCK_ID})
@@ -1,7 +1,8 @@
 # backend/app/models.py
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Enum, Boolean
-from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy import Column, Integer, String, DateTime, Date, Float, Text, ForeignKey, Enum, Boolean, Computed, UniqueConstraint, Sequence
+from sqlalchemy.dialects.postgresql import TSVECTOR, ARRAY, JSONB
+from sqlalchemy.orm import relationship, deferred
+from sqlalchemy.sql import func, text
 from .database import Base
 import enum
 from datetime import datetime
@@ -28,6 +29,20 @@ class UserRole(enum.Enum):
     SENIOR_MANAGER = "senior_manager"
     ADMIN = "admin"
 
+# Weighted search document: title > reference numbers > description
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('danish', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(reference_number, '') || ' ' || coalesce(external_reference, '')), 'B') || "
+    "setweight(to_tsvector('danish', coalesce(description, '')), 'C')"
+)
+
+# Reference numbers (REQ-YYYYMMDD-0001) are generated by the database on insert
+REFERENCE_SEQUENCE = Sequence("approval_reference_seq", metadata=Base.metadata)
+REFERENCE_NUMBER_SQL = (
+    "'REQ-' || to_char(now(), 'YYYYMMDD') || '-' || "
+    "to_char(nextval('approval_reference_seq'), 'FM9999990000')"
+)
+
 class User(Base):
     """Brugertabel - alle systembrugere"""
     __tablename__ = "users"
@@ -83,15 +98,33 @@ class ApprovalRequest(Base):
     due_date = Column(DateTime(timezone=True), nullable=True)
     
     # Additional metadata
-    reference_number = Column(String, unique=True, nullable=True)
+    reference_number = Column(String, unique=True, nullable=True, server_default=text(REFERENCE_NUMBER_SQL))
     external_reference = Column(String, nullable=True)
     confidentiality_level = Column(String, default="normal")  # normal, confidential, secret
     
+    # Incremented on every decision; used for optimistic concurrency checks
+    version = Column(Integer, nullable=False, server_default="1")
+    
+    # Processing of approved requests through the work queue
+    processed_at = Column(DateTime(timezone=True), nullable=True)
+    lease_owner = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True)
+    delivery_attempts = Column(Integer, nullable=False, server_default="0")
+    last_error = Column(Text, nullable=True)
+    
+    # Full-text search document (Danish), maintained by PostgreSQL
+    search_vector = deferred(Column(TSVECTOR, Computed(SEARCH_VECTOR_SQL, persisted=True)))
+    
     # Relationships
     requester = relationship("User", foreign_keys=[requester_id], back_populates="submitted_requests")
     approver = relationship("User", foreign_keys=[approver_id], back_populates="assigned_requests")
     comments = relationship("ApprovalComment", back_populates="request", cascade="all, delete-orphan")
-    audit_entries = relationship("AuditLog", back_populates="approval_request")
+    # No foreign key: audit entries outlive the move to approval_requests_archive
+    audit_entries = relationship(
+        "AuditLog",
+        primaryjoin="ApprovalRequest.id == foreign(AuditLog.approval_request_id)",
+        back_populates="approval_request"
+    )
 
 class ApprovalComment(Base):
     """Kommentarer til godkendelsesanmodninger"""
@@ -112,30 +145,150 @@ class ApprovalComment(Base):
     request = relationship("ApprovalRequest", back_populates="comments")
     user = relationship("User")
 
+class ArchivedApprovalRequest(Base):
+    """Arkiverede anmodninger - afsluttede anmodninger flyttet fra approval_requests"""
+    __tablename__ = "approval_requests_archive"
+    
+    # Same columns as approval_requests; rows keep their id when they are moved
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    title = Column(String, nullable=False)
+    description = Column(Text, nullable=False)
+    category = Column(String, nullable=False)
+    priority = Column(Enum(Priority))
+    status = Column(Enum(ApprovalStatus))
+    
+    amount = Column(Integer, nullable=True)
+    currency = Column(String)
+    
+    requester_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    approver_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    
+    created_at = Column(DateTime(timezone=True))
+    updated_at = Column(DateTime(timezone=True))
+    approved_at = Column(DateTime(timezone=True), nullable=True)
+    due_date = Column(DateTime(timezone=True), nullable=True)
+    
+    reference_number = Column(String, nullable=True)
+    external_reference = Column(String, nullable=True)
+    confidentiality_level = Column(String)
+    
+    version = Column(Integer, nullable=False)
+    
+    processed_at = Column(DateTime(timezone=True), nullable=True)
+    lease_owner = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True)
+    delivery_attempts = Column(Integer, nullable=False)
+    last_error = Column(Text, nullable=True)
+    
+    search_vector = deferred(Column(TSVECTOR, Computed(SEARCH_VECTOR_SQL, persisted=True)))
+    
+    archived_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    
+    # Relationships
+    requester = relationship("User", foreign_keys=[requester_id])
+    approver = relationship("User", foreign_keys=[approver_id])
+    comments = relationship("ArchivedApprovalComment", back_populates="request")
+
+class ArchivedApprovalComment(Base):
+    """Kommentarer til arkiverede anmodninger"""
+    __tablename__ = "approval_comments_archive"
+    
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    content = Column(Text, nullable=False)
+    is_internal = Column(Boolean)
+    
+    request_id = Column(Integer, ForeignKey("approval_requests_archive.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    
+    created_at = Column(DateTime(timezone=True))
+    updated_at = Column(DateTime(timezone=True))
+    
+    # Relationships
+    request = relationship("ArchivedApprovalRequest", back_populates="comments")
+    user = relationship("User")
+
 class AuditLog(Base):
     """Audit log - sporing af alle systemhændelser"""
     __tablename__ = "audit_logs"
+    # Range-partitioned by month on created_at (migration 8, see audit.py), which
+    # requires created_at in the primary key
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
     action = Column(String, nullable=False)  # CREATE, UPDATE, DELETE, LOGIN, etc.
     entity_type = Column(String, nullable=False)  # USER, APPROVAL_REQUEST, etc.
     entity_id = Column(Integer, nullable=True)
     
     # Details
-    old_values = Column(Text, nullable=True)  # JSON string of old values
-    new_values = Column(Text, nullable=True)  # JSON string of new values
+    old_values = Column(JSONB, nullable=True)
+    new_values = Column(JSONB, nullable=True)
     ip_address = Column(String, nullable=True)
     user_agent = Column(Text, nullable=True)
     
     # Relationships
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
-    approval_request_id = Column(Integer, ForeignKey("approval_requests.id"), nullable=True)
+    # The request may live in approval_requests or approval_requests_archive
+    approval_request_id = Column(Integer, nullable=True)
     
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now())
     
     # Relationships
     user = relationship("User", back_populates="audit_entries")
-    approval_request = relationship("ApprovalRequest", back_populates="audit_entries")
+    approval_request = relationship(
+        "ApprovalRequest",
+        primaryjoin="foreign(AuditLog.approval_request_id) == ApprovalRequest.id",
+        back_populates="audit_entries"
+    )
+
+# Upper bounds (hours) of the processing-time histogram buckets; the last
+# bucket holds everything above the final bound
+PROCESSING_HISTOGRAM_BOUNDS_HOURS = [1, 2, 4, 8, 12, 24, 48, 72, 120, 168, 336, 720]
+
+class ApprovalDailyStats(Base):
+    """Daglig rollup af anmodninger pr. oprettelsesdag, kategori og prioritet"""
+    __tablename__ = "approval_daily_stats"
+    
+    day = Column(Date, primary_key=True)  # UTC date of created_at
+    category = Column(String, primary_key=True)
+    priority = Column(String, primary_key=True)  # Priority enum value
+    
+    # Requests created that day, split by their current status
+    created_count = Column(Integer, nullable=False, server_default="0")
+    pending_count = Column(Integer, nullable=False, server_default="0")
+    approved_count = Column(Integer, nullable=False, server_default="0")
+    rejected_count = Column(Integer, nullable=False, server_default="0")
+    escalated_count = Column(Integer, nullable=False, server_default="0")
+    cancelled_count = Column(Integer, nullable=False, server_default="0")
+    
+    # Processing time (created_at -> approved_at) of decided requests
+    completed_count = Column(Integer, nullable=False, server_default="0")
+    processing_seconds = Column(Float, nullable=False, server_default="0")
+    processing_histogram = Column(ARRAY(Integer), nullable=False)
+
+class EventPayload(Base):
+    """Store notifikationer sendt via NOTIFY som reference"""
+    __tablename__ = "event_payloads"
+    
+    id = Column(Integer, primary_key=True)
+    payload = Column(Text, nullable=False)  # JSON encoded event
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+class NotificationSequence(Base):
+    """Seneste notifikationssekvens pr. bruger"""
+    __tablename__ = "notification_sequences"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    last_seq = Column(Integer, nullable=False, server_default="0")
+
+class NotificationOutbox(Base):
+    """Varig outbox for bruger-notifikationer - afspilles ved genforbindelse"""
+    __tablename__ = "notification_outbox"
+    __table_args__ = (UniqueConstraint("user_id", "seq", name="uq_notification_outbox_user_seq"),)
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    seq = Column(Integer, nullable=False)  # Per-user, monotonically increasing
+    payload = Column(Text, nullable=False)  # JSON encoded message
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
 
 class SystemConfig(Base):
     """Systemkonfiguration"""
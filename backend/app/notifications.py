@@ -0,0 +1,178 @@
+# backend/app/notifications.py
+"""
+Bruger-notifikationer med varig outbox
+
+Notifikationer til en bruger skrives til notification_outbox i samme
+transaktion som ændringen, med et fortløbende sekvensnummer pr. bruger.
+Efter commit publiceres de live via event bus; en klient der genopretter
+forbindelsen med last_seq får de mistede beskeder afspillet fra outboxen.
+"""
+from sqlalchemy import text, delete
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+import asyncio
+import logging
+import os
+
+from . import models
+from .serialization import dumps
+from .database import async_engine
+
+logger = logging.getLogger(__name__)
+
+# Row lock on the user's sequence row serializes concurrent writers per user
+_NEXT_SEQ = text(
+    "INSERT INTO notification_sequences (user_id, last_seq) VALUES (:user_id, 1) "
+    "ON CONFLICT (user_id) DO UPDATE SET last_seq = notification_sequences.last_seq + 1 "
+    "RETURNING last_seq"
+)
+
+# Key in Session.info holding messages staged in the current transaction
+_STAGED_KEY = "staged_notifications"
+
+STATUS_TEXT = {
+    "approved": "godkendt",
+    "rejected": "afvist",
+    "escalated": "eskaleret"
+}
+
+def stage(db: Session, user_id: int, message: Dict) -> Dict:
+    """Skriv notifikation til outbox i den aktuelle transaktion"""
+    seq = db.execute(_NEXT_SEQ, {"user_id": user_id}).scalar_one()
+    message = dict(message, seq=seq)
+    # Stamp now so live delivery and replay carry the same timestamp
+    message.setdefault("timestamp", datetime.utcnow().isoformat())
+    db.add(models.NotificationOutbox(user_id=user_id, seq=seq, payload=dumps(message)))
+    db.info.setdefault(_STAGED_KEY, []).append((user_id, message))
+    return message
+
+def take_staged(db) -> List[Tuple[int, Dict]]:
+    """Hent og nulstil notifikationer der er skrevet i sessionen (efter commit)"""
+    return db.info.pop(_STAGED_KEY, [])
+
+# Message builders
+def _request_fields(db_request: models.ApprovalRequest) -> Dict:
+    # Fields WebSocket subscriptions can filter on
+    return {
+        "request_id": db_request.id,
+        "title": db_request.title,
+        "category": db_request.category,
+        "priority": db_request.priority.value,
+        "status": db_request.status.value,
+        "approver_id": db_request.approver_id,
+        "department": db_request.requester.department
+    }
+
+def new_request_message(db_request: models.ApprovalRequest) -> Dict:
+    return {
+        "type": "new_request",
+        **_request_fields(db_request),
+        "requester_name": db_request.requester.name,
+        "amount": db_request.amount,
+        "message": f"Ny godkendelsesanmodning: {db_request.title}",
+        "reference_number": db_request.reference_number
+    }
+
+def new_requests_bulk_message(rows: List[Dict]) -> Dict:
+    # Coalesced notification for requests created in one bulk call
+    return {
+        "type": "new_requests",
+        "count": len(rows),
+        "request_ids": [row["id"] for row in rows[:100]],
+        "message": f"{len(rows)} nye godkendelsesanmodninger"
+    }
+
+def approvals_assigned_bulk_message(count: int) -> Dict:
+    return {
+        "type": "approvals_assigned",
+        "count": count,
+        "message": f"{count} nye anmodninger tildelt"
+    }
+
+def approval_assigned_message(db_request: models.ApprovalRequest) -> Dict:
+    return {
+        "type": "approval_assigned",
+        **_request_fields(db_request),
+        "message": f"Ny anmodning tildelt: {db_request.title}"
+    }
+
+def status_update_message(db_request: models.ApprovalRequest, decided_by: str) -> Dict:
+    status = db_request.status.value
+    return {
+        "type": "status_update",
+        **_request_fields(db_request),
+        "decided_by": decided_by,
+        "message": f"Din anmodning '{db_request.title}' er blevet {STATUS_TEXT.get(status, status)}",
+        "reference_number": db_request.reference_number
+    }
+
+def status_updates_bulk_message(db_requests: List[models.ApprovalRequest], decided_by: str) -> Dict:
+    # Coalesced status updates for one requester from a bulk decision
+    return {
+        "type": "status_updates",
+        "count": len(db_requests),
+        "updates": [
+            {
+                "request_id": db_request.id,
+                "status": db_request.status.value,
+                "reference_number": db_request.reference_number
+            }
+            for db_request in db_requests[:100]
+        ],
+        "decided_by": decided_by,
+        "message": f"{len(db_requests)} af dine anmodninger er blevet behandlet"
+    }
+
+def approval_decisions_bulk_message(results: List[Dict], decided_by: str) -> Dict:
+    return {
+        "type": "approval_decisions",
+        "count": len(results),
+        "request_ids": [result["request_id"] for result in results[:100]],
+        "decided_by": decided_by,
+        "message": f"{len(results)} beslutninger truffet af {decided_by}"
+    }
+
+def approval_decision_message(db_request: models.ApprovalRequest, decided_by: str) -> Dict:
+    status = db_request.status.value
+    return {
+        "type": "approval_decision",
+        **_request_fields(db_request),
+        "decided_by": decided_by,
+        "message": f"Beslutning truffet: {db_request.title} - {STATUS_TEXT.get(status, status)}"
+    }
+
+def new_comment_message(db_request: models.ApprovalRequest, comment: models.ApprovalComment, user_name: str) -> Dict:
+    content = comment.content
+    return {
+        "type": "new_comment",
+        **_request_fields(db_request),
+        "comment_id": comment.id,
+        "user_name": user_name,
+        "content_preview": content[:100] + "..." if len(content) > 100 else content,
+        "message": f"Ny kommentar på '{db_request.title}'"
+    }
+
+# Retention
+async def cleanup_outbox(retention: timedelta) -> int:
+    """Slet outbox-rækker ældre end retention"""
+    cutoff = datetime.utcnow() - retention
+    async with async_engine.begin() as conn:
+        result = await conn.execute(
+            delete(models.NotificationOutbox).where(models.NotificationOutbox.created_at < cutoff)
+        )
+    return result.rowcount
+
+async def cleanup_loop(retention: timedelta, interval: float = 600):
+    """Ryd periodisk op i outboxen"""
+    while True:
+        try:
+            deleted = await cleanup_outbox(retention)
+            if deleted:
+                logger.info(f"Removed {deleted} expired notifications from outbox")
+        except Exception as e:
+            logger.error(f"Error cleaning up notification outbox: {e}")
+        await asyncio.sleep(interval)
+
+OUTBOX_RETENTION = timedelta(hours=float(os.getenv("NOTIFICATION_RETENTION_HOURS", "72")))
+REPLAY_LIMIT = int(os.getenv("NOTIFICATION_REPLAY_LIMIT", "500"))
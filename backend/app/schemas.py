@@ -1,5 +1,5 @@
 # backend/app/schemas.py
-from pydantic import BaseModel, EmailStr, validator
+from pydantic import BaseModel, EmailStr, Field, validator
 from datetime import datetime
 from typing import Optional, List
 from .models import ApprovalStatus, Priority, UserRole
@@ -56,10 +56,48 @@ class ApprovalRequestBase(BaseModel):
 class ApprovalRequestCreate(ApprovalRequestBase):
     pass
 
+class ApprovalRequestBulkItem(ApprovalRequestCreate):
+    requester_id: int
+
+class ApprovalRequestBulkCreate(BaseModel):
+    requests: List[ApprovalRequestBulkItem] = Field(..., min_length=1, max_length=1000)
+
+class BulkItemResult(BaseModel):
+    index: int  # Position in the submitted list
+    id: Optional[int] = None
+    reference_number: Optional[str] = None
+    error: Optional[str] = None
+
+class BulkCreateResult(BaseModel):
+    created: int
+    failed: int
+    results: List[BulkItemResult]
+
 class ApprovalRequestUpdate(BaseModel):
     status: ApprovalStatus
     comment: Optional[str] = None
     approver_id: Optional[int] = None  # For escalation
+    version: Optional[int] = None  # Expected current version; rejected with 409 if it changed
+
+class ApprovalDecision(ApprovalRequestUpdate):
+    request_id: int
+
+class ApprovalDecisionBulk(BaseModel):
+    decisions: List[ApprovalDecision] = Field(..., min_length=1, max_length=500)
+
+class DecisionResult(BaseModel):
+    request_id: int
+    applied: bool = False
+    conflict: bool = False
+    status: Optional[ApprovalStatus] = None
+    version: Optional[int] = None
+    error: Optional[str] = None
+
+class BulkDecisionResult(BaseModel):
+    applied: int
+    conflicts: int
+    failed: int
+    results: List[DecisionResult]
 
 class ApprovalComment(BaseModel):
     id: int
@@ -80,19 +118,40 @@ class ApprovalRequest(ApprovalRequestBase):
     updated_at: Optional[datetime] = None
     approved_at: Optional[datetime] = None
     reference_number: Optional[str] = None
+    version: int = 1
+    archived_at: Optional[datetime] = None  # Set when served from the archive
     
     requester: User
     approver: User
     comments: List[ApprovalComment] = []
     
+    # Only set for results of a search query
+    search_rank: Optional[float] = None
+    search_highlight: Optional[str] = None
+    
     class Config:
         from_attributes = True
 
+class WorkQueueItem(ApprovalRequest):
+    processed_at: Optional[datetime] = None
+    lease_owner: Optional[str] = None
+    lease_expires_at: Optional[datetime] = None
+    delivery_attempts: int = 0
+    last_error: Optional[str] = None
+
+class WorkQueueStats(BaseModel):
+    ready: int
+    leased: int
+    exhausted: int  # Reached the max delivery attempts
+    max_attempts: int
+
 class ApprovalRequestList(BaseModel):
     requests: List[ApprovalRequest]
-    total: int
+    total: Optional[int] = None  # None when total_mode=none
+    total_is_estimate: bool = False
     page: int
     per_page: int
+    next_cursor: Optional[str] = None
 
 class ApprovalStats(BaseModel):
     total_requests: int
@@ -102,6 +161,8 @@ class ApprovalStats(BaseModel):
     avg_processing_time_hours: float
     requests_by_priority: dict
     requests_by_category: dict
+    # Hours; {"overall": {...}, "by_category": {...}, "by_priority": {...}} with p50/p90/p99
+    processing_time_percentiles: dict = {}
 
 class AuditLogEntry(BaseModel):
     id: int
@@ -109,12 +170,19 @@ class AuditLogEntry(BaseModel):
     entity_type: str
     entity_id: Optional[int]
     user_id: Optional[int]
+    approval_request_id: Optional[int] = None
     created_at: datetime
     ip_address: Optional[str]
+    old_values: Optional[dict] = None
+    new_values: Optional[dict] = None
     
     class Config:
         from_attributes = True
 
+class AuditLogList(BaseModel):
+    entries: List[AuditLogEntry]
+    next_cursor: Optional[str] = None
+
 class WebSocketMessage(BaseModel):
     type: str
     request_id: Optional[int] = None
@@ -0,0 +1,59 @@
+# backend/app/serialization.py
+"""
+JSON-kodning for WebSocket-beskeder og HTTP-svar
+
+Bruger orjson når den er installeret og falder tilbage til stdlib json.
+Koderen kan vælges med JSON_ENCODER=orjson|stdlib.
+"""
+from fastapi.responses import JSONResponse
+from typing import Any, Callable
+import logging
+import json
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+def _stdlib_dumps(obj: Any) -> bytes:
+    return json.dumps(obj, default=str, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def _orjson_dumps(obj: Any) -> bytes:
+    return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS)
+
+ENCODERS = {"stdlib": _stdlib_dumps}
+if orjson is not None:
+    ENCODERS["orjson"] = _orjson_dumps
+
+_dumps: Callable[[Any], bytes] = _stdlib_dumps
+
+def set_encoder(name: str):
+    """Vælg JSON-koder ('orjson' eller 'stdlib')"""
+    global _dumps
+    if name not in ENCODERS:
+        logger.warning(f"JSON encoder '{name}' not available, using stdlib")
+        name = "stdlib"
+    _dumps = ENCODERS[name]
+    logger.info(f"Using {name} JSON encoder")
+
+def get_encoder_name() -> str:
+    return next(name for name, encoder in ENCODERS.items() if encoder is _dumps)
+
+def dumps_bytes(obj: Any) -> bytes:
+    """Kod objekt til UTF-8 JSON bytes"""
+    return _dumps(obj)
+
+def dumps(obj: Any) -> str:
+    """Kod objekt til JSON-tekst (WebSocket text frames)"""
+    return _dumps(obj).decode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse der bruger den valgte JSON-koder"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps_bytes(content)
+
+set_encoder(os.getenv("JSON_ENCODER", "orjson" if orjson is not None else "stdlib"))
@@ -0,0 +1,66 @@
+# backend/app/sse.py
+"""
+Server-Sent Events for integrationer der ikke kan holde en WebSocket
+
+En EventStream registreres i ConnectionManager som en almindelig forbindelse
+og får dermed samme udgående kø, abonnementsfiltre og hændelser. Event-id'er
+har formen "<broadcast event_id>.<bruger seq>", så Last-Event-ID kan genoptage
+både rolle-broadcasts og brugerens egne notifikationer.
+"""
+from typing import AsyncIterator, Tuple
+import asyncio
+import json
+import os
+
+# Comment line sent when nothing else has been sent for this long
+HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+
+def parse_event_id(value: str) -> Tuple[int, int]:
+    """Fortolk et Last-Event-ID som (event_id, seq)"""
+    event_id, _, seq = value.partition(".")
+    return int(event_id), int(seq or 0)
+
+class EventStream:
+    """WebSocket-lignende adapter der formaterer beskeder som SSE-frames"""
+
+    def __init__(self, last_event_id: int = 0, last_seq: int = 0):
+        # Size 1: the connection's writer waits for the response to take each
+        # frame, so a slow reader backs up into the bounded outbound queue
+        self.frames: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self.event_id = last_event_id
+        self.seq = last_seq
+        self.closed = False
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        await self.frames.put(self.format(text))
+
+    async def close(self, code: int = 1000):
+        self.closed = True
+        if not self.frames.full():
+            self.frames.put_nowait(None)
+
+    def format(self, text: str) -> str:
+        message = json.loads(text)
+        lines = []
+        if "event_id" in message or "seq" in message:
+            self.event_id = max(self.event_id, message.get("event_id", 0))
+            self.seq = max(self.seq, message.get("seq", 0))
+            lines.append(f"id: {self.event_id}.{self.seq}")
+        lines.append(f"data: {text}")
+        return "\n".join(lines) + "\n\n"
+
+    async def stream(self) -> AsyncIterator[str]:
+        """Frames til StreamingResponse, med heartbeat-kommentarer"""
+        yield "retry: 5000\n\n"
+        while not self.closed:
+            try:
+                frame = await asyncio.wait_for(self.frames.get(), timeout=HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": heartbeat\n\n"
+                continue
+            if frame is None:
+                break
+            yield frame
@@ -1,54 +1,338 @@
     # backend/app/websocket_manager.py
-from typing import Dict, List, Set
+from typing import Any, Deque, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+from collections import deque
 from fastapi import WebSocket, WebSocketDisconnect
-import json
+from .serialization import dumps
 from datetime import datetime
 import logging
 import asyncio
+import random
+import time
+import os
 
 logger = logging.getLogger(__name__)
 
+# Slow consumer policies for a full outbound queue
+DROP_OLDEST = "drop_oldest"
+DISCONNECT = "disconnect"
+
+# Subscription filter name -> message field it is matched against
+FILTER_FIELDS = {
+    "events": "type",
+    "categories": "category",
+    "priorities": "priority",
+    "departments": "department",
+    "request_ids": "request_id",
+    "statuses": "status",
+    "approver_ids": "approver_id"
+}
+MAX_FILTER_VALUES = 500
+
+class Connection:
+    """Registreringspost for én WebSocket: identitet, udgående kø og writer-task"""
+    
+    __slots__ = (
+        "websocket", "user_id", "role", "connected_at", "last_seen", "ping_sent_at", "wheel_slot",
+        "manager", "queue", "task", "sent", "dropped", "max_depth",
+        "last_seq", "held", "filters",
+        "batch_window", "frames_saved"
+    )
+    
+    def __init__(
+        self,
+        manager: "ConnectionManager",
+        websocket: WebSocket,
+        user_id: int,
+        role: str,
+        batch_window: float = 0.0
+    ):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.role = role  # normalized to lower case
+        self.connected_at = datetime.utcnow()
+        
+        # Heartbeat state (monotonic seconds); last_seen is updated on any inbound message
+        self.last_seen = time.monotonic()
+        self.ping_sent_at: Optional[float] = None
+        self.wheel_slot: Optional[int] = None
+        self.manager = manager
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=manager.max_queue)
+        
+        # Highest notification sequence queued; live messages are held back
+        # (held is a list) while missed notifications are being replayed
+        self.last_seq = 0
+        self.held: Optional[List[Tuple[int, str]]] = None
+        
+        # Subscription filters by message field; None receives everything
+        self.filters: Optional[Dict[str, FrozenSet]] = None
+        
+        # Opt-in frame batching
+        self.batch_window = batch_window
+        self.frames_saved = 0
+        
+        # Statistics
+        self.sent = 0
+        self.dropped = 0
+        self.max_depth = 0
+        
+        self.task = asyncio.create_task(self._run())
+    
+    def enqueue(self, text: str) -> bool:
+        """Læg besked i kø og returner straks - False hvis forbindelsen opgives"""
+        manager = self.manager
+        if self.queue.full():
+            if manager.slow_consumer_policy == DISCONNECT:
+                manager.slow_consumer_disconnects += 1
+                manager._drop_connection(self, "outbound queue full")
+                return False
+            # Drop oldest: make room for the newest message
+            self.queue.get_nowait()
+            self.dropped += 1
+            manager.messages_dropped += 1
+            manager.queued_messages -= 1
+        
+        self.queue.put_nowait(text)
+        manager.queued_messages += 1
+        depth = self.queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+            if depth > manager.peak_queue_depth:
+                manager.peak_queue_depth = depth
+        return True
+    
+    def deliver(self, seq: int, text: str) -> bool:
+        """Læg sekvensnummereret notifikation i kø i rækkefølge og uden dubletter"""
+        if self.held is not None:
+            self.held.append((seq, text))
+            return True
+        if seq <= self.last_seq:
+            # Already queued by the replay
+            return True
+        self.last_seq = seq
+        return self.enqueue(text)
+    
+    async def _send(self, batch: List[str]):
+        manager = self.manager
+        if len(batch) == 1:
+            frame = batch[0]
+        else:
+            # One array frame; raw control texts such as "pong" become JSON strings
+            frame = "[" + ",".join(text if text[:1] in "{[" else dumps(text) for text in batch) + "]"
+            saved = len(batch) - 1
+            self.frames_saved += saved
+            manager.frames_saved += saved
+        
+        # Compression is permessage-deflate, negotiated by uvicorn with the client
+        await self.websocket.send_text(frame)
+    
+    async def _run(self):
+        manager = self.manager
+        queue = self.queue
+        while True:
+            batch = [await queue.get()]
+            manager.queued_messages -= 1
+            if self.batch_window:
+                # Coalesce everything queued within the window into one frame
+                await asyncio.sleep(self.batch_window)
+                while not queue.empty():
+                    batch.append(queue.get_nowait())
+                    manager.queued_messages -= 1
+            try:
+                await asyncio.wait_for(self._send(batch), timeout=manager.send_timeout)
+                self.sent += len(batch)
+                manager.messages_sent += len(batch)
+            except asyncio.CancelledError:
+                raise
+            except asyncio.TimeoutError:
+                manager._drop_connection(self, "send timed out")
+                return
+            except WebSocketDisconnect:
+                manager._drop_connection(self, "disconnected")
+                return
+            except Exception as e:
+                manager._drop_connection(self, f"send failed: {e}")
+                return
+    
+    def close(self):
+        self.manager.queued_messages -= self.queue.qsize()
+        if not self.task.done() and self.task is not asyncio.current_task():
+            self.task.cancel()
+
+class SubscriptionIndex:
+    """Inverteret indeks over abonnementsfiltre"""
+    
+    def __init__(self):
+        # message field -> value -> connections whose filter on that field lists the value
+        self.postings: Dict[str, Dict[Any, Set[Connection]]] = {field: {} for field in FILTER_FIELDS.values()}
+        # Number of filtered fields per subscribed connection
+        self.required: Dict[Connection, int] = {}
+    
+    def add(self, connection: Connection, filters: Dict[str, FrozenSet]):
+        self.remove(connection)
+        if not filters:
+            return
+        connection.filters = filters
+        self.required[connection] = len(filters)
+        for field, values in filters.items():
+            postings = self.postings[field]
+            for value in values:
+                postings.setdefault(value, set()).add(connection)
+    
+    def remove(self, connection: Connection):
+        filters = connection.filters
+        if filters is None:
+            return
+        connection.filters = None
+        del self.required[connection]
+        for field, values in filters.items():
+            postings = self.postings[field]
+            for value in values:
+                members = postings.get(value)
+                if members is not None:
+                    members.discard(connection)
+                    if not members:
+                        del postings[value]
+    
+    def match(self, message: dict) -> Set[Connection]:
+        """Abonnerede forbindelser hvor alle filtre matcher beskeden"""
+        # Count matching fields per connection from the posting lists of the
+        # message's values; a connection matches when every filter it set was hit
+        hits: Dict[Connection, int] = {}
+        for field, postings in self.postings.items():
+            members = postings.get(message.get(field))
+            if members:
+                for connection in members:
+                    hits[connection] = hits.get(connection, 0) + 1
+        required = self.required
+        return {connection for connection, count in hits.items() if count == required[connection]}
+    
+    @staticmethod
+    def matches(connection: Connection, message: dict) -> bool:
+        """Tjek én forbindelses filtre direkte (bruges ved afspilning)"""
+        filters = connection.filters
+        return filters is None or all(message.get(field) in values for field, values in filters.items())
+
+class HeartbeatWheel:
+    """Timing wheel over forbindelsernes næste heartbeat-tjek"""
+    
+    def __init__(self, horizon: float, tick: float = 1.0):
+        self.tick = tick
+        self.slots: List[Set[Connection]] = [set() for _ in range(int(horizon / tick) + 2)]
+        self.current = int(time.monotonic() / tick)
+    
+    def schedule(self, connection: Connection, deadline: float):
+        # Always a future slot, and never more than one revolution ahead
+        ticks = min(max(int(deadline / self.tick), self.current + 1), self.current + len(self.slots) - 1)
+        self.remove(connection)
+        index = ticks % len(self.slots)
+        self.slots[index].add(connection)
+        connection.wheel_slot = index
+    
+    def remove(self, connection: Connection):
+        if connection.wheel_slot is not None:
+            self.slots[connection.wheel_slot].discard(connection)
+            connection.wheel_slot = None
+    
+    def advance(self, now: float) -> List[Connection]:
+        """Ryk hjulet frem til now og returner de forfaldne forbindelser"""
+        target = int(now / self.tick)
+        # After a long stall one revolution covers every slot
+        self.current = max(self.current, target - len(self.slots))
+        due = []
+        while self.current < target:
+            self.current += 1
+            index = self.current % len(self.slots)
+            slot = self.slots[index]
+            if slot:
+                self.slots[index] = set()
+                for connection in slot:
+                    connection.wheel_slot = None
+                due.extend(slot)
+        return due
+
 class ConnectionManager:
     """WebSocket forbindelseshåndtering for real-time notifikationer"""
     
-    def __init__(self):
-        # Active connections: user_id -> list of websocket connections
-        self.active_connections: Dict[int, List[WebSocket]] = {}
+    def __init__(
+        self,
+        max_queue: int = 256,
+        slow_consumer_policy: str = DROP_OLDEST,
+        send_timeout: float = 10.0,
+        heartbeat_interval: float = 30.0,
+        pong_timeout: float = 10.0,
+        replay_buffer_size: int = 1000
+    ):
+        # Registry: socket -> record, plus user and role indexes of records
+        self.connections: Dict[WebSocket, Connection] = {}
+        self.by_user: Dict[int, Set[Connection]] = {}
+        self.by_role: Dict[str, Set[Connection]] = {}
+        self.subscriptions = SubscriptionIndex()
         
-        # User roles for targeted messaging
-        self.user_roles: Dict[WebSocket, str] = {}
+        # Outbound queue settings
+        self.max_queue = max_queue
+        self.slow_consumer_policy = slow_consumer_policy
+        self.send_timeout = send_timeout
         
-        # Connection metadata
-        self.connection_metadata: Dict[WebSocket, Dict] = {}
+        # Heartbeat: ping connections idle for heartbeat_interval, evict after pong_timeout
+        self.heartbeat_interval = heartbeat_interval
+        self.pong_timeout = pong_timeout
+        self.heartbeat = HeartbeatWheel(horizon=2 * heartbeat_interval + pong_timeout)
         
-        # Statistics
-        self.total_connections = 0
+        # Recent broadcasts with an event_id, for resuming event streams:
+        # (event_id, role or None for everyone, message)
+        self.recent_broadcasts: Deque[Tuple[int, Optional[str], dict]] = deque(maxlen=replay_buffer_size)
+        # Every broadcast after this event id is in recent_broadcasts (or was
+        # seen by this process); None until the event bus has reported it
+        self.replay_floor: Optional[int] = None
+        
+        # Statistics (maintained incrementally)
         self.messages_sent = 0
+        self.messages_dropped = 0
+        self.slow_consumer_disconnects = 0
+        self.queued_messages = 0
+        self.peak_queue_depth = 0
+        self.batching_connections = 0
+        self.frames_saved = 0
+        self.pings_sent = 0
+        self.heartbeat_evictions = 0
     
-    async def connect(self, websocket: WebSocket, user_id: int, role: str = "user"):
+    @property
+    def total_connections(self) -> int:
+        return len(self.connections)
+    
+    async def connect(
+        self,
+        websocket: WebSocket,
+        user_id: int,
+        role: str = "user",
+        last_seq: Optional[int] = None,
+        batch_ms: int = 0,
+        heartbeat: bool = True
+    ):
         """Etabler WebSocket forbindelse"""
         try:
             await websocket.accept()
             
-            # Add to active connections
-            if user_id not in self.active_connections:
-                self.active_connections[user_id] = []
-            
-            self.active_connections[user_id].append(websocket)
-            self.user_roles[websocket] = role
-            self.connection_metadata[websocket] = {
-                "user_id": user_id,
-                "role": role,
-                "connected_at": datetime.utcnow(),
-                "last_ping": datetime.utcnow()
-            }
-            
-            self.total_connections += 1
+            connection = Connection(self, websocket, user_id, role.lower(), batch_ms / 1000)
+            self.batching_connections += bool(batch_ms)
+            if last_seq is not None:
+                # Hold live notifications until replay() has queued the missed ones
+                connection.last_seq = last_seq
+                connection.held = []
+            self.connections[websocket] = connection
+            self.by_user.setdefault(user_id, set()).add(connection)
+            self.by_role.setdefault(connection.role, set()).add(connection)
+            # First check at a random point in the next interval, so a reconnect
+            # burst after a deploy does not turn into synchronized pings
+            if heartbeat:
+                self.heartbeat.schedule(
+                    connection, connection.last_seen + self.heartbeat_interval * (1 + random.random())
+                )
             
             logger.info(f"User {user_id} ({role}) connected via WebSocket. Total connections: {self.total_connections}")
             
             # Send welcome message
-            await self.send_personal_message({
+            self.send_personal_message({
                 "type": "connection_established",
                 "message": "Real-time forbindelse etableret",
                 "timestamp": datetime.utcnow().isoformat(),
@@ -61,169 +345,261 @@ class ConnectionManager:
     
     def disconnect(self, websocket: WebSocket):
         """Afbryd WebSocket forbindelse"""
-        user_id = None
-        
-        # Find and remove connection
-        for uid, connections in self.active_connections.items():
-            if websocket in connections:
-                user_id = uid
-                connections.remove(websocket)
-                if not connections:
-                    del self.active_connections[uid]
-                break
-        
-        # Clean up metadata
-        if websocket in self.user_roles:
-            del self.user_roles[websocket]
-        
-        if websocket in self.connection_metadata:
-            del self.connection_metadata[websocket]
+        connection = self.connections.pop(websocket, None)
+        if connection is None:
+            # Already removed (e.g. by a failed send before the receive loop noticed)
+            return
+        connection.close()
+        self.subscriptions.remove(connection)
+        self.heartbeat.remove(connection)
+        self.batching_connections -= bool(connection.batch_window)
         
-        self.total_connections = max(0, self.total_connections - 1)
+        for index, key in ((self.by_user, connection.user_id), (self.by_role, connection.role)):
+            members = index.get(key)
+            if members is not None:
+                members.discard(connection)
+                if not members:
+                    del index[key]
         
-        logger.info(f"User {user_id} disconnected. Total connections: {self.total_connections}")
+        logger.info(f"User {connection.user_id} disconnected. Total connections: {self.total_connections}")
     
-    async def send_personal_message(self, message: dict, websocket: WebSocket):
-        """Send besked til specifik WebSocket forbindelse"""
+    def _drop_connection(self, connection: Connection, reason: str):
+        """Fjern en forbindelse der ikke kan følge med eller er død"""
+        logger.warning(f"Dropping WebSocket connection for user {connection.user_id}: {reason}")
+        self.disconnect(connection.websocket)
+        asyncio.create_task(self._close_quietly(connection.websocket))
+    
+    async def _close_quietly(self, websocket: WebSocket):
         try:
-            await websocket.send_text(json.dumps(message, default=str))
-            self.messages_sent += 1
-        except WebSocketDisconnect:
-            logger.warning("WebSocket disconnected during message send")
-            self.disconnect(websocket)
-        except Exception as e:
-            logger.error(f"Error sending personal message: {e}")
+            await websocket.close(code=1013)  # Try again later
+        except Exception:
+            pass
     
-    async def send_to_user(self, message: dict, user_id: int):
-        """Send besked til alle forbindelser for en specifik bruger"""
-        if user_id not in self.active_connections:
-            logger.debug(f"No active connections for user {user_id}")
+    def touch(self, websocket: WebSocket):
+        """Registrer indgående trafik - enhver besked tæller som livstegn"""
+        connection = self.connections.get(websocket)
+        if connection is not None:
+            connection.last_seen = time.monotonic()
+    
+    def send_text(self, websocket: WebSocket, text: str):
+        """Læg rå tekst i kø - alle sends går gennem writer-tasken"""
+        connection = self.connections.get(websocket)
+        if connection is not None:
+            connection.enqueue(text)
+    
+    def send_personal_message(self, message: dict, websocket: WebSocket):
+        """Læg besked i kø til specifik WebSocket forbindelse"""
+        self.send_text(websocket, dumps(message))
+    
+    def replay(self, websocket: WebSocket, backlog: List[Tuple[int, str]], resync: bool = False):
+        """Læg mistede notifikationer i kø og frigiv de tilbageholdte live-beskeder"""
+        connection = self.connections.get(websocket)
+        if connection is None:
             return
+        if resync:
+            # The client's last_seq is no reference point any more; deliver everything live
+            connection.last_seq = 0
+        held, connection.held = connection.held or [], None
+        for seq, text in backlog + sorted(held):
+            if not connection.deliver(seq, text):
+                break
+    
+    def subscribe(self, websocket: WebSocket, request: dict) -> Dict[str, List]:
+        """Erstat forbindelsens abonnementsfiltre - udeladte filtre matcher alt"""
+        connection = self.connections.get(websocket)
+        if connection is None:
+            return {}
         
-        # Add timestamp if not present
-        if "timestamp" not in message:
-            message["timestamp"] = datetime.utcnow().isoformat()
-        
-        dead_connections = []
-        sent_count = 0
-        
-        for connection in self.active_connections[user_id]:
-            try:
-                await connection.send_text(json.dumps(message, default=str))
-                sent_count += 1
-                self.messages_sent += 1
-            except WebSocketDisconnect:
-                dead_connections.append(connection)
-            except Exception as e:
-                logger.error(f"Error sending message to user {user_id}: {e}")
-                dead_connections.append(connection)
-        
-        # Clean up dead connections
-        for dead_conn in dead_connections:
-            self.disconnect(dead_conn)
+        filters = {}
+        for name, field in FILTER_FIELDS.items():
+            values = request.get(name)
+            if values is None or values == []:
+                continue
+            if not isinstance(values, list):
+                values = [values]
+            if len(values) > MAX_FILTER_VALUES:
+                raise ValueError(f"Too many values for {name}")
+            filters[field] = frozenset(
+                int(value) if field in ("request_id", "approver_id") else str(value) for value in values
+            )
         
-        if sent_count > 0:
-            logger.debug(f"Sent message to user {user_id} on {sent_count} connections")
+        self.subscriptions.add(connection, filters)
+        logger.info(f"User {connection.user_id} subscribed to {sorted(filters)}")
+        return {name: sorted(filters[field]) for name, field in FILTER_FIELDS.items() if field in filters}
     
-    async def send_to_role(self, message: dict, role: str):
-        """Send besked til alle brugere med specifik rolle"""
-        if "timestamp" not in message:
-            message["timestamp"] = datetime.utcnow().isoformat()
-        
-        sent_count = 0
-        dead_connections = []
-        
-        for connection, conn_role in self.user_roles.items():
-            if conn_role.lower() == role.lower():
-                try:
-                    await connection.send_text(json.dumps(message, default=str))
-                    sent_count += 1
-                    self.messages_sent += 1
-                except WebSocketDisconnect:
-                    dead_connections.append(connection)
-                except Exception as e:
-                    logger.error(f"Error sending message to role {role}: {e}")
-                    dead_connections.append(connection)
-        
-        # Clean up dead connections
-        for dead_conn in dead_connections:
-            self.disconnect(dead_conn)
-        
-        logger.info(f"Sent message to {sent_count} users with role '{role}'")
-    
-    async def broadcast_to_all(self, message: dict):
-        """Send besked til alle forbundne brugere"""
+    def unsubscribe(self, websocket: WebSocket):
+        """Fjern forbindelsens filtre så den modtager alt igen"""
+        connection = self.connections.get(websocket)
+        if connection is not None:
+            self.subscriptions.remove(connection)
+    
+    def _interested(self, connections: Iterable[Connection], message: dict) -> Iterable[Connection]:
+        if not self.subscriptions.required:
+            return connections
+        matched = self.subscriptions.match(message)
+        return [connection for connection in connections if connection.filters is None or connection in matched]
+    
+    def _fan_out(self, connections: Iterable[Connection], message: dict) -> int:
+        # Add timestamp if not present
         if "timestamp" not in message:
             message["timestamp"] = datetime.utcnow().isoformat()
         
-        sent_count = 0
-        dead_connections = []
-        
-        for user_connections in self.active_connections.values():
-            for connection in user_connections:
-                try:
-                    await connection.send_text(json.dumps(message, default=str))
-                    sent_count += 1
-                    self.messages_sent += 1
-                except WebSocketDisconnect:
-                    dead_connections.append(connection)
-                except Exception as e:
-                    logger.error(f"Error broadcasting message: {e}")
-                    dead_connections.append(connection)
-        
-        # Clean up dead connections
-        for dead_conn in dead_connections:
-            self.disconnect(dead_conn)
+        # Encode once; every connection queues the same str.
+        # Iterate over a copy - the disconnect policy may shrink the index.
+        text = dumps(message)
+        seq = message.get("seq")
+        queued_count = 0
+        for connection in list(connections):
+            queued = connection.enqueue(text) if seq is None else connection.deliver(seq, text)
+            if queued:
+                queued_count += 1
+        return queued_count
+    
+    def send_to_user(self, message: dict, user_id: int):
+        """Læg besked i kø til alle forbindelser for en specifik bruger"""
+        connections = self.by_user.get(user_id)
+        if not connections:
+            logger.debug(f"No active connections for user {user_id}")
+            return
         
-        logger.info(f"Broadcast message to {sent_count} connections")
+        queued_count = self._fan_out(connections, message)
+        if queued_count > 0:
+            logger.debug(f"Queued message to user {user_id} on {queued_count} connections")
+    
+    def send_to_role(self, message: dict, role: str):
+        """Læg besked i kø til alle brugere med specifik rolle"""
+        connections = self._interested(self.by_role.get(role.lower(), ()), message)
+        queued_count = self._fan_out(connections, message)
+        self._remember_broadcast(message, role.lower())
+        logger.info(f"Queued message to {queued_count} users with role '{role}'")
+    
+    def broadcast_to_all(self, message: dict):
+        """Læg besked i kø til alle forbundne brugere"""
+        queued_count = self._fan_out(self._interested(self.connections.values(), message), message)
+        self._remember_broadcast(message, None)
+        logger.info(f"Broadcast message queued to {queued_count} connections")
+    
+    def _remember_broadcast(self, message: dict, role: Optional[str]):
+        if "event_id" in message:
+            buffered = self.recent_broadcasts
+            if len(buffered) == buffered.maxlen:
+                # The oldest entry is evicted and can no longer be replayed
+                self.reset_replay_floor(buffered[0][0])
+            buffered.append((message["event_id"], role, message))
+    
+    def reset_replay_floor(self, event_id: Optional[int]):
+        """Broadcasts til og med event_id kan ikke længere afspilles"""
+        if event_id is None:
+            return
+        if self.replay_floor is None or event_id > self.replay_floor:
+            self.replay_floor = event_id
+    
+    def replay_broadcasts(self, websocket: WebSocket, after_event_id: int) -> bool:
+        """Læg broadcasts efter after_event_id i kø - False hvis nogle ikke længere er gemt"""
+        connection = self.connections.get(websocket)
+        if connection is None:
+            return True
+        # An id below the floor is from before this process (or its LISTEN
+        # connection) started, e.g. a previous run: what came after is unknown
+        complete = self.replay_floor is not None and after_event_id >= self.replay_floor
+        for event_id, role, message in list(self.recent_broadcasts):
+            if event_id <= after_event_id:
+                continue
+            if role is not None and role != connection.role:
+                continue
+            if SubscriptionIndex.matches(connection, message):
+                if not connection.enqueue(dumps(message)):
+                    break
+        return complete
     
     async def handle_ping_pong(self):
         """Håndter ping/pong for at holde forbindelser i live"""
         while True:
             try:
-                dead_connections = []
-                
-                for connection, metadata in self.connection_metadata.items():
-                    try:
-                        # Send ping
-                        await connection.send_text(json.dumps({
-                            "type": "ping",
-                            "timestamp": datetime.utcnow().isoformat()
-                        }))
-                        
-                        # Update last ping time
-                        metadata["last_ping"] = datetime.utcnow()
-                        
-                    except WebSocketDisconnect:
-                        dead_connections.append(connection)
-                    except Exception as e:
-                        logger.error(f"Error sending ping: {e}")
-                        dead_connections.append(connection)
-                
-                # Clean up dead connections
-                for dead_conn in dead_connections:
-                    self.disconnect(dead_conn)
-                
-                # Wait 30 seconds before next ping
-                await asyncio.sleep(30)
-                
+                await asyncio.sleep(self.heartbeat.tick)
+                now = time.monotonic()
+                due = self.heartbeat.advance(now)
+                if due:
+                    self._check_heartbeats(due, now)
             except Exception as e:
                 logger.error(f"Error in ping/pong handler: {e}")
-                await asyncio.sleep(30)
+    
+    def _check_heartbeats(self, due: List[Connection], now: float):
+        ping = None
+        for connection in due:
+            if connection.ping_sent_at is not None:
+                if connection.last_seen < connection.ping_sent_at:
+                    self.heartbeat_evictions += 1
+                    self._drop_connection(connection, "pong timeout")
+                    continue
+                connection.ping_sent_at = None
+            
+            # Active connections are only rescheduled; pings go to idle ones
+            idle_deadline = connection.last_seen + self.heartbeat_interval
+            if idle_deadline > now:
+                self.heartbeat.schedule(connection, idle_deadline)
+                continue
+            
+            if ping is None:
+                ping = dumps({
+                    "type": "ping",
+                    "timestamp": datetime.utcnow().isoformat()
+                })
+            if connection.enqueue(ping):
+                connection.ping_sent_at = now
+                self.pings_sent += 1
+                self.heartbeat.schedule(connection, now + self.pong_timeout)
     
     def get_connection_stats(self) -> Dict:
         """Hent statistikker over forbindelser"""
-        role_counts = {}
-        for role in self.user_roles.values():
-            role_counts[role] = role_counts.get(role, 0) + 1
-        
         return {
             "total_connections": self.total_connections,
-            "unique_users": len(self.active_connections),
+            "unique_users": len(self.by_user),
             "messages_sent": self.messages_sent,
-            "role_distribution": role_counts,
-            "active_users": list(self.active_connections.keys())
+            "role_distribution": {role: len(members) for role, members in self.by_role.items()},
+            "active_users": list(self.by_user.keys()),
+            "subscribed_connections": len(self.subscriptions.required),
+            "outbound_queues": {
+                "policy": self.slow_consumer_policy,
+                "capacity": self.max_queue,
+                "total_depth": self.queued_messages,
+                "peak_depth": self.peak_queue_depth,
+                "messages_dropped": self.messages_dropped,
+                "slow_consumer_disconnects": self.slow_consumer_disconnects
+            },
+            "heartbeat": {
+                "interval": self.heartbeat_interval,
+                "pong_timeout": self.pong_timeout,
+                "pings_sent": self.pings_sent,
+                "evictions": self.heartbeat_evictions
+            },
+            "batching": {
+                "connections": self.batching_connections,
+                "frames_saved": self.frames_saved
+            }
         }
+    
+    def get_user_connection_stats(self, user_id: int) -> List[Dict]:
+        """Hent statistikker for en brugers forbindelser"""
+        return [
+            {
+                "role": connection.role,
+                "connected_at": connection.connected_at.isoformat(),
+                "queue_depth": connection.queue.qsize(),
+                "messages_sent": connection.sent,
+                "messages_dropped": connection.dropped,
+                "batch_ms": int(connection.batch_window * 1000),
+                "frames_saved": connection.frames_saved
+            }
+            for connection in self.by_user.get(user_id, ())
+        ]
 
 # Global connection manager instance
-manager = ConnectionManager()
+manager = ConnectionManager(
+    max_queue=int(os.getenv("WS_SEND_QUEUE_SIZE", "256")),
+    slow_consumer_policy=os.getenv("WS_SLOW_CONSUMER_POLICY", DROP_OLDEST),
+    send_timeout=float(os.getenv("WS_SEND_TIMEOUT_SECONDS", "10")),
+    heartbeat_interval=float(os.getenv("WS_HEARTBEAT_INTERVAL_SECONDS", "30")),
+    pong_timeout=float(os.getenv("WS_PONG_TIMEOUT_SECONDS", "10")),
+    replay_buffer_size=int(os.getenv("WS_REPLAY_BUFFER_SIZE", "1000"))
+)
@@ -0,0 +1,36 @@
+# backend/app/work_queue.py
+"""
+Arbejdskø for godkendte, ubehandlede anmodninger
+
+Workers (fx provisioneringsscripts) claimer anmodninger med en lease, og
+kvitterer eller melder fejl pr. element. Udløbne leases leveres automatisk
+igen. Et blokerende claim venter på signalet herfra, som event bus sender
+til alle workers når en anmodning godkendes.
+"""
+import asyncio
+import os
+
+class WorkAvailable:
+    """Vækker ventende claims når der er kommet nyt arbejde"""
+
+    def __init__(self):
+        self._event = asyncio.Event()
+
+    def notify(self):
+        self._event.set()
+        self._event = asyncio.Event()
+
+    async def wait(self, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+# Items are not handed out again after this many deliveries
+MAX_ATTEMPTS = int(os.getenv("WORK_QUEUE_MAX_ATTEMPTS", "5"))
+# Waiting claims also re-check this often, to pick up expired leases
+POLL_INTERVAL_SECONDS = float(os.getenv("WORK_QUEUE_POLL_SECONDS", "5"))
+
+# Global signal instance
+work_available = WorkAvailable()
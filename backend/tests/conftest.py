@@ -0,0 +1,63 @@
+# backend/tests/conftest.py
+"""
+Fælles fixtures: testene kører mod en rigtig PostgreSQL
+
+Sæt TEST_DATABASE_URL (eller DATABASE_URL) til en testdatabase; er den ikke
+tilgængelig, springes database-testene over. Hver test kører i en transaktion
+der rulles tilbage bagefter, så intet bliver liggende i databasen.
+"""
+import os
+import uuid
+
+import pytest
+
+# The app reads DATABASE_URL when app.database is imported
+if os.getenv("TEST_DATABASE_URL"):
+    os.environ["DATABASE_URL"] = os.environ["TEST_DATABASE_URL"]
+
+from app import models
+from app.database import SessionLocal, engine, get_db, check_database_connection, init_database
+
+@pytest.fixture(scope="session")
+def database():
+    """Opret skema og migrationer én gang pr. testkørsel"""
+    if not check_database_connection():
+        pytest.skip("PostgreSQL er ikke tilgængelig - sæt TEST_DATABASE_URL")
+    init_database()
+
+@pytest.fixture
+def db(database):
+    """Database-session i en transaktion der rulles tilbage efter testen"""
+    connection = engine.connect()
+    transaction = connection.begin()
+    # crud commits only release savepoints; the outer transaction is never committed
+    session = SessionLocal(bind=connection, join_transaction_mode="create_savepoint")
+    try:
+        yield session
+    finally:
+        session.close()
+        transaction.rollback()
+        connection.close()
+
+@pytest.fixture
+def client(db):
+    """TestClient hvis synkrone endpoints bruger testens session"""
+    # Imported here: app.main connects to the database at import
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    app.dependency_overrides[get_db] = lambda: db
+    try:
+        yield TestClient(app, base_url="http://localhost")
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+
+@pytest.fixture
+def users(db):
+    """En anmoder og en godkender med unikke emails"""
+    run = uuid.uuid4().hex[:8]
+    requester = models.User(email=f"anmoder-{run}@test.dk", name="Test Anmoder", role="requester")
+    approver = models.User(email=f"godkender-{run}@test.dk", name="Test Godkender", role="approver")
+    db.add_all([requester, approver])
+    db.commit()
+    return requester, approver
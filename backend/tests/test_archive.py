@@ -0,0 +1,103 @@
+# backend/tests/test_archive.py
+"""Arkivering flytter anmodninger og kommentarer samlet, og include_archived læser dem igen"""
+from datetime import datetime, timedelta, timezone
+import random
+import string
+
+from app import crud, models
+from app.archive import _ARCHIVE_BATCH
+
+# Older than anything the application itself creates, so a cutoff just after
+# it only selects this test's rows
+LONG_AGO = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+def _seed(db, users, word):
+    requester, approver = users
+    finished, pending = [], []
+    for i in range(6):
+        db_request = models.ApprovalRequest(
+            title=f"Arkivtest {word} {i}",
+            description=f"Arkiveret beskrivelse {word}",
+            category="Indkøb",
+            status=models.ApprovalStatus.PENDING if i % 3 == 0 else models.ApprovalStatus.REJECTED,
+            requester_id=requester.id,
+            approver_id=approver.id,
+            created_at=LONG_AGO + timedelta(minutes=i),
+            approved_at=LONG_AGO + timedelta(minutes=i),
+            updated_at=LONG_AGO + timedelta(minutes=i)
+        )
+        db.add(db_request)
+        db.flush()
+        for n in range(2):
+            db.add(models.ApprovalComment(
+                content=f"Kommentar {n}", request_id=db_request.id, user_id=approver.id
+            ))
+        (pending if i % 3 == 0 else finished).append(db_request.id)
+    db.commit()
+    return finished, pending
+
+def _archive(db):
+    archived = db.execute(
+        _ARCHIVE_BATCH, {"cutoff": LONG_AGO + timedelta(days=1), "batch_size": 1000}
+    ).scalars().all()
+    db.commit()
+    return archived
+
+def test_archive_batch_moves_requests_with_their_comments(db, users):
+    word = "arkiv" + "".join(random.choices(string.ascii_lowercase, k=10))
+    finished, pending = _seed(db, users, word)
+
+    archived = _archive(db)
+
+    assert set(finished) <= set(archived)
+    assert not set(pending) & set(archived)
+    assert db.query(models.ApprovalRequest).filter(models.ApprovalRequest.id.in_(finished)).count() == 0
+    assert db.query(models.ApprovalComment).filter(models.ApprovalComment.request_id.in_(finished)).count() == 0
+    assert db.query(models.ArchivedApprovalComment).filter(
+        models.ArchivedApprovalComment.request_id.in_(finished)
+    ).count() == 2 * len(finished)
+    # Pending requests keep their comments in the hot tables
+    assert db.query(models.ApprovalComment).filter(
+        models.ApprovalComment.request_id.in_(pending)
+    ).count() == 2 * len(pending)
+
+    for request_id in finished:
+        assert crud.get_approval_request(db, request_id) is None
+        db_request = crud.get_approval_request(db, request_id, include_archived=True)
+        assert isinstance(db_request, models.ArchivedApprovalRequest)
+        assert len(db_request.comments) == 2
+
+def test_include_archived_pages_in_one_order(db, users):
+    requester, _ = users
+    word = "arkiv" + "".join(random.choices(string.ascii_lowercase, k=10))
+    finished, pending = _seed(db, users, word)
+    _archive(db)
+    # Newest first across both tables
+    expected = sorted(finished + pending, key=lambda request_id: request_id, reverse=True)
+
+    offset_pages = [
+        [req.id for req in crud.get_approval_requests(
+            db, skip=skip, limit=4, requester_id=requester.id, include_archived=True
+        )["requests"]]
+        for skip in (0, 4)
+    ]
+    assert offset_pages[0] + offset_pages[1] == expected
+
+    seen, cursor = [], None
+    while True:
+        page = crud.get_approval_requests(
+            db, limit=4, requester_id=requester.id, cursor=cursor, include_archived=True
+        )
+        assert page["total"] == len(expected)
+        seen.extend(req.id for req in page["requests"])
+        assert all(len(req.comments) == 2 for req in page["requests"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == expected
+
+    found = crud.get_approval_requests(db, search=word, include_archived=True, total_mode="none")["requests"]
+    assert {req.id for req in found} == set(expected)
+    assert all(req.search_highlight for req in found)
+    ranks = [(req.search_rank, req.created_at, req.id) for req in found]
+    assert ranks == sorted(ranks, reverse=True)
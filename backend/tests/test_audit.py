@@ -0,0 +1,242 @@
+# backend/tests/test_audit.py
+"""Audit-skriveren, migrering 8's kopiering, vedligehold af partitioner og audit-forespørgslen"""
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+import time
+import uuid
+
+import pytest
+from sqlalchemy import delete, event, func, insert, select, text
+
+from app import audit, crud, migrations, models
+from app.audit import AuditWriter
+from app.database import SessionLocal, async_engine
+
+def _entry(marker, i=0):
+    return {"action": "TEST", "entity_type": marker, "entity_id": i}
+
+def _written(marker):
+    with SessionLocal() as db:
+        return db.scalar(select(func.count()).select_from(models.AuditLog).where(models.AuditLog.entity_type == marker))
+
+@pytest.fixture
+def marker(database):
+    """Unik entity_type for testens audit-rækker, som slettes bagefter"""
+    marker = f"TEST-{uuid.uuid4().hex[:8]}"
+    yield marker
+    with SessionLocal() as db:
+        db.execute(delete(models.AuditLog).where(models.AuditLog.entity_type == marker))
+        db.commit()
+
+def _run(writer, scenario):
+    async def main():
+        try:
+            return await scenario()
+        finally:
+            await writer.stop()
+            await async_engine.dispose()
+    return asyncio.run(main())
+
+def test_entries_are_written_in_batches(marker):
+    writer = AuditWriter(batch_size=3, flush_interval=60)
+
+    async def scenario():
+        await writer.start()
+        # A full batch goes out without waiting for the interval
+        for i in range(3):
+            writer.enqueue(_entry(marker, i))
+        for _ in range(100):
+            if writer.written:
+                break
+            await asyncio.sleep(0.02)
+        # A partial batch waits for the interval
+        for i in range(3, 5):
+            writer.enqueue(_entry(marker, i))
+        await asyncio.sleep(0.2)
+        return writer.written, writer.batches
+
+    assert _run(writer, scenario) == (3, 1)
+    # ... or for stop()
+    assert (writer.written, writer.batches) == (5, 2)
+    assert _written(marker) == 5
+
+def test_stop_flushes_without_waiting_for_the_interval(marker):
+    writer = AuditWriter(batch_size=500, flush_interval=60)
+
+    async def scenario():
+        # Queued before start() and while running: both are written
+        writer.enqueue(_entry(marker, 0))
+        await writer.start()
+        writer.enqueue(_entry(marker, 1))
+        started = time.monotonic()
+        await writer.stop()
+        return time.monotonic() - started
+
+    assert _run(writer, scenario) < 5
+    assert _written(marker) == 2
+    assert writer.get_stats()["pending"] == 0
+
+def test_enqueue_after_stop_is_rejected(marker):
+    writer = AuditWriter()
+
+    async def scenario():
+        await writer.start()
+        await writer.stop()
+
+    _run(writer, scenario)
+    with pytest.raises(RuntimeError):
+        writer.enqueue(_entry(marker))
+    assert writer.get_stats()["pending"] == 0
+
+@pytest.fixture
+def schema(db):
+    """Tom audit_logs i et eget skema i testens transaktion"""
+    db.execute(text("CREATE SCHEMA audit_test"))
+    # Unqualified names resolve to the test schema first; users etc. come from public
+    db.execute(text("SET LOCAL search_path TO audit_test, public"))
+    return db.connection()
+
+def _partitions(conn):
+    return sorted(conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'audit_logs'::regclass"
+    )).scalars())
+
+def test_migration_8_copies_old_rows_in_batches(schema, users):
+    conn = schema
+    requester, approver = users
+    # audit_logs as create_all made it before migration 8
+    conn.execute(text("""
+        CREATE TABLE audit_logs (
+            id SERIAL PRIMARY KEY,
+            action VARCHAR NOT NULL,
+            entity_type VARCHAR NOT NULL,
+            entity_id INTEGER,
+            old_values JSON,
+            new_values JSON,
+            ip_address VARCHAR,
+            user_agent TEXT,
+            user_id INTEGER REFERENCES users (id),
+            approval_request_id INTEGER REFERENCES approval_requests (id),
+            created_at TIMESTAMPTZ
+        )
+    """))
+    months = [datetime(2025, month, 15, tzinfo=timezone.utc) for month in (1, 2, 2, 3, 5)]
+    for created_at in months + [None]:
+        conn.execute(text(
+            "INSERT INTO audit_logs (action, entity_type, new_values, user_id, created_at) "
+            "VALUES ('UPDATE', 'APPROVAL_REQUEST', '{\"status\": \"approved\"}', :user_id, :created_at)"
+        ), {"user_id": approver.id, "created_at": created_at})
+
+    migrations._partition_audit_logs(conn)
+    assert conn.execute(text("SELECT count(*) FROM audit_logs")).scalar() == 0
+    foreign_tables = conn.execute(text(
+        "SELECT confrelid::regclass::text FROM pg_constraint "
+        "WHERE conrelid = 'audit_logs'::regclass AND contype = 'f'"
+    )).scalars().all()
+    assert foreign_tables == ["users"]
+
+    batches = []
+    while True:
+        copied = audit.copy_unpartitioned_batch(conn, batch_size=2)
+        if not copied:
+            break
+        batches.append(copied)
+
+    assert batches == [2, 2, 2]
+    assert conn.execute(text("SELECT to_regclass('audit_logs_unpartitioned')")).scalar() is None
+    assert conn.execute(text("SELECT count(*) FROM audit_logs")).scalar() == 6
+    assert conn.execute(text("SELECT count(*) FROM audit_logs_default")).scalar() == 0
+    assert conn.execute(text("SELECT count(*) FROM audit_logs_y2025m02")).scalar() == 2
+    assert conn.execute(text(
+        "SELECT count(*) FROM audit_logs WHERE new_values @> '{\"status\": \"approved\"}'"
+    )).scalar() == 6
+    assert {"audit_logs_y2025m01", "audit_logs_y2025m03", "audit_logs_y2025m05"} <= set(_partitions(conn))
+
+def test_partition_maintenance(schema):
+    conn = schema
+    conn.execute(text(
+        "CREATE TABLE audit_logs (id INTEGER, created_at TIMESTAMPTZ NOT NULL) PARTITION BY RANGE (created_at)"
+    ))
+    conn.execute(text("CREATE TABLE audit_logs_default PARTITION OF audit_logs DEFAULT"))
+    audit.create_partitions(conn, date(2001, 11, 20), 3)
+    audit.ensure_partitions(conn)
+
+    this_month = audit.partition_name(datetime.now(timezone.utc).date().replace(day=1))
+    partitions = _partitions(conn)
+    assert {"audit_logs_y2001m11", "audit_logs_y2001m12", "audit_logs_y2002m01", this_month} <= set(partitions)
+    assert len(partitions) == 1 + 3 + audit.PARTITION_MONTHS_AHEAD + 1
+
+    dropped = audit.drop_expired_partitions(conn, timedelta(days=365))
+    assert dropped == ["audit_logs_y2001m11", "audit_logs_y2001m12", "audit_logs_y2002m01"]
+    assert "audit_logs_default" in _partitions(conn)
+    assert this_month in _partitions(conn)
+
+def _relations(plan):
+    found = {plan["Relation Name"]} if "Relation Name" in plan else set()
+    for child in plan.get("Plans", []):
+        found |= _relations(child)
+    return found
+
+@pytest.fixture
+def months_of_entries(db):
+    """Audit-rækker fordelt over tre månedspartitioner, i testens transaktion"""
+    marker = f"TEST-{uuid.uuid4().hex[:8]}"
+    audit.create_partitions(db.connection(), date(2003, 1, 1), 3)
+    start = datetime(2003, 1, 10, tzinfo=timezone.utc)
+    # Pairs share created_at, so the id decides their order
+    db.execute(insert(models.AuditLog), [
+        {
+            "action": "TEST",
+            "entity_type": marker,
+            "entity_id": i,
+            "created_at": start + timedelta(days=(i // 2) * 9)
+        }
+        for i in range(18)
+    ])
+    db.commit()
+    return marker
+
+def test_audit_log_pages_across_partitions(db, months_of_entries):
+    expected = [
+        (entry.created_at, entry.id) for entry in db.query(models.AuditLog)
+        .filter(models.AuditLog.entity_type == months_of_entries)
+        .order_by(models.AuditLog.created_at.desc(), models.AuditLog.id.desc())
+    ]
+    assert len({created_at.month for created_at, _ in expected}) == 3
+
+    seen, cursor = [], None
+    while True:
+        page = crud.get_audit_logs(db, entity_type=months_of_entries, cursor=cursor, limit=4)
+        seen.extend((entry.created_at, entry.id) for entry in page["entries"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == expected
+
+def _captured(db, call):
+    statements = []
+    def do_orm_execute(orm_execute_state):
+        statements.append(orm_execute_state.statement)
+    event.listen(db, "do_orm_execute", do_orm_execute)
+    try:
+        result = call()
+    finally:
+        event.remove(db, "do_orm_execute", do_orm_execute)
+    return result, statements
+
+def test_audit_log_time_range_prunes_partitions(db, months_of_entries):
+    since = datetime(2003, 2, 1, tzinfo=timezone.utc)
+    until = datetime(2003, 3, 1, tzinfo=timezone.utc)
+    page, [statement] = _captured(db, lambda: crud.get_audit_logs(
+        db, entity_type=months_of_entries, since=since, until=until
+    ))
+    assert len(page["entries"]) == 6
+    assert all(since <= entry.created_at < until for entry in page["entries"])
+    assert _relations(crud.explain(db, statement)) == {"audit_logs_y2003m02"}
+
+    # Only since: the earlier partitions are skipped
+    _, [statement] = _captured(db, lambda: crud.get_audit_logs(db, entity_type=months_of_entries, since=since))
+    scanned = _relations(crud.explain(db, statement))
+    assert {"audit_logs_y2003m02", "audit_logs_y2003m03"} <= scanned
+    assert "audit_logs_y2003m01" not in scanned
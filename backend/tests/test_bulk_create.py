@@ -0,0 +1,41 @@
+# backend/tests/test_bulk_create.py
+"""Bulk-oprettelse: resultaterne står i samme rækkefølge som de indsendte anmodninger"""
+from app import crud, models, schemas
+
+UNKNOWN_USER = 2**31 - 1
+
+def test_results_stay_aligned_with_input_when_items_are_rejected(db, users):
+    requester, approver = users
+    items = []
+    for i in range(40):
+        items.append(schemas.ApprovalRequestBulkItem(
+            title=f"Bulk {i}",
+            description=f"Bulk-oprettet anmodning {i}",
+            category="Indkøb",
+            amount=i,
+            # Every fifth has an unknown requester, every seventh an unknown approver
+            requester_id=UNKNOWN_USER if i % 5 == 0 else requester.id,
+            approver_id=UNKNOWN_USER if i % 7 == 0 else approver.id
+        ))
+    # Several INSERT ... RETURNING batches, so the order must hold across them too
+    db.connection().execution_options(insertmanyvalues_page_size=7)
+
+    results = crud.create_approval_requests_bulk(db, items)
+
+    assert [result["index"] for result in results] == list(range(len(items)))
+    created = {
+        db_request.id: db_request
+        for db_request in db.query(models.ApprovalRequest).filter(
+            models.ApprovalRequest.id.in_([result["id"] for result in results if "id" in result])
+        )
+    }
+    for i, (item, result) in enumerate(zip(items, results)):
+        if i % 5 == 0:
+            assert result == {"index": i, "error": "Anmoder ikke fundet"}
+        elif i % 7 == 0:
+            assert result == {"index": i, "error": "Godkender ikke fundet"}
+        else:
+            db_request = created[result["id"]]
+            assert (db_request.title, db_request.amount) == (item.title, item.amount)
+            assert result["reference_number"] == db_request.reference_number
+    assert len(created) == sum(1 for i in range(len(items)) if i % 5 and i % 7)
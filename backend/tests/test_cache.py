@@ -0,0 +1,31 @@
+# backend/tests/test_cache.py
+"""Cache-invalideringer fra én worker skal nå de andre over event bussen"""
+import asyncio
+import json
+
+import pytest
+
+from app.cache import APPROVAL_REQUESTS, CacheBackend, response_cache
+from app.event_bus import EventBus
+
+def _received(statement) -> dict:
+    # What the listeners get when the writing transaction commits
+    return json.loads(statement.compile().params["payload"])
+
+def test_cache_backend_is_abstract():
+    with pytest.raises(TypeError):
+        CacheBackend()
+
+def test_invalidation_reaches_other_workers_only():
+    writer = EventBus("postgresql://unused", enabled=False)
+    other = EventBus("postgresql://unused", enabled=False)
+    event = _received(writer.cache_invalidation("responses", [APPROVAL_REQUESTS]))
+    key_before = response_cache.make_key(APPROVAL_REQUESTS, "stats")
+
+    # The writer already invalidated after its own commit
+    asyncio.run(writer._dispatch(event))
+    assert response_cache.make_key(APPROVAL_REQUESTS, "stats") == key_before
+
+    asyncio.run(other._dispatch(event))
+    assert response_cache.make_key(APPROVAL_REQUESTS, "stats") != key_before
+    assert other.cache_invalidations == 1
@@ -0,0 +1,87 @@
+# backend/tests/test_decisions.py
+"""Beslutninger: optimistisk låsning med version og rækkelåse i fast rækkefølge"""
+import pytest
+from sqlalchemy import event
+
+from app import crud, models, schemas
+from app.database import engine
+
+def _pending(db, users, count):
+    requester, approver = users
+    requests = [
+        models.ApprovalRequest(
+            title=f"Beslutning {i}",
+            description="Afventer beslutning",
+            category="Indkøb",
+            requester_id=requester.id,
+            approver_id=approver.id
+        )
+        for i in range(count)
+    ]
+    db.add_all(requests)
+    db.commit()
+    return requests
+
+def test_update_with_stale_version_raises_version_conflict(db, users):
+    _, approver = users
+    [db_request] = _pending(db, users, 1)
+    stale = db_request.version
+    crud.update_approval_request(
+        db, db_request.id,
+        schemas.ApprovalRequestUpdate(status=models.ApprovalStatus.APPROVED, version=stale), approver.id
+    )
+
+    with pytest.raises(crud.VersionConflict) as conflict:
+        crud.update_approval_request(
+            db, db_request.id,
+            schemas.ApprovalRequestUpdate(status=models.ApprovalStatus.REJECTED, version=stale), approver.id
+        )
+    assert (conflict.value.expected_version, conflict.value.current_version) == (stale, stale + 1)
+    assert crud.get_approval_request(db, db_request.id).status == models.ApprovalStatus.APPROVED
+
+def test_bulk_reports_stale_versions_per_item(db, users):
+    _, approver = users
+    first, second, third = _pending(db, users, 3)
+    # Someone else decides the second request first
+    crud.update_approval_request(
+        db, second.id, schemas.ApprovalRequestUpdate(status=models.ApprovalStatus.REJECTED), approver.id
+    )
+
+    results = crud.apply_decisions_bulk(db, [
+        schemas.ApprovalDecision(request_id=first.id, status=models.ApprovalStatus.APPROVED, version=1),
+        schemas.ApprovalDecision(request_id=second.id, status=models.ApprovalStatus.APPROVED, version=1),
+        schemas.ApprovalDecision(request_id=third.id, status=models.ApprovalStatus.APPROVED),
+    ], approver.id)
+
+    assert [result["request_id"] for result in results] == [first.id, second.id, third.id]
+    assert results[0]["applied"] and results[0]["version"] == 2
+    assert results[1].get("conflict") and not results[1].get("applied")
+    # The conflict carries the current state so the client can refresh
+    assert (results[1]["status"], results[1]["version"]) == (models.ApprovalStatus.REJECTED, 2)
+    assert results[2]["applied"]
+    assert crud.get_approval_request(db, second.id).status == models.ApprovalStatus.REJECTED
+
+def test_bulk_locks_rows_in_id_order(db, users):
+    _, approver = users
+    requests = _pending(db, users, 4)
+    shuffled = [requests[2], requests[0], requests[3], requests[1]]
+
+    locks = []
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if "FOR UPDATE" in statement and "approval_requests" in statement:
+            locks.append((statement, parameters))
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        crud.apply_decisions_bulk(db, [
+            schemas.ApprovalDecision(request_id=db_request.id, status=models.ApprovalStatus.APPROVED)
+            for db_request in shuffled
+        ], approver.id)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    # One locking statement, whatever order the decisions arrived in
+    [(statement, parameters)] = locks
+    assert "ORDER BY approval_requests.id" in statement
+    assert statement.rstrip().endswith("FOR UPDATE OF approval_requests")
+    # The IN list is expanded into one parameter per id
+    assert sorted(parameters.values()) == sorted(db_request.id for db_request in requests)
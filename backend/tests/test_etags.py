@@ -0,0 +1,48 @@
+# backend/tests/test_etags.py
+"""ETags og cachede svar skal følge med når en indlejret bruger ændres"""
+from app import crud, models, schemas
+
+def test_user_update_changes_request_etag(db, client, users):
+    requester, approver = users
+    db_request = models.ApprovalRequest(
+        title="ETag-test",
+        description="Anmodning til test af ETags",
+        category="Indkøb",
+        requester_id=requester.id,
+        approver_id=approver.id
+    )
+    db.add(db_request)
+    db.commit()
+
+    first = client.get(f"/approval-requests/{db_request.id}")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert client.get(f"/approval-requests/{db_request.id}", headers={"If-None-Match": etag}).status_code == 304
+
+    crud.update_user(db, approver.id, schemas.UserUpdate(name="Omdøbt Godkender"))
+
+    second = client.get(f"/approval-requests/{db_request.id}", headers={"If-None-Match": etag})
+    assert second.status_code == 200
+    assert second.headers["ETag"] != etag
+    assert second.json()["approver"]["name"] == "Omdøbt Godkender"
+
+def test_comment_author_update_changes_request_etag(db, client, users):
+    requester, approver = users
+    commenter = models.User(email=f"kommentator-{requester.id}@test.dk", name="Kommentator", role="approver")
+    db_request = models.ApprovalRequest(
+        title="ETag-test",
+        description="Anmodning til test af ETags",
+        category="Indkøb",
+        requester_id=requester.id,
+        approver_id=approver.id,
+        comments=[models.ApprovalComment(content="Kommentar", user=commenter)]
+    )
+    db.add(db_request)
+    db.commit()
+    etag = client.get(f"/approval-requests/{db_request.id}").headers["ETag"]
+
+    crud.update_user(db, commenter.id, schemas.UserUpdate(department="Økonomi"))
+
+    response = client.get(f"/approval-requests/{db_request.id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["comments"][0]["user"]["department"] == "Økonomi"
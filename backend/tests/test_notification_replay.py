@@ -0,0 +1,170 @@
+# backend/tests/test_notification_replay.py
+"""Genafspilning ved genforbindelse: huller, tilbageholdte live-beskeder, dubletter og broadcasts"""
+import asyncio
+import json
+import uuid
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import async_crud, event_bus as event_bus_module, models
+from app.database import async_engine
+from app.event_bus import EventBus
+from app.websocket_manager import ConnectionManager
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+    async def close(self, code=1000):
+        pass
+
+async def _drain():
+    # Let the connection's writer task send what is queued
+    await asyncio.sleep(0.05)
+
+def _seqs(websocket):
+    return [message["seq"] for message in websocket.sent if "seq" in message]
+
+def _notification(seq):
+    return {"type": "status_update", "seq": seq, "timestamp": "2026-01-01T00:00:00"}
+
+def test_live_notifications_are_held_during_replay_and_deduplicated():
+    async def scenario():
+        manager = ConnectionManager()
+        websocket = FakeWebSocket()
+        await manager.connect(websocket, 1, last_seq=5, heartbeat=False)
+        # Live notifications arriving while the backlog is loaded
+        manager.send_to_user(_notification(7), 1)
+        manager.send_to_user(_notification(6), 1)
+        await _drain()
+        assert _seqs(websocket) == []
+
+        manager.replay(websocket, [(6, json.dumps(_notification(6))), (7, json.dumps(_notification(7)))])
+        manager.send_to_user(_notification(8), 1)
+        manager.send_to_user(_notification(7), 1)
+        await _drain()
+        manager.disconnect(websocket)
+        return _seqs(websocket)
+
+    assert asyncio.run(scenario()) == [6, 7, 8]
+
+def test_resync_drops_a_last_seq_ahead_of_the_server():
+    async def scenario():
+        manager = ConnectionManager()
+        websocket = FakeWebSocket()
+        await manager.connect(websocket, 1, last_seq=100, heartbeat=False)
+        manager.send_to_user(_notification(3), 1)
+        manager.replay(websocket, [], resync=True)
+        manager.send_to_user(_notification(4), 1)
+        await _drain()
+        manager.disconnect(websocket)
+        return _seqs(websocket)
+
+    assert asyncio.run(scenario()) == [3, 4]
+
+async def _with_outbox(seqs, current_seq, work):
+    # Outbox rows and sequence for a fresh user, in a transaction that is rolled back
+    try:
+        async with async_engine.connect() as conn:
+            transaction = await conn.begin()
+            db = AsyncSession(bind=conn, join_transaction_mode="create_savepoint", expire_on_commit=False)
+            try:
+                user = models.User(email=f"replay-{uuid.uuid4().hex[:8]}@test.dk", name="Replay", role="requester")
+                db.add(user)
+                await db.flush()
+                db.add(models.NotificationSequence(user_id=user.id, last_seq=current_seq))
+                db.add_all([
+                    models.NotificationOutbox(user_id=user.id, seq=seq, payload=json.dumps(_notification(seq)))
+                    for seq in seqs
+                ])
+                await db.flush()
+                return await work(db, user.id)
+            finally:
+                await db.close()
+                await transaction.rollback()
+    finally:
+        await async_engine.dispose()
+
+def _missed(seqs, current_seq, last_seq, limit=100):
+    return asyncio.run(_with_outbox(
+        seqs, current_seq,
+        lambda db, user_id: async_crud.get_missed_notifications(db, user_id, last_seq, limit)
+    ))
+
+def test_missed_notifications_are_replayed_in_order(database):
+    missed = _missed([1, 2, 3, 4], current_seq=4, last_seq=2)
+    assert [seq for seq, payload in missed] == [3, 4]
+    assert _missed([1, 2, 3, 4], current_seq=4, last_seq=4) == []
+
+def test_gap_or_unknown_position_requires_resync(database):
+    # Seq 3 was cleaned up: replaying from 4 would silently skip it
+    assert _missed([4, 5], current_seq=5, last_seq=2) is None
+    # More missed than the replay limit
+    assert _missed([1, 2, 3, 4], current_seq=4, last_seq=0, limit=2) is None
+    # The client claims a seq the server never handed out
+    assert _missed([1, 2], current_seq=2, last_seq=9) is None
+
+def _broadcast(event_id):
+    return {"type": "approval_decision", "event_id": event_id, "timestamp": "2026-01-01T00:00:00"}
+
+def _event_ids(websocket):
+    return [message["event_id"] for message in websocket.sent if "event_id" in message]
+
+async def _resume(manager, after_event_id):
+    websocket = FakeWebSocket()
+    await manager.connect(websocket, 1, heartbeat=False)
+    complete = manager.replay_broadcasts(websocket, after_event_id)
+    await _drain()
+    manager.disconnect(websocket)
+    return complete, _event_ids(websocket)
+
+def test_broadcasts_are_replayed_only_above_the_replay_floor():
+    async def scenario():
+        manager = ConnectionManager(replay_buffer_size=3)
+        # Before the event bus reports a floor nothing can be promised
+        unknown = await _resume(manager, 0)
+        manager.reset_replay_floor(10)
+        for event_id in (11, 12, 13):
+            manager.broadcast_to_all(_broadcast(event_id))
+        resumed = {after: await _resume(manager, after) for after in (12, 10, 7)}
+        # A full buffer evicts 11, which raises the floor
+        manager.broadcast_to_all(_broadcast(14))
+        return unknown, resumed, manager.replay_floor, await _resume(manager, 10)
+
+    unknown, resumed, floor, after_eviction = asyncio.run(scenario())
+    assert unknown == (False, [])
+    assert resumed == {12: (True, [13]), 10: (True, [11, 12, 13]), 7: (False, [11, 12, 13])}
+    assert floor == 11
+    assert after_eviction == (False, [12, 13, 14])
+
+def test_event_ids_survive_a_restart_without_the_event_bus(database, monkeypatch):
+    async def scenario():
+        try:
+            bus = EventBus(dsn="", enabled=False)
+            # The last id handed out before the "restart"
+            previous = await bus.current_event_id()
+            restarted = ConnectionManager()
+            monkeypatch.setattr(event_bus_module, "manager", restarted)
+            await bus.start()
+            await bus.broadcast_to_all({"type": "approval_decision"})
+            return (
+                previous,
+                restarted.recent_broadcasts[-1][0],
+                await _resume(restarted, previous),
+                await _resume(restarted, previous - 1)
+            )
+        finally:
+            await async_engine.dispose()
+
+    previous, event_id, up_to_date, behind = asyncio.run(scenario())
+    # Ids continue from the database sequence instead of restarting at 1
+    assert event_id > previous
+    assert up_to_date == (True, [event_id])
+    # Missed an event from before the restart: resync
+    assert behind == (False, [event_id])
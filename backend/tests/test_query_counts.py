@@ -0,0 +1,50 @@
+# backend/tests/test_query_counts.py
+"""Antal SQL-sætninger pr. side må ikke vokse med sidestørrelsen (N+1)"""
+from sqlalchemy import event
+
+from app import models
+from app.database import engine
+
+PAGE_SIZES = (5, 50)
+
+def _count_statements(call):
+    # Counted on the engine, so the whole request is seen: endpoint, crud and serialization
+    statements = []
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        # Savepoints belong to the rolled-back test transaction, not to the endpoint
+        if "SAVEPOINT" not in statement:
+            statements.append(statement)
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        result = call()
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return result, statements
+
+def test_list_statement_count_independent_of_page_size(db, client, users):
+    requester, approver = users
+    for i in range(max(PAGE_SIZES)):
+        db.add(models.ApprovalRequest(
+            title=f"Sidetest {i}",
+            description="Anmodning til test af antal forespørgsler",
+            category="Indkøb",
+            requester_id=requester.id,
+            approver_id=approver.id,
+            comments=[
+                models.ApprovalComment(content="Kommentar fra godkender", user_id=approver.id),
+                models.ApprovalComment(content="Svar fra anmoder", user_id=requester.id),
+            ]
+        ))
+    db.commit()
+
+    counts = {}
+    for limit in PAGE_SIZES:
+        db.expire_all()
+        response, statements = _count_statements(lambda: client.get(
+            "/approval-requests/", params={"limit": limit, "requester_id": requester.id}
+        ))
+        assert response.status_code == 200, response.text
+        assert len(response.json()["requests"]) == limit
+        counts[limit] = len(statements)
+
+    assert counts[PAGE_SIZES[0]] == counts[PAGE_SIZES[1]], counts
@@ -0,0 +1,149 @@
+# backend/tests/test_query_plans.py
+"""Liste-, forfalds- og audit-forespørgslerne skal bruge indeks, ikke Seq Scan"""
+from datetime import datetime, timedelta, timezone
+import uuid
+
+import pytest
+from sqlalchemy import event, insert, text
+
+from app import crud, models
+from app.database import SessionLocal, engine
+
+# Relations that must never be read with a sequential scan by these shapes;
+# audit_logs is partitioned, so its scans name the monthly partitions
+GUARDED_TABLES = ("approval_requests",)
+GUARDED_PREFIXES = ("audit_logs",)
+
+CATEGORIES = ("Indkøb", "IT", "Rejser", "Uddannelse", "Udstyr")
+
+def _seq_scans(plan):
+    found = []
+    relation = plan.get("Relation Name", "")
+    if plan["Node Type"] == "Seq Scan" and (
+        relation in GUARDED_TABLES or relation.startswith(GUARDED_PREFIXES)
+    ):
+        found.append(relation)
+    for child in plan.get("Plans", []):
+        found.extend(_seq_scans(child))
+    return found
+
+def _with_rows(db, relations):
+    # Empty partitions (the default one, months without entries) are rightly
+    # read without an index; ANALYZE has recorded them as empty
+    if not relations:
+        return []
+    populated = set(db.execute(
+        text("SELECT relname FROM pg_class WHERE relname = ANY(:names) AND reltuples > 0"),
+        {"names": list(relations)}
+    ).scalars())
+    return [relation for relation in relations if relation in populated]
+
+def _captured_statements(db, call):
+    # The statements exactly as crud builds them; relationship loads
+    # (selectinload of comments) carry their parameters separately
+    statements = []
+    def do_orm_execute(orm_execute_state):
+        # Selects only: estimate mode runs its own EXPLAIN through the session
+        if orm_execute_state.is_select and not orm_execute_state.is_relationship_load:
+            statements.append(orm_execute_state.statement)
+    event.listen(db, "do_orm_execute", do_orm_execute)
+    try:
+        call()
+    finally:
+        event.remove(db, "do_orm_execute", do_orm_execute)
+    return statements
+
+@pytest.fixture(scope="module")
+def seeded(database):
+    """Nok rækker til at planneren vælger som i produktion, og friske statistikker
+
+    Alt sker i én transaktion der rulles tilbage efter modulet; ANALYZE ser
+    transaktionens egne rækker.
+    """
+    connection = engine.connect()
+    transaction = connection.begin()
+    db = SessionLocal(bind=connection, join_transaction_mode="create_savepoint")
+    run = uuid.uuid4().hex[:8]
+    users = [
+        models.User(email=f"plan-{role}-{i}-{run}@test.dk", name=f"Plan {role} {i}", role=role)
+        for role in ("requester", "approver") for i in range(20)
+    ]
+    db.add_all(users)
+    db.flush()
+    requesters, approvers = users[:20], users[20:]
+    now = datetime.now(timezone.utc)
+    requests = []
+    for i in range(5000):
+        # One in a hundred is pending, half of those overdue
+        pending = i % 100 == 0
+        requests.append({
+            "title": f"Plantest {i}",
+            "description": f"Anmodning nummer {i} til test af forespørgselsplaner",
+            "category": CATEGORIES[i % len(CATEGORIES)],
+            "priority": models.Priority.MEDIUM,
+            "status": models.ApprovalStatus.PENDING if pending else models.ApprovalStatus.APPROVED,
+            "requester_id": requesters[i % len(requesters)].id,
+            "approver_id": approvers[i % len(approvers)].id,
+            "created_at": now - timedelta(minutes=i),
+            "due_date": now + timedelta(days=-1 if i % 200 == 0 else 7),
+        })
+    request_ids = db.execute(
+        insert(models.ApprovalRequest).returning(models.ApprovalRequest.id), requests
+    ).scalars().all()
+    db.execute(insert(models.AuditLog), [
+        {
+            "action": "UPDATE",
+            "entity_type": "APPROVAL_REQUEST",
+            "entity_id": request_ids[i % len(request_ids)],
+            "approval_request_id": request_ids[i % len(request_ids)],
+            "user_id": approvers[i % len(approvers)].id,
+            "created_at": now - timedelta(seconds=i),
+        }
+        for i in range(20000)
+    ])
+    # New rows sit in the GIN pending lists until autovacuum merges them, and
+    # the planner prices a long pending list as a full scan; merge them now
+    db.execute(text(
+        "SELECT gin_clean_pending_list(indexrelid) FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "JOIN pg_am am ON am.oid = c.relam WHERE am.amname = 'gin' AND i.indrelid = 'approval_requests'::regclass"
+    ))
+    db.execute(text("ANALYZE approval_requests"))
+    db.execute(text("ANALYZE audit_logs"))
+    try:
+        yield db, {
+            "request_ids": request_ids,
+            "requester_id": requesters[0].id,
+            "approver_id": approvers[0].id,
+        }
+    finally:
+        db.close()
+        transaction.rollback()
+        connection.close()
+
+QUERY_SHAPES = {
+    "list": lambda db, seed: crud.get_approval_requests(db, total_mode="none"),
+    "list_by_status": lambda db, seed: crud.get_approval_requests(db, status="PENDING", total_mode="none"),
+    "list_by_approver": lambda db, seed: crud.get_approval_requests(
+        db, approver_id=seed["approver_id"], total_mode="none"
+    ),
+    "list_by_requester": lambda db, seed: crud.get_approval_requests(
+        db, requester_id=seed["requester_id"], total_mode="none"
+    ),
+    "list_by_category": lambda db, seed: crud.get_approval_requests(db, category="Rejser", total_mode="none"),
+    "list_estimate": lambda db, seed: crud.get_approval_requests(db, status="PENDING", total_mode="estimate"),
+    "list_next_page": lambda db, seed: crud.get_approval_requests(
+        db, cursor=crud.get_approval_requests(db, total_mode="none")["next_cursor"], total_mode="none"
+    ),
+    "search": lambda db, seed: crud.get_approval_requests(db, search="Plantest 4242", total_mode="none"),
+    "overdue": lambda db, seed: crud.get_overdue_requests(db),
+    "audit": lambda db, seed: crud.get_audit_logs(db),
+    "audit_by_request": lambda db, seed: crud.get_audit_logs(db, approval_request_id=seed["request_ids"][0]),
+}
+
+@pytest.mark.parametrize("shape", sorted(QUERY_SHAPES))
+def test_query_shape_uses_index(seeded, shape):
+    db, seed = seeded
+    statements = _captured_statements(db, lambda: QUERY_SHAPES[shape](db, seed))
+    assert statements
+    for statement in statements:
+        assert _with_rows(db, _seq_scans(crud.explain(db, statement))) == [], shape
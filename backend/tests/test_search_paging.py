@@ -0,0 +1,44 @@
+# backend/tests/test_search_paging.py
+"""Cursor-paging gennem en søgning må hverken springe over eller gentage rækker"""
+from datetime import datetime, timedelta, timezone
+import random
+import string
+
+from app import crud, models
+
+def test_search_pages_cover_tied_ranks_exactly_once(db, users):
+    requester, approver = users
+    word = "rangtest" + "".join(random.choices(string.ascii_lowercase, k=10))
+    now = datetime.now(timezone.utc)
+    # Identical text gives every row the same rank; half also share created_at.
+    # Reference numbers are set so their trigram similarity is equal too
+    for i in range(40):
+        db.add(models.ApprovalRequest(
+            title=f"Indkøb {word}",
+            description=f"Ens beskrivelse {word}",
+            category="Indkøb",
+            reference_number=f"TIE-{i:02d}",
+            requester_id=requester.id,
+            approver_id=approver.id,
+            created_at=now if i % 2 else now - timedelta(seconds=i)
+        ))
+    db.commit()
+    expected = {
+        row.id for row in db.query(models.ApprovalRequest.id)
+        .filter(models.ApprovalRequest.requester_id == requester.id)
+    }
+
+    seen, ranks, cursor = [], set(), None
+    while True:
+        page = crud.get_approval_requests(
+            db, limit=7, search=word, requester_id=requester.id, cursor=cursor, total_mode="none"
+        )
+        seen.extend(req.id for req in page["requests"])
+        ranks.update(req.search_rank for req in page["requests"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert len(seen) == len(set(seen)), "rækker gentaget"
+    assert set(seen) == expected, "rækker sprunget over"
+    assert len(ranks) == 1
@@ -0,0 +1,106 @@
+# backend/tests/test_subscriptions.py
+"""Abonnementsfiltre: indeksets bogføring og hvem der modtager en broadcast"""
+import asyncio
+import json
+
+import pytest
+
+from app.websocket_manager import ConnectionManager, MAX_FILTER_VALUES
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+    async def close(self, code=1000):
+        pass
+
+def _broadcasts(websocket):
+    return [message["id"] for message in websocket.sent if message.get("type") == "request_updated"]
+
+def _message(message_id, **fields):
+    return {"type": "request_updated", "id": message_id, **fields}
+
+def test_subscribe_and_unsubscribe_keep_the_index_consistent():
+    async def scenario():
+        manager = ConnectionManager()
+        index = manager.subscriptions
+        first, second = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(first, 1, heartbeat=False)
+        await manager.connect(second, 2, heartbeat=False)
+        a, b = manager.connections[first], manager.connections[second]
+
+        assert manager.subscribe(first, {"categories": ["IT", "Rejser"], "statuses": "pending"}) == {
+            "categories": ["IT", "Rejser"], "statuses": ["pending"]
+        }
+        manager.subscribe(second, {"categories": ["IT"], "request_ids": ["7"]})
+        assert index.required == {a: 2, b: 2}
+        assert index.postings["category"] == {"IT": {a, b}, "Rejser": {a}}
+        assert index.postings["request_id"] == {7: {b}}
+
+        # A new subscription replaces the old filters entirely
+        manager.subscribe(first, {"events": ["request_updated"]})
+        assert index.required == {a: 1, b: 2}
+        assert index.postings["category"] == {"IT": {b}}
+        assert index.postings["status"] == {}
+        assert index.postings["type"] == {"request_updated": {a}}
+
+        # Unsubscribing and disconnecting leave no empty posting lists behind
+        manager.unsubscribe(second)
+        assert b.filters is None
+        assert index.postings["category"] == {} and index.postings["request_id"] == {}
+        manager.disconnect(first)
+        assert index.required == {}
+        assert all(postings == {} for postings in index.postings.values())
+
+        manager.disconnect(second)
+
+    asyncio.run(scenario())
+
+def test_too_many_filter_values_are_rejected():
+    async def scenario():
+        manager = ConnectionManager()
+        websocket = FakeWebSocket()
+        await manager.connect(websocket, 1, heartbeat=False)
+        with pytest.raises(ValueError):
+            manager.subscribe(websocket, {"request_ids": list(range(MAX_FILTER_VALUES + 1))})
+        manager.disconnect(websocket)
+
+    asyncio.run(scenario())
+
+def test_broadcast_reaches_connections_whose_filters_all_match():
+    async def scenario():
+        manager = ConnectionManager()
+        everything, it_pending, it_any, managers = (FakeWebSocket() for _ in range(4))
+        await manager.connect(everything, 1, heartbeat=False)
+        await manager.connect(it_pending, 2, heartbeat=False)
+        await manager.connect(it_any, 3, heartbeat=False)
+        await manager.connect(managers, 4, role="manager", heartbeat=False)
+        manager.subscribe(it_pending, {"categories": ["IT"], "statuses": ["pending"]})
+        manager.subscribe(it_any, {"categories": ["IT", "Indkøb"]})
+        manager.subscribe(managers, {"categories": ["IT"]})
+
+        manager.broadcast_to_all(_message(1, category="IT", status="approved"))
+        manager.broadcast_to_all(_message(2, category="IT", status="pending"))
+        manager.broadcast_to_all(_message(3, category="Rejser", status="pending"))
+        # A message without the filtered field matches no filter on it
+        manager.broadcast_to_all(_message(4, status="pending"))
+        manager.send_to_role(_message(5, category="IT"), "manager")
+        manager.send_to_role(_message(6, category="Rejser"), "manager")
+        await asyncio.sleep(0.05)
+
+        received = [_broadcasts(websocket) for websocket in (everything, it_pending, it_any, managers)]
+        for websocket in (everything, it_pending, it_any, managers):
+            manager.disconnect(websocket)
+        return received
+
+    everything, it_pending, it_any, managers = asyncio.run(scenario())
+    assert everything == [1, 2, 3, 4]
+    assert it_pending == [2]
+    assert it_any == [1, 2]
+    assert managers == [1, 2, 5]
@@ -0,0 +1,55 @@
+# backend/tests/test_users.py
+"""Bruger-cachen: ændringer skal nå de andre workers, og ukendte brugere afvises"""
+import asyncio
+import json
+
+import pytest
+from sqlalchemy import event
+
+from app import crud, models, schemas
+from app.cache import user_cache
+from app.database import engine
+from app.event_bus import EventBus
+
+def _notifications(call):
+    # NOTIFY payloads sent by the statements call executes
+    payloads = []
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if "pg_notify" in statement:
+            payloads.append(json.loads(parameters["payload"]))
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        call()
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return payloads
+
+def test_user_update_invalidates_other_workers(db, users):
+    requester, approver = users
+    key = f"user:{approver.id}"
+    user_cache.set(key, {"id": approver.id, "role": "approver", "is_active": True})
+
+    sent = _notifications(lambda: crud.update_user(db, approver.id, schemas.UserUpdate(is_active=False)))
+    # Stands in for the copy another worker still holds
+    user_cache.set(key, {"id": approver.id, "role": "approver", "is_active": True})
+
+    # Another worker receives the NOTIFY when the update commits
+    other = EventBus("postgresql://unused", enabled=False)
+    for payload in sent:
+        asyncio.run(other._dispatch(payload))
+    assert user_cache.get(key) is None
+
+def test_comment_by_unknown_user_is_rejected(db, users):
+    requester, approver = users
+    db_request = models.ApprovalRequest(
+        title="Kommentartest",
+        description="Anmodning til test af kommentarer",
+        category="Indkøb",
+        requester_id=requester.id,
+        approver_id=approver.id
+    )
+    db.add(db_request)
+    db.commit()
+
+    with pytest.raises(ValueError):
+        crud.add_comment(db, db_request.id, approver.id + 1_000_000, "Hej")
@@ -0,0 +1,171 @@
+# backend/tests/test_work_queue.py
+"""Arbejdskøen: samtidige claims, udløbne leases og ack fra en anden worker
+
+Samtidighed kræver data som flere forbindelser kan se, så testene kører mod
+committede kopier af tabellerne i et eget skema, der slettes bagefter.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+import threading
+import uuid
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from app import crud, models
+from app.database import engine, async_engine, get_async_db
+
+# Tables the claim, ack and fail paths read or write
+QUEUE_TABLES = ("users", "approval_requests", "approval_comments", "audit_logs")
+
+@pytest.fixture
+def queue_schema(database):
+    """Committede kopier af arbejdskøens tabeller i et midlertidigt skema"""
+    schema = f"work_queue_test_{uuid.uuid4().hex[:8]}"
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE SCHEMA {schema}"))
+        for table in QUEUE_TABLES:
+            conn.execute(text(f"CREATE TABLE {schema}.{table} (LIKE public.{table} INCLUDING ALL)"))
+    # No pooling: every session gets its own connection with the schema first
+    queue_engine = create_engine(
+        engine.url, poolclass=NullPool,
+        connect_args={"options": f"-c search_path={schema},public -c lock_timeout=5s"}
+    )
+    try:
+        yield schema, sessionmaker(bind=queue_engine, autoflush=False)
+    finally:
+        queue_engine.dispose()
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+
+def _seed_approved(Session, count):
+    with Session() as db:
+        requester = models.User(email="anmoder@test.dk", name="Test Anmoder", role="requester")
+        approver = models.User(email="godkender@test.dk", name="Test Godkender", role="approver")
+        db.add_all([requester, approver])
+        db.flush()
+        now = datetime.now(timezone.utc)
+        items = [
+            models.ApprovalRequest(
+                title=f"Kø {i}",
+                description="Godkendt og klar til behandling",
+                category="Indkøb",
+                status=models.ApprovalStatus.APPROVED,
+                requester_id=requester.id,
+                approver_id=approver.id,
+                approved_at=now - timedelta(minutes=count - i),
+                delivery_attempts=0
+            )
+            for i in range(count)
+        ]
+        db.add_all(items)
+        db.commit()
+        return [item.id for item in items]
+
+def test_claim_skips_rows_locked_by_another_claim(queue_schema):
+    _, Session = queue_schema
+    ids = _seed_approved(Session, 10)
+
+    with Session() as holder, Session() as db:
+        # An open claim transaction holding the three oldest items
+        locked = holder.execute(text(
+            "SELECT id FROM approval_requests ORDER BY approved_at, id LIMIT 3 FOR UPDATE"
+        )).scalars().all()
+        assert locked == ids[:3]
+
+        claimed = crud.claim_work_items(db, "worker-b", limit=10, lease_seconds=60, max_attempts=5)
+        # Not blocked (lock_timeout would fail the claim) and nothing locked returned
+        assert [item.id for item in claimed] == ids[3:]
+        holder.rollback()
+
+def test_concurrent_claims_never_return_the_same_item(queue_schema):
+    _, Session = queue_schema
+    ids = _seed_approved(Session, 60)
+    start = threading.Barrier(4)
+
+    def worker(name):
+        claimed = []
+        with Session() as db:
+            start.wait()
+            while True:
+                items = crud.claim_work_items(db, name, limit=3, lease_seconds=60, max_attempts=5)
+                if not items:
+                    return claimed
+                claimed.extend(item.id for item in items)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(worker, [f"worker-{n}" for n in range(4)]))
+
+    claimed = [request_id for result in results for request_id in result]
+    assert len(claimed) == len(set(claimed)), "samme element claimet to gange"
+    assert sorted(claimed) == sorted(ids)
+
+def test_expired_lease_is_reclaimed(queue_schema):
+    _, Session = queue_schema
+    [request_id] = _seed_approved(Session, 1)
+
+    with Session() as db:
+        [item] = crud.claim_work_items(db, "worker-a", limit=1, lease_seconds=60, max_attempts=5)
+        assert item.lease_owner == "worker-a"
+        # A live lease is not handed out again
+        assert crud.claim_work_items(db, "worker-b", limit=1, lease_seconds=60, max_attempts=5) == []
+
+        db.execute(
+            text("UPDATE approval_requests SET lease_expires_at = now() - interval '1 second' WHERE id = :id"),
+            {"id": request_id}
+        )
+        db.commit()
+        [item] = crud.claim_work_items(db, "worker-b", limit=1, lease_seconds=60, max_attempts=5)
+        assert (item.id, item.lease_owner, item.delivery_attempts) == (request_id, "worker-b", 2)
+
+        # The worker that lost the lease can no longer ack it
+        with pytest.raises(ValueError):
+            crud.ack_work_item(db, request_id, "worker-a")
+        db.rollback()
+        assert crud.ack_work_item(db, request_id, "worker-b").processed_at is not None
+
+def test_exhausted_items_are_not_reclaimed(queue_schema):
+    _, Session = queue_schema
+    [request_id] = _seed_approved(Session, 1)
+
+    with Session() as db:
+        crud.claim_work_items(db, "worker-a", limit=1, lease_seconds=60, max_attempts=1)
+        crud.fail_work_item(db, request_id, "worker-a", "fejl")
+        assert crud.claim_work_items(db, "worker-b", limit=1, lease_seconds=60, max_attempts=1) == []
+
+def test_ack_by_other_worker_returns_409(queue_schema):
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    schema, Session = queue_schema
+    [request_id] = _seed_approved(Session, 1)
+    with Session() as db:
+        crud.claim_work_items(db, "worker-a", limit=1, lease_seconds=60, max_attempts=5)
+
+    async def get_queue_db():
+        # Created on the app's event loop; asyncpg connections cannot move between loops
+        queue_async_engine = create_async_engine(
+            async_engine.url, poolclass=NullPool,
+            connect_args={"server_settings": {"search_path": f"{schema},public"}}
+        )
+        try:
+            async with async_sessionmaker(
+                bind=queue_async_engine, class_=AsyncSession, expire_on_commit=False
+            )() as db:
+                yield db
+        finally:
+            await queue_async_engine.dispose()
+
+    app.dependency_overrides[get_async_db] = get_queue_db
+    try:
+        client = TestClient(app, base_url="http://localhost")
+        response = client.post(f"/work-queue/{request_id}/ack", params={"worker": "worker-b"})
+        assert response.status_code == 409
+        response = client.post(f"/work-queue/{request_id}/ack", params={"worker": "worker-a"})
+        assert response.status_code == 200
+        assert response.json()["processed_at"] is not None
+    finally:
+        app.dependency_overrides.pop(get_async_db, None)